@@ -1,8 +1,15 @@
 from __future__ import annotations
 
 from .boomlings import GeometryDashClient
+from .jobs import Job
+from .jobs import JobQueue
+from .jobs import JobRouter
+from .jobs import JobWorker
+from .meilisearch import MeiliBulkLoader
 from .meilisearch import MeiliSearchClient
 from .mysql import ImplementsMySQL
+from .ratelimit import RateLimit
+from .ratelimit import RedisRateLimiter
 from .redis import RedisClient
 from .redis import RedisPubsubRouter
 from .storage import AbstractStorage
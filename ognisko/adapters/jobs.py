@@ -0,0 +1,464 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from collections.abc import Callable
+from collections.abc import Coroutine
+from typing import Any
+from typing import Self
+
+import orjson
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from ognisko.adapters.redis import RedisClient
+from ognisko.utilities import metrics
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUS_TTL = 60 * 60 * 24
+"""The time the status of a job remains queryable after its last update."""
+
+UNIQUE_JOB_TTL = 60 * 60 * 6
+"""The time after which a unique job may be enqueued again, even if the
+previous one never finished."""
+
+# Moves up to `ARGV[2]` delayed jobs due by `ARGV[1]` from the sorted set
+# `KEYS[1]` to the stream `KEYS[2]`, returning the number moved.
+_PROMOTE_SCRIPT = """
+local due = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, ARGV[2])
+for _, job in ipairs(due) do
+    redis.call("XADD", KEYS[2], "*", unpack(cjson.decode(job)))
+    redis.call("ZREM", KEYS[1], job)
+end
+return #due
+"""
+
+
+class Job:
+    """A single execution attempt of a queued job."""
+
+    __slots__ = (
+        "id",
+        "type",
+        "payload",
+        "attempt",
+        "unique",
+        "_queue",
+    )
+
+    def __init__(
+        self,
+        job_id: str,
+        job_type: str,
+        payload: dict[str, Any],
+        attempt: int,
+        unique: bool,
+        queue: JobQueue,
+    ) -> None:
+        self.id = job_id
+        self.type = job_type
+        self.payload = payload
+        self.attempt = attempt
+        self.unique = unique
+        self._queue = queue
+
+    async def report_progress(self, done: int, total: int | None = None) -> None:
+        await self._queue.set_status(
+            self.id,
+            progress=done,
+            total=total if total is not None else "",
+        )
+
+
+type JobHandler[C] = Callable[[C, Job], Coroutine[None, None, None]]
+
+
+class JobRouter[C]:
+    """A router for background job handlers."""
+
+    __slots__ = ("_routes",)
+
+    def __init__(self) -> None:
+        self._routes: dict[str, JobHandler[C]] = {}
+
+    def register(
+        self,
+        job_type: str,
+    ) -> Callable[[JobHandler[C]], JobHandler[C]]:
+        def decorator(handler: JobHandler[C]) -> JobHandler[C]:
+            self._routes[job_type] = handler
+            return handler
+
+        return decorator
+
+    def merge(self, other: Self) -> None:
+        self._routes.update(other.route_map())
+
+    def route_map(self) -> dict[str, JobHandler[C]]:
+        return self._routes
+
+    def _get_handler(self, job_type: str) -> JobHandler[C] | None:
+        return self._routes.get(job_type)
+
+
+class JobQueue:
+    """A durable job queue on top of a Redis stream. Jobs are distributed
+    between the workers of a consumer group, and are only removed from their
+    pending list once acknowledged."""
+
+    __slots__ = (
+        "_redis",
+        "_promote_script",
+        "stream",
+        "dead_letter_stream",
+        "delayed_key",
+        "group",
+    )
+
+    def __init__(
+        self,
+        redis: RedisClient,
+        *,
+        stream: str = "ognisko:jobs",
+        group: str = "workers",
+    ) -> None:
+        self._redis = redis
+        self._promote_script = redis.register_script(_PROMOTE_SCRIPT)
+        self.stream = stream
+        self.dead_letter_stream = f"{stream}:dead"
+        self.delayed_key = f"{stream}:delayed"
+        self.group = group
+
+    async def enqueue(
+        self,
+        job_type: str,
+        payload: dict[str, Any] | None = None,
+        *,
+        unique: bool = False,
+    ) -> str | None:
+        """Adds a job to the queue, returning its ID. Unique jobs are not
+        enqueued while another of the same type is queued or running, in
+        which case `None` is returned."""
+        job_id = uuid.uuid4().hex
+
+        if unique and not await self._redis.set(
+            self.__unique_key(job_type),
+            job_id,
+            nx=True,
+            ex=UNIQUE_JOB_TTL,
+        ):
+            return None
+
+        await self.set_status(job_id, type=job_type, status="queued")
+        await self._add(job_id, job_type, payload or {}, 1, unique)
+        return job_id
+
+    async def enqueue_periodic(self, job_type: str, interval: int) -> str | None:
+        """Adds a unique job to the queue, unless one of the same type has
+        already been enqueued by any worker in the past `interval` seconds.
+        Returns the ID of the job if it was enqueued."""
+        if not await self._redis.set(
+            self.__periodic_key(job_type),
+            int(time.time()),
+            nx=True,
+            ex=interval,
+        ):
+            return None
+
+        return await self.enqueue(job_type, unique=True)
+
+    async def _add(
+        self,
+        job_id: str,
+        job_type: str,
+        payload: dict[str, Any],
+        attempt: int,
+        unique: bool,
+        available_at: float = 0.0,
+    ) -> None:
+        fields = {
+            "id": job_id,
+            "type": job_type,
+            "payload": orjson.dumps(payload).decode(),
+            "attempt": str(attempt),
+            "unique": str(int(unique)),
+        }
+
+        # Delayed jobs wait outside of the stream until they are due, rather
+        # than occupying a worker.
+        if available_at > time.time():
+            member = orjson.dumps([item for field in fields.items() for item in field])
+            await self._redis.zadd(self.delayed_key, {member: available_at})
+            return
+
+        await self._redis.xadd(self.stream, fields)
+
+    async def promote_delayed(self, limit: int = 100) -> int:
+        """Adds up to `limit` delayed jobs which are now due to the stream,
+        returning the number added."""
+        return await self._promote_script(
+            keys=[self.delayed_key, self.stream],
+            args=[time.time(), limit],
+        )
+
+    async def get_status(self, job_id: str) -> dict[str, str]:
+        return await self._redis.hgetall(self.__status_key(job_id))
+
+    async def set_status(self, job_id: str, **fields: Any) -> None:
+        key = self.__status_key(job_id)
+
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.hset(key, mapping=fields)
+        pipeline.expire(key, JOB_STATUS_TTL)
+        await pipeline.execute()
+
+    async def release_unique(self, job_type: str) -> None:
+        await self._redis.delete(self.__unique_key(job_type))
+
+    def __status_key(self, job_id: str) -> str:
+        return f"{self.stream}:status:{job_id}"
+
+    def __unique_key(self, job_type: str) -> str:
+        return f"{self.stream}:unique:{job_type}"
+
+    def __periodic_key(self, job_type: str) -> str:
+        return f"{self.stream}:periodic:{job_type}"
+
+
+class JobWorker[C]:
+    """Consumes jobs from a `JobQueue`, running at most `concurrency` at
+    once. Failed jobs are retried with exponential backoff, and moved to the
+    dead letter stream once out of attempts.
+
+    Jobs left pending for `claim_idle_seconds` by a crashed worker are taken
+    over. The pending entries of running jobs are claimed again every third
+    of that time, so long running jobs are never taken over."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        redis: Redis,
+        router: JobRouter[C],
+        context: C,
+        *,
+        consumer: str,
+        concurrency: int = 4,
+        max_attempts: int = 3,
+        retry_delay: float = 5.0,
+        claim_idle_seconds: int = 10 * 60,
+    ) -> None:
+        self._queue = queue
+        self._redis = redis
+        self._router = router
+        self._context = context
+        self._consumer = consumer
+        self._concurrency = concurrency
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._claim_idle_ms = claim_idle_seconds * 1000
+
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+
+    async def run(self) -> None:
+        await self.__ensure_group()
+
+        heartbeat = asyncio.create_task(self.__heartbeat())
+        try:
+            await self.__consume()
+        finally:
+            heartbeat.cancel()
+
+    async def __consume(self) -> None:
+        while True:
+            await self._queue.promote_delayed()
+
+            # Jobs left unacknowledged by crashed workers are taken over.
+            for message_id, fields in await self.__claim_abandoned():
+                await self.__dispatch(message_id, fields)
+
+            response = await self._redis.xreadgroup(
+                self._queue.group,
+                self._consumer,
+                {self._queue.stream: ">"},
+                count=self._concurrency,
+                block=5000,
+            )
+            for _, messages in response:
+                for message_id, fields in messages:
+                    await self.__dispatch(message_id, fields)
+
+    async def shutdown(self) -> None:
+        """Waits for the running jobs to finish."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def __heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self._claim_idle_ms / 3000)
+            if not self._tasks:
+                continue
+
+            try:
+                # Claiming resets the idle time of the pending entries.
+                await self._redis.xclaim(
+                    self._queue.stream,
+                    self._queue.group,
+                    self._consumer,
+                    min_idle_time=0,
+                    message_ids=list(self._tasks),
+                    justid=True,
+                )
+            except Exception:
+                logger.exception("Failed to extend the claim on running jobs.")
+
+    async def __ensure_group(self) -> None:
+        try:
+            await self._redis.xgroup_create(
+                self._queue.stream,
+                self._queue.group,
+                id="0",
+                mkstream=True,
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def __claim_abandoned(self) -> list[tuple[str, dict[str, str]]]:
+        _, messages, *_ = await self._redis.xautoclaim(
+            self._queue.stream,
+            self._queue.group,
+            self._consumer,
+            min_idle_time=self._claim_idle_ms,
+            count=self._concurrency,
+        )
+        return messages
+
+    async def __dispatch(self, message_id: str, fields: dict[str, str]) -> None:
+        # The claim on a running job may have lapsed while the worker was
+        # unable to reach Redis.
+        if message_id in self._tasks:
+            return
+
+        # Waiting for a free slot leaves further jobs for other workers.
+        await self._slots.acquire()
+
+        task = asyncio.create_task(self.__run_job(message_id, fields))
+        self._tasks[message_id] = task
+        task.add_done_callback(
+            lambda _: self.__on_job_done(message_id),
+        )
+
+    def __on_job_done(self, message_id: str) -> None:
+        del self._tasks[message_id]
+        self._slots.release()
+
+    async def __run_job(self, message_id: str, fields: dict[str, str]) -> None:
+        job = Job(
+            job_id=fields["id"],
+            job_type=fields["type"],
+            payload=orjson.loads(fields["payload"]),
+            attempt=int(fields["attempt"]),
+            unique=fields.get("unique") == "1",
+            queue=self._queue,
+        )
+
+        # Retries were once added to the stream ahead of their time.
+        available_at = float(fields.get("available_at", 0))
+        if available_at > time.time():
+            await self._queue._add(
+                job.id,
+                job.type,
+                job.payload,
+                job.attempt,
+                job.unique,
+                available_at,
+            )
+            await self.__acknowledge(message_id)
+            return
+
+        handler = self._router._get_handler(job.type)
+        if handler is None:
+            await self.__dead_letter(message_id, job, "Unknown job type.")
+            return
+
+        await self._queue.set_status(job.id, status="running", attempt=job.attempt)
+        start = time.perf_counter()
+        try:
+            await handler(self._context, job)
+        except Exception as e:
+            logger.exception(
+                "Failed to run a background job.",
+                extra={
+                    "job_id": job.id,
+                    "job_type": job.type,
+                    "attempt": job.attempt,
+                },
+            )
+            metrics.registry.counter("jobs_failed", type=job.type).increment()
+            await self.__retry(message_id, job, repr(e))
+            return
+        finally:
+            metrics.registry.histogram(
+                "jobs_duration_seconds",
+                type=job.type,
+            ).observe(time.perf_counter() - start)
+
+        await self._queue.set_status(job.id, status="completed")
+        await self.__finish(message_id, job)
+
+    async def __retry(self, message_id: str, job: Job, error: str) -> None:
+        if job.attempt >= self._max_attempts:
+            await self.__dead_letter(message_id, job, error)
+            return
+
+        available_at = time.time() + self._retry_delay * 2 ** (job.attempt - 1)
+        await self._queue.set_status(job.id, status="retrying", error=error)
+        await self._queue._add(
+            job.id,
+            job.type,
+            job.payload,
+            job.attempt + 1,
+            job.unique,
+            available_at,
+        )
+        await self.__acknowledge(message_id)
+
+    async def __dead_letter(self, message_id: str, job: Job, error: str) -> None:
+        logger.error(
+            "Moved a background job to the dead letter stream.",
+            extra={
+                "job_id": job.id,
+                "job_type": job.type,
+                "error": error,
+            },
+        )
+        metrics.registry.counter("jobs_dead_lettered", type=job.type).increment()
+
+        await self._redis.xadd(
+            self._queue.dead_letter_stream,
+            {
+                "id": job.id,
+                "type": job.type,
+                "payload": orjson.dumps(job.payload),
+                "attempt": job.attempt,
+                "error": error,
+            },
+        )
+        await self._queue.set_status(job.id, status="failed", error=error)
+        await self.__finish(message_id, job)
+
+    async def __acknowledge(self, message_id: str) -> None:
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.xack(self._queue.stream, self._queue.group, message_id)
+        pipeline.xdel(self._queue.stream, message_id)
+        await pipeline.execute()
+
+    async def __finish(self, message_id: str, job: Job) -> None:
+        await self.__acknowledge(message_id)
+
+        if job.unique:
+            await self._queue.release_unique(job.type)
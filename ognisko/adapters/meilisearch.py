@@ -1,13 +1,54 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import AsyncIterable
+from collections.abc import Mapping
+from typing import Any
+from typing import NamedTuple
+
+import orjson
+from httpx import ConnectError
+from httpx import ConnectTimeout
+from httpx import HTTPStatusError
+from httpx import RemoteProtocolError
 from meilisearch_python_sdk import AsyncClient
+from meilisearch_python_sdk.errors import MeilisearchApiError
+from meilisearch_python_sdk.errors import MeilisearchCommunicationError
+from meilisearch_python_sdk.models.task import TaskInfo
+
+from ognisko.utilities import metrics
 
 DEFAULT_TIMEOUT = 10
 
+DEFAULT_BULK_BATCH_SIZE = 8 * 1024 * 1024
+DEFAULT_BULK_CONCURRENCY = 4
+DEFAULT_BULK_MAX_ENQUEUED_TASKS = 8
+
+logger = logging.getLogger(__name__)
+
 
 class MeiliSearchClient(AsyncClient):
     """An asynchronous MeiliSearch client."""
 
+    def __init__(
+        self,
+        url: str,
+        api_key: str | None = None,
+        *,
+        timeout: int | None = None,
+        bulk_batch_size: int = DEFAULT_BULK_BATCH_SIZE,
+        bulk_concurrency: int = DEFAULT_BULK_CONCURRENCY,
+        bulk_max_enqueued_tasks: int = DEFAULT_BULK_MAX_ENQUEUED_TASKS,
+    ) -> None:
+        super().__init__(url, api_key, timeout=timeout)
+
+        self.bulk_batch_size = bulk_batch_size
+        self.bulk_concurrency = bulk_concurrency
+        self.bulk_max_enqueued_tasks = bulk_max_enqueued_tasks
+
     @staticmethod
     def from_host(
         host: str,
@@ -15,9 +56,199 @@ class MeiliSearchClient(AsyncClient):
         api_key: str | None = None,
         *,
         timeout: int = DEFAULT_TIMEOUT,
+        bulk_batch_size: int = DEFAULT_BULK_BATCH_SIZE,
+        bulk_concurrency: int = DEFAULT_BULK_CONCURRENCY,
+        bulk_max_enqueued_tasks: int = DEFAULT_BULK_MAX_ENQUEUED_TASKS,
     ) -> MeiliSearchClient:
         return MeiliSearchClient(
             f"http://{host}:{port}",
             api_key,
             timeout=timeout,
+            bulk_batch_size=bulk_batch_size,
+            bulk_concurrency=bulk_concurrency,
+            bulk_max_enqueued_tasks=bulk_max_enqueued_tasks,
+        )
+
+    def bulk_loader(self, index: str, primary_key: str = "id") -> MeiliBulkLoader:
+        return MeiliBulkLoader(
+            self,
+            index,
+            primary_key=primary_key,
+            batch_size=self.bulk_batch_size,
+            concurrency=self.bulk_concurrency,
+            max_enqueued_tasks=self.bulk_max_enqueued_tasks,
+        )
+
+    async def add_documents_ndjson(
+        self,
+        index: str,
+        body: bytes,
+        primary_key: str | None = None,
+    ) -> TaskInfo:
+        """Adds documents, serialised as newline delimited JSON, to the
+        index."""
+        params = {}
+        if primary_key is not None:
+            params["primaryKey"] = primary_key
+
+        try:
+            response = await self.http_client.post(
+                f"indexes/{index}/documents",
+                params=params,
+                content=body,
+                headers={"Content-Type": "application/x-ndjson"},
+            )
+            response.raise_for_status()
+        except (ConnectError, ConnectTimeout, RemoteProtocolError) as e:
+            raise MeilisearchCommunicationError(str(e)) from e
+        except HTTPStatusError as e:
+            raise MeilisearchApiError(str(e), e.response) from e
+
+        return TaskInfo(**response.json())
+
+
+class BulkLoadResult(NamedTuple):
+    documents: int
+    batches: int
+    bytes: int
+    seconds: float
+
+    @property
+    def documents_per_second(self) -> float:
+        return self.documents / self.seconds if self.seconds else 0.0
+
+
+class MeiliBulkLoader:
+    """Streams documents into a MeiliSearch index in NDJSON batches of up to
+    `batch_size` bytes, with up to `concurrency` batches being sent at once.
+
+    Once `max_enqueued_tasks` batches are waiting to be indexed, sending is
+    paused until the oldest of them is processed, bounding both memory usage
+    and MeiliSearch's task queue."""
+
+    __slots__ = (
+        "_meili",
+        "_index",
+        "_primary_key",
+        "_batch_size",
+        "_concurrency",
+        "_max_enqueued_tasks",
+        "_task_timeout_ms",
+    )
+
+    def __init__(
+        self,
+        meili: MeiliSearchClient,
+        index: str,
+        *,
+        primary_key: str = "id",
+        batch_size: int = DEFAULT_BULK_BATCH_SIZE,
+        concurrency: int = DEFAULT_BULK_CONCURRENCY,
+        max_enqueued_tasks: int = DEFAULT_BULK_MAX_ENQUEUED_TASKS,
+        task_timeout_ms: int | None = 10 * 60 * 1000,
+    ) -> None:
+        self._meili = meili
+        self._index = index
+        self._primary_key = primary_key
+        self._batch_size = batch_size
+        self._concurrency = concurrency
+        self._max_enqueued_tasks = max_enqueued_tasks
+        self._task_timeout_ms = task_timeout_ms
+
+    async def load(
+        self,
+        documents: AsyncIterable[Mapping[str, Any]],
+    ) -> BulkLoadResult:
+        """Adds all documents to the index, returning once MeiliSearch has
+        finished indexing them."""
+        slots = asyncio.Semaphore(self._concurrency)
+        # The uploads, in the order they were submitted, which is the order
+        # MeiliSearch processes their tasks in.
+        uploads: deque[asyncio.Task[int]] = deque()
+
+        start = time.perf_counter()
+        document_count = 0
+        batch_count = 0
+        byte_count = 0
+
+        async def send(batch: bytes) -> int:
+            try:
+                batch_start = time.perf_counter()
+                task = await self._meili.add_documents_ndjson(
+                    self._index,
+                    batch,
+                    self._primary_key,
+                )
+                metrics.registry.histogram(
+                    "meili_bulk_batch_seconds",
+                    index=self._index,
+                ).observe(time.perf_counter() - batch_start)
+
+                return task.task_uid
+            finally:
+                slots.release()
+
+        async def submit(batch: bytearray) -> None:
+            nonlocal batch_count, byte_count
+            for upload in uploads:
+                if upload.done() and upload.exception() is not None:
+                    await upload
+
+            # Tasks are processed in order, so waiting on the oldest is
+            # enough to keep the queue bounded.
+            while len(uploads) >= self._max_enqueued_tasks:
+                await self.__wait_for_task(await uploads.popleft())
+
+            await slots.acquire()
+            uploads.append(asyncio.create_task(send(bytes(batch))))
+
+            batch_count += 1
+            byte_count += len(batch)
+
+        try:
+            batch = bytearray()
+            async for document in documents:
+                batch += orjson.dumps(document)
+                batch += b"\n"
+                document_count += 1
+
+                if len(batch) >= self._batch_size:
+                    await submit(batch)
+                    batch = bytearray()
+
+            if batch:
+                await submit(batch)
+
+            while uploads:
+                await self.__wait_for_task(await uploads.popleft())
+        finally:
+            for upload in uploads:
+                upload.cancel()
+            await asyncio.gather(*uploads, return_exceptions=True)
+
+        result = BulkLoadResult(
+            documents=document_count,
+            batches=batch_count,
+            bytes=byte_count,
+            seconds=time.perf_counter() - start,
+        )
+        logger.info(
+            "Finished bulk loading documents into MeiliSearch.",
+            extra={
+                "index": self._index,
+                "documents": result.documents,
+                "batches": result.batches,
+                "bytes": result.bytes,
+                "seconds": result.seconds,
+                "documents_per_second": result.documents_per_second,
+            },
+        )
+        return result
+
+    async def __wait_for_task(self, task_uid: int) -> None:
+        await self._meili.wait_for_task(
+            task_uid,
+            timeout_in_ms=self._task_timeout_ms,
+            interval_in_ms=100,
+            raise_for_status=True,
         )
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import math
+import time
+from typing import NamedTuple
+
+from ognisko.adapters.redis import RedisClient
+from ognisko.utilities import metrics
+
+# Reserves `ARGV[1]` requests from the window's budget, returning the total
+# reserved so far. The first reservation of a window sets its expiry.
+_LEASE_SCRIPT = """
+local used = redis.call("INCRBY", KEYS[1], ARGV[1])
+if used == tonumber(ARGV[1]) then
+    redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return used
+"""
+
+_MAXIMUM_LOCAL_BUCKETS = 10_000
+"""The number of local buckets after which expired ones are discarded."""
+
+
+class RateLimit(NamedTuple):
+    times: int
+    seconds: int
+
+
+class _LocalBucket:
+    __slots__ = ("window", "tokens", "exhausted", "expires_at")
+
+    def __init__(self, window: int, expires_at: float) -> None:
+        self.window = window
+        self.tokens = 0
+        self.exhausted = False
+        self.expires_at = expires_at
+
+
+class RedisRateLimiter:
+    """A fixed window rate limiter, shared between workers through Redis.
+
+    Rather than consulting Redis for every request, each worker leases
+    blocks of requests from the window's Redis-side budget and serves them
+    from a local bucket. Limits therefore remain global, although a worker
+    may hold on to part of the budget while another worker is refused."""
+
+    __slots__ = (
+        "_redis",
+        "_lease_fraction",
+        "_buckets",
+        "_lease_script",
+        "_prefix",
+    )
+
+    def __init__(
+        self,
+        redis: RedisClient,
+        *,
+        lease_fraction: float = 0.1,
+        prefix: str = "ognisko:ratelimit",
+    ) -> None:
+        self._redis = redis
+        self._lease_fraction = lease_fraction
+        self._buckets: dict[str, _LocalBucket] = {}
+        self._lease_script = redis.register_script(_LEASE_SCRIPT)
+        self._prefix = prefix
+
+    def _lease_size(self, limit: RateLimit) -> int:
+        return max(math.ceil(limit.times * self._lease_fraction), 1)
+
+    async def acquire(self, name: str, identifier: str, limit: RateLimit) -> bool:
+        """Consumes a single request from the `name` limit of `identifier`.
+        Returns whether the request is allowed."""
+        now = time.time()
+        window = int(now // limit.seconds)
+        key = f"{self._prefix}:{name}:{identifier}"
+
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.window != window:
+            bucket = self._buckets[key] = _LocalBucket(
+                window,
+                expires_at=(window + 1) * limit.seconds,
+            )
+            self.__discard_expired(now)
+
+        if not bucket.tokens and not bucket.exhausted:
+            granted = await self.__lease(f"{key}:{window}", limit)
+            metrics.registry.counter("ratelimit_leases", limit=name).increment()
+
+            bucket.tokens += granted
+            bucket.exhausted = not granted
+
+        if not bucket.tokens:
+            metrics.registry.counter("ratelimit_rejections", limit=name).increment()
+            return False
+
+        bucket.tokens -= 1
+        return True
+
+    async def __lease(self, key: str, limit: RateLimit) -> int:
+        lease_size = self._lease_size(limit)
+        used = await self._lease_script(
+            keys=[key],
+            args=[lease_size, limit.seconds * 1000],
+        )
+
+        remaining_before = limit.times - (int(used) - lease_size)
+        return max(min(lease_size, remaining_before), 0)
+
+    def __discard_expired(self, now: float) -> None:
+        if len(self._buckets) <= _MAXIMUM_LOCAL_BUCKETS:
+            return
+
+        self._buckets = {
+            key: bucket
+            for key, bucket in self._buckets.items()
+            if bucket.expires_at > now
+        }
@@ -2,19 +2,97 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from collections.abc import Awaitable
+import random
+import time
 from collections.abc import Callable
 from collections.abc import Coroutine
-from queue import Queue
+from typing import Any
+from typing import NamedTuple
 from typing import Self
 
+from redis.asyncio import BlockingConnectionPool
+from redis.asyncio import ConnectionPool
 from redis.asyncio import Redis
+from redis.exceptions import ConnectionError
+from redis.exceptions import TimeoutError
+
+from ognisko.utilities import metrics
 
 type PubSubHandler = Callable[[str], Coroutine[None, None, None]]
 
+logger = logging.getLogger(__name__)
+
+
+class _PubsubMessage(NamedTuple):
+    channel: str
+    data: str
+    received_at: float
+
+
+class MeteredBlockingConnectionPool(BlockingConnectionPool):
+    """A connection pool capped at `max_connections`, where callers wait for
+    a connection to be released rather than opening another. The time spent
+    waiting is recorded, labelled by the pool's name."""
+
+    def __init__(self, name: str, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.name = name
+
+    async def get_connection(self, command_name, *keys, **options):
+        start = time.perf_counter()
+        try:
+            connection = await super().get_connection(command_name, *keys, **options)
+        except ConnectionError as e:
+            if isinstance(e.__cause__, asyncio.TimeoutError):
+                metrics.registry.counter(
+                    "redis_pool_timeouts",
+                    pool=self.name,
+                ).increment()
+            raise
+        finally:
+            metrics.registry.histogram(
+                "redis_pool_wait_seconds",
+                pool=self.name,
+            ).observe(time.perf_counter() - start)
+
+        self.__record_in_use()
+        return connection
+
+    async def release(self, connection) -> None:
+        await super().release(connection)
+        self.__record_in_use()
+
+    def __record_in_use(self) -> None:
+        metrics.registry.gauge("redis_pool_in_use", pool=self.name).set(
+            len(self._in_use_connections),
+        )
+
+
+def _create_pool(
+    name: str,
+    max_connections: int | None,
+    pool_timeout: float | None,
+    **connection_kwargs: Any,
+) -> ConnectionPool:
+    if max_connections is None:
+        return ConnectionPool(**connection_kwargs)
+
+    return MeteredBlockingConnectionPool(
+        name,
+        max_connections=max_connections,
+        timeout=pool_timeout,
+        **connection_kwargs,
+    )
+
 
 class RedisClient(Redis):
-    """A thin wrapper around the asynchronous Redis client."""
+    """A thin wrapper around the asynchronous Redis client.
+
+    Setting `max_connections` caps the connection pool, making callers wait
+    up to `pool_timeout` seconds for a free connection. Pubsub and other long
+    running or blocking commands go through `bulk`, a client with a separate
+    pool (capped by `bulk_max_connections`), so that they cannot starve
+    request traffic of connections."""
 
     def __init__(
         self,
@@ -22,25 +100,93 @@ class RedisClient(Redis):
         port: int,
         database: int = 0,
         password: str | None = None,
+        *,
+        max_connections: int | None = None,
+        pool_timeout: float | None = 5.0,
+        socket_timeout: float | None = None,
+        socket_connect_timeout: float | None = None,
+        socket_keepalive: bool = False,
+        health_check_interval: int = 0,
+        bulk_max_connections: int | None = None,
+        pubsub_workers: int = 8,
+        pubsub_queue_size: int = 256,
+        pubsub_retry_delay: float = 0.5,
+        pubsub_maximum_retry_delay: float = 30.0,
     ) -> None:
+        connection_kwargs: dict[str, Any] = {
+            "host": host,
+            "port": port,
+            "db": database,
+            "password": password,
+            "decode_responses": True,
+            "socket_connect_timeout": socket_connect_timeout,
+            "socket_keepalive": socket_keepalive,
+            "health_check_interval": health_check_interval,
+        }
+
         super().__init__(
-            host=host,
-            port=port,
-            db=database,
-            password=password,
-            decode_responses=True,
+            connection_pool=_create_pool(
+                "main",
+                max_connections,
+                pool_timeout,
+                socket_timeout=socket_timeout,
+                **connection_kwargs,
+            ),
+        )
+
+        # Blocking commands and subscriptions outlive any socket timeout,
+        # which is therefore not applied to the bulk pool.
+        self.bulk = Redis(
+            connection_pool=_create_pool(
+                "bulk",
+                bulk_max_connections,
+                pool_timeout,
+                **connection_kwargs,
+            ),
         )
 
         self._pubsub_router = RedisPubsubRouter()
-        self._tasks: Queue[Awaitable[None]] = Queue(100)
         self._pubsub_listen_lock = asyncio.Lock()
 
+        # Handlers are ran by a fixed number of workers. Once the queue is
+        # full, the listener stops reading from the connection, leaving
+        # Redis to buffer messages instead.
+        self._pubsub_worker_count = pubsub_workers
+        self._pubsub_queue: asyncio.Queue[_PubsubMessage] = asyncio.Queue(
+            pubsub_queue_size,
+        )
+        self._pubsub_retry_delay = pubsub_retry_delay
+        self._pubsub_maximum_retry_delay = pubsub_maximum_retry_delay
+        self._pubsub_tasks: list[asyncio.Task[None]] = []
+
     async def initialise(self) -> Self:
         if not self._pubsub_router.empty:
-            self._pubsub_task = self.__create_pubsub_task()
+            self._pubsub_tasks.append(
+                asyncio.create_task(self.__listen_pubsub_forever()),
+            )
+            self._pubsub_tasks.extend(
+                asyncio.create_task(self.__pubsub_worker())
+                for _ in range(self._pubsub_worker_count)
+            )
 
         return await self.initialize()
 
+    async def aclose(self, close_connection_pool: bool | None = None) -> None:
+        for task in self._pubsub_tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._pubsub_tasks, return_exceptions=True)
+        self._pubsub_tasks.clear()
+
+        await self.bulk.aclose(close_connection_pool=True)
+
+        # The client owns its pools, which are not closed by default when
+        # passed in explicitly.
+        if close_connection_pool is None:
+            close_connection_pool = True
+
+        await super().aclose(close_connection_pool)
+
     def register(
         self,
         channel: str,
@@ -51,36 +197,91 @@ class RedisClient(Redis):
     def include_router(self, router: RedisPubsubRouter) -> None:
         self._pubsub_router.merge(router)
 
+    async def __listen_pubsub_forever(self) -> None:
+        retry_delay = self._pubsub_retry_delay
+        while True:
+            try:
+                await self.__listen_pubsub()
+            except (ConnectionError, TimeoutError, OSError) as e:
+                # Jittered so that all workers do not reconnect at once.
+                delay = random.uniform(retry_delay / 2, retry_delay)
+                logger.warning(
+                    "Lost the Redis pubsub connection. Reconnecting.",
+                    extra={
+                        "error": str(e),
+                        "delay": delay,
+                    },
+                )
+                metrics.registry.counter("redis_pubsub_reconnects").increment()
+
+                await asyncio.sleep(delay)
+                retry_delay = min(retry_delay * 2, self._pubsub_maximum_retry_delay)
+            else:
+                retry_delay = self._pubsub_retry_delay
+
     async def __listen_pubsub(
         self,
     ) -> None:
         async with (
             self._pubsub_listen_lock,
-            self.pubsub() as pubsub,
+            self.bulk.pubsub() as pubsub,
         ):
-            for channel in self._pubsub_router.route_map():
-                await pubsub.subscribe(channel)
+            await pubsub.subscribe(*self._pubsub_router.route_map())
 
-            while True:
-                message = await pubsub.get_message()
-                if message is not None:
-                    if message.get("type") != "message":
-                        continue
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+
+                await self._pubsub_queue.put(
+                    _PubsubMessage(
+                        channel=message["channel"],
+                        data=message["data"],
+                        received_at=time.perf_counter(),
+                    ),
+                )
+                self.__record_queue_size()
 
-                    handler = self._pubsub_router._get_handler(message["channel"])
-                    assert handler is not None
+    async def __pubsub_worker(self) -> None:
+        while True:
+            message = await self._pubsub_queue.get()
+            self.__record_queue_size()
+            try:
+                await self.__handle_message(message)
+            finally:
+                self._pubsub_queue.task_done()
 
-                    # NOTE: Asyncio tasks can get GC'd lmfao.
-                    if self._tasks.full():
-                        self._tasks.get()
+    def __record_queue_size(self) -> None:
+        metrics.registry.gauge("redis_pubsub_queued").set(self._pubsub_queue.qsize())
 
-                    self._tasks.put(asyncio.create_task(handler(message["data"])))
+    async def __handle_message(self, message: _PubsubMessage) -> None:
+        handler = self._pubsub_router._get_handler(message.channel)
+        assert handler is not None
 
-                # NOTE: This is a hack to prevent the event loop from blocking.
-                await asyncio.sleep(0.1)
+        start = time.perf_counter()
+        metrics.registry.histogram(
+            "redis_pubsub_lag_seconds",
+            channel=message.channel,
+        ).observe(start - message.received_at)
 
-    async def __create_pubsub_task(self) -> asyncio.Task:
-        return asyncio.create_task(self.__listen_pubsub())
+        try:
+            await handler(message.data)
+        except Exception:
+            # A failing handler must not take a worker down with it.
+            logger.exception(
+                "Failed to handle a Redis pubsub message.",
+                extra={
+                    "channel": message.channel,
+                },
+            )
+            metrics.registry.counter(
+                "redis_pubsub_handler_failures",
+                channel=message.channel,
+            ).increment()
+        finally:
+            metrics.registry.histogram(
+                "redis_pubsub_handler_duration_seconds",
+                channel=message.channel,
+            ).observe(time.perf_counter() - start)
 
 
 class RedisPubsubRouter:
@@ -1,16 +1,45 @@
 from __future__ import annotations
 
 import asyncio
+import fcntl
+import hashlib
+import itertools
 import logging
 import os
+import random
+import time
+import urllib.parse
 from abc import ABC
 from abc import abstractmethod
+from collections.abc import AsyncIterator
+from collections.abc import Iterator
+from typing import Any
 
 from aiobotocore.config import AioConfig
 from aiobotocore.session import get_session
+from botocore.exceptions import ClientError
+
+from ognisko.utilities import metrics
 
 logger = logging.getLogger(__name__)
 
+_SHARDED_DIRECTORY_NAME = "sharded"
+"""The directory within a namespace holding the sharded layout. This prevents
+shard directory names from colliding with files in the flat layout."""
+
+_SPOOL_TEMPORARY_SUFFIX = ".tmp"
+"""The suffix of spool files which are still being written."""
+
+_SPOOL_LOCK_NAME = ".replay.lock"
+"""The lock held by the process replaying the spool."""
+
+_SPOOL_DEAD_LETTER_DIRECTORY = "dead"
+"""The spool directory holding files which repeatedly failed to upload."""
+
+_S3_MINIMUM_PART_SIZE = 5 * 1024 * 1024
+"""The smallest part size S3 accepts for all but the last part of a
+multipart upload."""
+
 
 class AbstractStorage(ABC):
     @abstractmethod
@@ -24,35 +53,179 @@ class AbstractStorage(ABC):
         that the file will be available immediately after this method."""
         ...
 
+    async def load_range(self, key: str, start: int, end: int) -> bytes | None:
+        """Loads the bytes between `start` and `end` (exclusive) of a binary
+        file from long-term storage."""
+        data = await self.load(key)
+        if data is None:
+            return None
+
+        return data[start:end]
+
 
 class LocalStorage(AbstractStorage):
-    def __init__(self, root: str) -> None:
+    """A storage implementation writing files to the local filesystem.
+
+    When `shard_depth` is non-zero, files are fanned out into nested
+    directories derived from a hash of their key (e.g.
+    `levels/sharded/ab/cd/123`) to keep directory sizes manageable. Files
+    stored under the flat layout remain readable until they are moved by
+    `migrate_layout`.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        *,
+        shard_depth: int = 0,
+        shard_width: int = 2,
+    ) -> None:
         self._root = root
+        self._shard_depth = shard_depth
+        self._shard_width = shard_width
 
-    def __ensure_subdirectories(self, key: str) -> None:
-        if "/" not in key:
-            return
+    @property
+    def is_sharded(self) -> bool:
+        return self._shard_depth > 0
+
+    def __flat_location(self, key: str) -> str:
+        return f"{self._root}/{key}"
 
-        directory = os.path.dirname(f"{self._root}/{key}")
-        os.makedirs(directory, exist_ok=True)
+    def __sharded_location(self, key: str) -> str:
+        namespace, _, name = key.rpartition("/")
+
+        # Only namespaced keys are sharded, keeping the root free of shard
+        # directories.
+        if not namespace:
+            return self.__flat_location(key)
+
+        digest = hashlib.md5(key.encode()).hexdigest()
+        shards = (
+            digest[i * self._shard_width : (i + 1) * self._shard_width]
+            for i in range(self._shard_depth)
+        )
+
+        return "/".join(
+            (self._root, namespace, _SHARDED_DIRECTORY_NAME, *shards, name),
+        )
+
+    def __location(self, key: str) -> str:
+        if self.is_sharded:
+            return self.__sharded_location(key)
+
+        return self.__flat_location(key)
+
+    def __candidate_locations(self, key: str) -> tuple[str, ...]:
+        # During a layout migration, the file may still be in the flat layout.
+        if self.is_sharded:
+            return self.__sharded_location(key), self.__flat_location(key)
+
+        return (self.__flat_location(key),)
 
     async def load(self, key: str) -> bytes | None:
-        location = f"{self._root}/{key}"
-        if not os.path.exists(location):
-            return None
+        for location in self.__candidate_locations(key):
+            try:
+                with open(location, "rb") as file:
+                    return file.read()
+            except FileNotFoundError:
+                continue
 
-        with open(location, "rb") as file:
-            return file.read()
+        return None
 
     async def save(self, key: str, data: bytes) -> None:
-        self.__ensure_subdirectories(key)
-        location = f"{self._root}/{key}"
+        location = self.__location(key)
+        os.makedirs(os.path.dirname(location), exist_ok=True)
 
         with open(location, "wb") as file:
             file.write(data)
 
+        # Prevent a stale flat copy from being migrated over the new data.
+        if self.is_sharded:
+            try:
+                os.remove(self.__flat_location(key))
+            except FileNotFoundError:
+                pass
+
+    def __flat_keys(self) -> Iterator[str]:
+        # NOTE: Keys are at most a single namespace deep (e.g. `levels/123`),
+        # so shard directories are never descended into.
+        if not os.path.isdir(self._root):
+            return
+
+        with os.scandir(self._root) as root_entries:
+            for root_entry in root_entries:
+                if not root_entry.is_dir():
+                    continue
+
+                with os.scandir(root_entry.path) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            yield f"{root_entry.name}/{entry.name}"
+
+    def __migrate_batch(self, keys: list[str]) -> int:
+        moved = 0
+        for key in keys:
+            source = self.__flat_location(key)
+            destination = self.__sharded_location(key)
+
+            try:
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                # Unlike a rename, linking never replaces the sharded copy
+                # written by a newer save.
+                os.link(source, destination)
+            except FileExistsError:
+                pass
+            # The flat copy was removed by a newer save.
+            except FileNotFoundError:
+                continue
+            else:
+                moved += 1
+
+            try:
+                os.remove(source)
+            except FileNotFoundError:
+                pass
+
+        return moved
+
+    async def migrate_layout(self, *, batch_size: int = 1000) -> int:
+        """Moves all files stored in the flat layout into the sharded layout.
+        Safe to run while the storage is serving requests, as reads fall
+        back to the flat layout. Returns the number of files moved.
+
+        This should only be ran by a single process at once."""
+
+        if not self.is_sharded:
+            return 0
+
+        moved = 0
+        keys = self.__flat_keys()
+        while batch := await asyncio.to_thread(
+            list,
+            itertools.islice(keys, batch_size),
+        ):
+            moved += await asyncio.to_thread(self.__migrate_batch, batch)
+            logger.debug(
+                "Migrated a batch of files to the sharded storage layout.",
+                extra={
+                    "moved": moved,
+                },
+            )
+
+        return moved
+
 
 class S3Storage(AbstractStorage):
+    """A storage implementation backed by an S3 compatible bucket.
+
+    Saves are written behind: the data is first persisted to a local spool
+    directory and then uploaded by a pool of background workers. Files still
+    in the spool are served by `load`, and are replayed on `connect` by a
+    single process sharing the spool, meaning a save is never lost to a
+    restart or an S3 outage. Files which fail to upload `max_upload_attempts`
+    times are moved to the spool's `dead` directory.
+    """
+
     def __init__(
         self,
         region: str,
@@ -61,10 +234,25 @@ class S3Storage(AbstractStorage):
         secret_key: str,
         bucket: str,
         timeout: int,
-        retries: int,
+        spool_directory: str,
+        upload_workers: int = 4,
+        retry_delay: float = 0.5,
+        maximum_retry_delay: float = 60.0,
+        max_upload_attempts: int = 10,
+        max_pool_connections: int = 10,
+        multipart_threshold: int = 8 * 1024 * 1024,
+        multipart_part_size: int = 8 * 1024 * 1024,
+        multipart_concurrency: int = 4,
+        read_chunk_size: int = 1024 * 1024,
+        read_retries: int = 3,
     ) -> None:
+        if multipart_part_size < _S3_MINIMUM_PART_SIZE:
+            raise ValueError("S3 multipart parts must be at least 5MiB.")
+
         boto_config = AioConfig(
-            timeout=timeout,
+            connect_timeout=timeout,
+            read_timeout=timeout,
+            max_pool_connections=max_pool_connections,
         )
         self._s3_creator = get_session().create_client(
             "s3",
@@ -76,65 +264,378 @@ class S3Storage(AbstractStorage):
         )
         self._s3 = None
         self._bucket = bucket
-        self._retries = retries
+
+        self._multipart_threshold = multipart_threshold
+        self._multipart_part_size = multipart_part_size
+        self._multipart_concurrency = multipart_concurrency
+        self._read_chunk_size = read_chunk_size
+        self._read_retries = read_retries
+
+        self._spool_directory = spool_directory
+        self._upload_workers = upload_workers
+        self._retry_delay = retry_delay
+        self._maximum_retry_delay = maximum_retry_delay
+        self._max_upload_attempts = max_upload_attempts
+        self._replay_lock: int | None = None
+
+        self._upload_queue: asyncio.Queue[str] = asyncio.Queue()
+        self._queued_keys: set[str] = set()
+        self._worker_tasks: list[asyncio.Task] = []
+
+        self._pending_gauge = metrics.registry.gauge("storage_s3_pending_uploads")
+        self._upload_latency = metrics.registry.histogram(
+            "storage_s3_upload_latency_seconds",
+        )
+        self._upload_failures = metrics.registry.counter("storage_s3_upload_failures")
+        self._dead_lettered = metrics.registry.counter("storage_s3_dead_lettered")
 
     async def connect(self) -> None:
         self._s3 = await self._s3_creator.__aenter__()
 
+        os.makedirs(self._spool_directory, exist_ok=True)
+        if await asyncio.to_thread(self.__acquire_replay_lock):
+            for key in await asyncio.to_thread(self.__spooled_keys):
+                self.__enqueue(key)
+
+        if self._queued_keys:
+            logger.info(
+                "Replaying pending S3 uploads from the spool.",
+                extra={
+                    "pending": len(self._queued_keys),
+                },
+            )
+
+        self._worker_tasks = [
+            asyncio.create_task(self.__upload_worker())
+            for _ in range(self._upload_workers)
+        ]
+
     async def disconnect(self) -> None:
+        # Anything not uploaded remains in the spool for the next startup.
+        for task in self._worker_tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
         await self._s3_creator.__aexit__(None, None, None)
         self._s3 = None
 
+        if self._replay_lock is not None:
+            os.close(self._replay_lock)
+            self._replay_lock = None
+
+    def __acquire_replay_lock(self) -> bool:
+        """Attempts to become the process replaying the spool, remaining so
+        until disconnected. Saves of other processes are otherwise uploaded
+        twice."""
+        lock = os.open(
+            f"{self._spool_directory}/{_SPOOL_LOCK_NAME}",
+            os.O_RDWR | os.O_CREAT,
+        )
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(lock)
+            return False
+
+        self._replay_lock = lock
+        return True
+
+    def __spooled_keys(self) -> list[str]:
+        with os.scandir(self._spool_directory) as entries:
+            return [
+                urllib.parse.unquote(entry.name)
+                for entry in entries
+                if entry.is_file()
+                and entry.name != _SPOOL_LOCK_NAME
+                and not entry.name.endswith(_SPOOL_TEMPORARY_SUFFIX)
+            ]
+
+    def __spool_location(self, key: str) -> str:
+        return f"{self._spool_directory}/{urllib.parse.quote(key, safe='')}"
+
+    def __write_spool(self, key: str, data: bytes) -> None:
+        location = self.__spool_location(key)
+        temporary_location = location + _SPOOL_TEMPORARY_SUFFIX
+
+        with open(temporary_location, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temporary_location, location)
+
+    def __read_spool(self, key: str) -> tuple[bytes, int] | None:
+        """Reads the spooled data alongside its inode, used to detect whether
+        the file has been replaced since."""
+        try:
+            with open(self.__spool_location(key), "rb") as file:
+                return file.read(), os.fstat(file.fileno()).st_ino
+        except FileNotFoundError:
+            return None
+
+    def __remove_spool(self, key: str, inode: int) -> None:
+        location = self.__spool_location(key)
+        try:
+            # A newer save has replaced the file and enqueued it again.
+            if os.stat(location).st_ino != inode:
+                return
+
+            os.remove(location)
+        except FileNotFoundError:
+            pass
+
+    def __dead_letter_spool(self, key: str, inode: int) -> None:
+        location = self.__spool_location(key)
+        dead_letter_directory = (
+            f"{self._spool_directory}/{_SPOOL_DEAD_LETTER_DIRECTORY}"
+        )
+        os.makedirs(dead_letter_directory, exist_ok=True)
+
+        try:
+            # A newer save has replaced the file and enqueued it again.
+            if os.stat(location).st_ino != inode:
+                return
+
+            os.replace(
+                location,
+                f"{dead_letter_directory}/{os.path.basename(location)}",
+            )
+        except FileNotFoundError:
+            pass
+
+    def __enqueue(self, key: str) -> None:
+        if key in self._queued_keys:
+            return
+
+        self._queued_keys.add(key)
+        self._upload_queue.put_nowait(key)
+        self._pending_gauge.set(len(self._queued_keys))
+
+    async def __upload_worker(self) -> None:
+        while True:
+            key = await self._upload_queue.get()
+            self._queued_keys.discard(key)
+            self._pending_gauge.set(len(self._queued_keys))
+
+            try:
+                await self.__upload(key)
+            finally:
+                self._upload_queue.task_done()
+
+    async def __upload(self, key: str) -> None:
+        spooled = await asyncio.to_thread(self.__read_spool, key)
+        if spooled is None:
+            return
+
+        data, inode = spooled
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                await self.__save_file(key, data)
+                break
+            except Exception as e:
+                self._upload_failures.increment()
+                attempt += 1
+
+                if attempt >= self._max_upload_attempts:
+                    logger.error(
+                        "Failed to save to S3. Moving it to the dead letter spool.",
+                        extra={
+                            "key": key,
+                            "attempt": attempt,
+                        },
+                        exc_info=e,
+                    )
+                    self._dead_lettered.increment()
+                    await asyncio.to_thread(self.__dead_letter_spool, key, inode)
+                    return
+
+                sleep_time = min(
+                    self._retry_delay * 2 ** (attempt - 1),
+                    self._maximum_retry_delay,
+                ) * random.uniform(0.5, 1.0)
+
+                logger.warning(
+                    "Failed to save to S3. Retrying...",
+                    extra={
+                        "key": key,
+                        "attempt": attempt,
+                        "sleep_time": sleep_time,
+                    },
+                    exc_info=e,
+                )
+                await asyncio.sleep(sleep_time)
+
+        self._upload_latency.observe(time.perf_counter() - start)
+        await asyncio.to_thread(self.__remove_spool, key, inode)
+
     async def __save_file(self, key: str, data: bytes) -> None:
         assert self._s3 is not None
 
+        if len(data) >= self._multipart_threshold:
+            return await self.__save_file_multipart(key, data)
+
         await self._s3.put_object(
             Bucket=self._bucket,
             Key=key,
             Body=data,
         )
 
-    async def __save(self, key: str, data: bytes) -> None:
-        for i in range(self._retries):
+    async def __save_file_multipart(self, key: str, data: bytes) -> None:
+        assert self._s3 is not None
+
+        upload = await self._s3.create_multipart_upload(
+            Bucket=self._bucket,
+            Key=key,
+        )
+        upload_id = upload["UploadId"]
+        semaphore = asyncio.Semaphore(self._multipart_concurrency)
+
+        async def upload_part(part_number: int, offset: int) -> dict[str, Any]:
+            assert self._s3 is not None
+
+            async with semaphore:
+                response = await self._s3.upload_part(
+                    Bucket=self._bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=data[offset : offset + self._multipart_part_size],
+                )
+
+            return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+        try:
+            parts = await asyncio.gather(
+                *(
+                    upload_part(part_number, offset)
+                    for part_number, offset in enumerate(
+                        range(0, len(data), self._multipart_part_size),
+                        start=1,
+                    )
+                ),
+            )
+            await self._s3.complete_multipart_upload(
+                Bucket=self._bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            # Avoid being billed for orphaned parts.
+            await self._s3.abort_multipart_upload(
+                Bucket=self._bucket,
+                Key=key,
+                UploadId=upload_id,
+            )
+            raise
+
+    @property
+    def pending_uploads(self) -> int:
+        """The number of keys waiting to be uploaded to S3."""
+        return len(self._queued_keys)
+
+    async def flush(self) -> None:
+        """Waits until every queued save has been uploaded."""
+        await self._upload_queue.join()
+
+    async def __stream_object(
+        self,
+        key: str,
+        start: int = 0,
+        end: int | None = None,
+    ) -> AsyncIterator[bytes]:
+        """Streams an object (or a range of it) in chunks. Interrupted reads
+        are resumed from the last received byte rather than restarted."""
+        assert self._s3 is not None
+
+        offset = start
+        attempt = 0
+        while True:
+            request: dict[str, Any] = {"Bucket": self._bucket, "Key": key}
+
+            # Empty objects reject any range, so avoid it where possible.
+            if offset or end is not None:
+                request["Range"] = f"bytes={offset}-{'' if end is None else end - 1}"
+
             try:
-                await self.__save_file(key, data)
+                response = await self._s3.get_object(**request)
+                body = response["Body"]
+                try:
+                    while chunk := await body.read(self._read_chunk_size):
+                        offset += len(chunk)
+                        yield chunk
+                finally:
+                    body.close()
+
                 return
+            except self._s3.exceptions.NoSuchKey:
+                raise
             except Exception as e:
-                sleep_time = i * 2
+                # The range starts at or past the end of the object.
+                if (
+                    isinstance(e, ClientError)
+                    and e.response["Error"]["Code"] == "InvalidRange"
+                ):
+                    return
+
+                attempt += 1
+                if attempt > self._read_retries:
+                    raise
+
                 logger.warning(
-                    "Failed to save to S3. Retrying...",
+                    "Reading from S3 was interrupted. Resuming...",
                     extra={
                         "key": key,
-                        "sleep_time": sleep_time,
+                        "offset": offset,
+                        "attempt": attempt,
                     },
                     exc_info=e,
                 )
-                await asyncio.sleep(sleep_time)
-
-        logger.error(
-            "Failed to save to S3 after retries.",
-            extra={
-                "key": key,
-                "retries": self._retries,
-            },
-        )
 
-    async def save(self, key: str, data: bytes) -> None:
+    async def stream(
+        self,
+        key: str,
+        start: int = 0,
+        end: int | None = None,
+    ) -> AsyncIterator[bytes]:
+        """Streams a file from S3 in chunks, without holding the entire file
+        in memory. Raises `KeyError` if the file does not exist."""
         if self._s3 is None:
             raise RuntimeError("The S3 client has not been connected!")
 
-        asyncio.create_task(self.__save(key, data))
+        spooled = await asyncio.to_thread(self.__read_spool, key)
+        if spooled is not None:
+            yield spooled[0][start:end]
+            return
 
-    async def load(self, key: str) -> bytes | None:
+        try:
+            async for chunk in self.__stream_object(key, start, end):
+                yield chunk
+        except self._s3.exceptions.NoSuchKey:
+            raise KeyError(key)
+
+    async def save(self, key: str, data: bytes) -> None:
         if self._s3 is None:
             raise RuntimeError("The S3 client has not been connected!")
 
+        await asyncio.to_thread(self.__write_spool, key, data)
+        self.__enqueue(key)
+
+    async def load(self, key: str) -> bytes | None:
         try:
-            response = await self._s3.get_object(
-                Bucket=self._bucket,
-                Key=key,
-            )
-        except self._s3.exceptions.NoSuchKey:
+            return b"".join([chunk async for chunk in self.stream(key)])
+        except KeyError:
             return None
 
-        return await response["Body"].read()
+    async def load_range(self, key: str, start: int, end: int) -> bytes | None:
+        if start >= end:
+            return b""
+
+        try:
+            return b"".join([chunk async for chunk in self.stream(key, start, end)])
+        except KeyError:
+            return None
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import urllib.parse
 import uuid
@@ -11,7 +12,6 @@ from fastapi.exceptions import RequestValidationError
 from fastapi.requests import Request
 from fastapi.responses import JSONResponse
 from fastapi.responses import Response
-from fastapi_limiter import FastAPILimiter
 from starlette.middleware.base import RequestResponseEndpoint
 
 import ognisko.logger
@@ -19,11 +19,21 @@ from ognisko import settings
 from ognisko.adapters import MeiliSearchClient
 from ognisko.adapters.boomlings import GeometryDashClient
 from ognisko.adapters.mysql import MySQLService
+from ognisko.adapters.ratelimit import RedisRateLimiter
 from ognisko.adapters.redis import RedisClient
 from ognisko.adapters.storage import LocalStorage
 from ognisko.adapters.storage import S3Storage
 from ognisko.constants.responses import GenericResponse
+from ognisko.resources import CachedLevelSchedule
+from ognisko.resources import EmbeddedLevelIndex
+from ognisko.resources import LevelData
+from ognisko.resources import LevelNominationSnapshot
+from ognisko.services import level_schedules
+from ognisko.services import search_index
+from ognisko.utilities import metrics
 from ognisko.utilities.cache.memory import SimpleAsyncMemoryCache
+from ognisko.utilities.cache.memory import SimpleMemoryCache
+from ognisko.utilities.cache.memory import SizedLRUMemoryCache
 
 from . import context
 from . import gd
@@ -61,6 +71,13 @@ def init_events(app: FastAPI) -> None:
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         )
 
+    @app.exception_handler(gd.dependencies.RateLimitExceeded)
+    async def on_rate_limit_exceeded(
+        request: Request,
+        e: gd.dependencies.RateLimitExceeded,
+    ) -> Response:
+        return Response(str(GenericResponse.FAIL))
+
 
 def init_mysql(app: FastAPI) -> None:
     # Use asyncmy if available (~2x faster than the default MySQL driver).
@@ -107,6 +124,19 @@ def init_redis(app: FastAPI) -> None:
         settings.REDIS_HOST,
         settings.REDIS_PORT,
         settings.REDIS_DATABASE,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        pool_timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_keepalive=settings.REDIS_SOCKET_KEEPALIVE,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        bulk_max_connections=settings.REDIS_BULK_MAX_CONNECTIONS,
+        pubsub_workers=settings.REDIS_PUBSUB_WORKERS,
+        pubsub_queue_size=settings.REDIS_PUBSUB_QUEUE_SIZE,
+    )
+    app.state.ratelimiter = RedisRateLimiter(
+        app.state.redis,
+        lease_fraction=settings.OGNISKO_RATELIMIT_LEASE_FRACTION,
     )
 
     @app.on_event("startup")
@@ -118,12 +148,6 @@ def init_redis(app: FastAPI) -> None:
 
         await app.state.redis.initialise()
 
-        # TODO: Custom ratelimit callback that returns `-1`.
-        await FastAPILimiter.init(
-            app.state.redis,
-            prefix="ognisko:ratelimit",
-        )
-
         logger.info(
             "Connected to the Redis database.",
             extra={
@@ -143,11 +167,29 @@ def init_meili(app: FastAPI) -> None:
         settings.MEILI_PORT,
         settings.MEILI_MASTER_KEY,
         timeout=10,
+        bulk_batch_size=settings.MEILI_BULK_BATCH_SIZE,
+        bulk_concurrency=settings.MEILI_BULK_CONCURRENCY,
+        bulk_max_enqueued_tasks=settings.MEILI_BULK_MAX_ENQUEUED_TASKS,
     )
 
     @app.on_event("startup")
     async def startup() -> None:
-        await app.state.meili.health()
+        try:
+            await app.state.meili.health()
+        except Exception:
+            # Searches are still served while MeiliSearch is down.
+            if settings.OGNISKO_EMBEDDED_LEVEL_SEARCH == "disabled":
+                raise
+
+            logger.warning(
+                "Failed to connect to the MeiliSearch database.",
+                exc_info=True,
+                extra={
+                    "host": settings.MEILI_HOST,
+                },
+            )
+            return
+
         logger.info(
             "Connected to the MeiliSearch database.",
             extra={
@@ -156,6 +198,82 @@ def init_meili(app: FastAPI) -> None:
         )
 
 
+def _log_background_task_failure(task: asyncio.Task[None]) -> None:
+    if task.cancelled() or task.exception() is None:
+        return
+
+    logger.error(
+        "A background task stopped unexpectedly.",
+        exc_info=task.exception(),
+        extra={
+            "task": task.get_coro().__qualname__,
+        },
+    )
+
+
+def init_embedded_search(app: FastAPI) -> None:
+    app.state.embedded_level_search = None
+    app.state.embedded_level_search_tasks = []
+
+    if settings.OGNISKO_EMBEDDED_LEVEL_SEARCH == "disabled":
+        logger.debug("Skipping the embedded level search.")
+        return
+
+    app.state.embedded_level_search = EmbeddedLevelIndex(
+        primary=settings.OGNISKO_EMBEDDED_LEVEL_SEARCH == "primary",
+    )
+
+    @app.on_event("startup")
+    async def startup() -> None:
+        # Levels are loaded in the background, with searches going to
+        # MeiliSearch in the meantime.
+        ctx = context.PubsubContext(app)
+        app.state.embedded_level_search_tasks = [
+            asyncio.create_task(search_index.load_embedded_levels(ctx)),
+            asyncio.create_task(search_index.run_embedded_refresher(ctx)),
+        ]
+        for task in app.state.embedded_level_search_tasks:
+            task.add_done_callback(_log_background_task_failure)
+
+        logger.info(
+            "Initialised the embedded level search.",
+            extra={
+                "mode": settings.OGNISKO_EMBEDDED_LEVEL_SEARCH,
+            },
+        )
+
+    @app.on_event("shutdown")
+    async def shutdown() -> None:
+        for task in app.state.embedded_level_search_tasks:
+            task.cancel()
+
+
+def init_level_nomination(app: FastAPI) -> None:
+    app.state.level_nomination_snapshot = None
+    app.state.level_nomination_tasks = []
+
+    if not settings.OGNISKO_LEVEL_NOMINATION_SNAPSHOT:
+        logger.debug("Skipping the level nomination snapshot.")
+        return
+
+    app.state.level_nomination_snapshot = LevelNominationSnapshot()
+
+    @app.on_event("startup")
+    async def startup() -> None:
+        ctx = context.PubsubContext(app)
+        app.state.level_nomination_tasks = [
+            asyncio.create_task(level_schedules.load_nomination_snapshot(ctx)),
+            asyncio.create_task(level_schedules.run_nomination_refresher(ctx)),
+        ]
+        for task in app.state.level_nomination_tasks:
+            task.add_done_callback(_log_background_task_failure)
+
+    @app.on_event("shutdown")
+    async def shutdown() -> None:
+        for task in app.state.level_nomination_tasks:
+            task.cancel()
+
+
 # def init_s3_storage(app: FastAPI) -> None:
 #     app.state.storage = S3Storage(
 #         region=settings.S3_REGION,
@@ -163,13 +281,17 @@ def init_meili(app: FastAPI) -> None:
 #         access_key=settings.S3_ACCESS_KEY,
 #         secret_key=settings.S3_SECRET_KEY,
 #         bucket=settings.S3_BUCKET,
-#         retries=10,
 #         timeout=5,
+#         spool_directory=settings.S3_SPOOL_DIRECTORY,
+#         upload_workers=settings.S3_UPLOAD_WORKERS,
+#         max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+#         multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+#         multipart_concurrency=settings.S3_MULTIPART_CONCURRENCY,
 #     )
 #
 #     @app.on_event("startup")
 #     async def startup() -> None:
-#         app.state.storage = await app.state.storage.connect()
+#         await app.state.storage.connect()
 #         logger.info(
 #             "Connected to S3 storage.",
 #             extra={
@@ -186,8 +308,12 @@ def init_meili(app: FastAPI) -> None:
 def init_local_storage(app: FastAPI) -> None:
     app.state.storage = LocalStorage(
         root=settings.OGNISKO_INTERNAL_DATA_DIRECTORY,
+        shard_depth=settings.OGNISKO_STORAGE_SHARD_DEPTH,
+        shard_width=settings.OGNISKO_STORAGE_SHARD_WIDTH,
     )
 
+    # Files left in the flat layout are moved by the background job worker,
+    # with reads falling back to the flat layout in the meantime.
     @app.on_event("startup")
     async def startup() -> None:
         logger.info("Connected to the local storage.")
@@ -211,6 +337,35 @@ def init_cache(app: FastAPI) -> None:
 
     logger.info("Initialised stateful password caching.")
 
+    app.state.level_data_cache = SizedLRUMemoryCache[LevelData](
+        settings.OGNISKO_LEVEL_DATA_CACHE_SIZE,
+        sizeof=lambda level_data: level_data.size,
+        minimum_hits=settings.OGNISKO_LEVEL_DATA_CACHE_MINIMUM_HITS,
+    )
+
+    logger.info(
+        "Initialised level data caching.",
+        extra={
+            "size": settings.OGNISKO_LEVEL_DATA_CACHE_SIZE,
+        },
+    )
+
+    app.state.level_schedule_cache = SimpleMemoryCache[CachedLevelSchedule]()
+
+    logger.info("Initialised level schedule caching.")
+
+
+def init_metrics(app: FastAPI) -> None:
+    if not settings.OGNISKO_METRICS_ENABLED:
+        logger.debug("Skipping the metrics endpoint.")
+        return
+
+    @app.get("/metrics")
+    async def metrics_get() -> JSONResponse:
+        return JSONResponse(metrics.registry.snapshot())
+
+    logger.debug("Exposing in-process metrics.")
+
 
 def init_gd_routers(app: FastAPI) -> None:
     import ognisko.api
@@ -227,9 +382,23 @@ def init_middlewares(app: FastAPI) -> None:
                 "uuid": request.state.uuid,
             },
         )
+        request.state.after_commit = []
         async with app.state.mysql.transaction() as sql:
             request.state.mysql = sql
-            return await call_next(request)
+            response = await call_next(request)
+
+        for callback in request.state.after_commit:
+            try:
+                await callback()
+            except Exception:
+                logger.exception(
+                    "Failed to run a callback after committing a request.",
+                    extra={
+                        "uuid": request.state.uuid,
+                    },
+                )
+
+        return response
 
     if settings.OGNISKO_USE_USER_AGENT_GUARD:
         logger.debug("Using User-Agent guard middleware.")
@@ -304,6 +473,9 @@ def init_api() -> FastAPI:
     init_local_storage(app)
 
     init_cache(app)
+    init_embedded_search(app)
+    init_level_nomination(app)
+    init_metrics(app)
 
     init_gd_routers(app)
 
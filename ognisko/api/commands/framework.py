@@ -245,6 +245,9 @@ class CommandContext(Context):
     def gd(self) -> GeometryDashClient:
         return self._base_context.gd
 
+    async def after_commit(self, callback: Callable[[], Awaitable[None]]) -> None:
+        await self._base_context.after_commit(callback)
+
 
 CommandEventHandler = Callable[[CommandContext], Awaitable[str]]
 CommandErrorHandler = Callable[[CommandContext, Exception], Awaitable[str]]
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from ognisko.api.commands.framework import CommandContext
 from ognisko.api.commands.framework import CommandRouter
+from ognisko.resources import PresenceRepository
 
 router = CommandRouter("misc_root")
 
@@ -14,3 +15,16 @@ async def ping(ctx: CommandContext) -> str:
 @router.register_function()
 async def echo(ctx: CommandContext, phrase: str) -> str:
     return f"And the forest echoed: {phrase!r}"
+
+
+@router.register_function()
+async def online(ctx: CommandContext) -> str:
+    presence = PresenceRepository(ctx.redis)
+    online_count = await presence.count_online()
+    daily_count = await presence.count_daily()
+    monthly_count = await presence.count_monthly()
+
+    return (
+        f"Online: {online_count} | Today: {daily_count} | "
+        f"This month: ~{monthly_count}"
+    )
@@ -3,8 +3,8 @@ from __future__ import annotations
 from ognisko.api.commands.framework import CommandContext
 from ognisko.api.commands.framework import CommandRouter
 from ognisko.api.commands.framework import unwrap_service
-from ognisko.constants.level_schedules import LevelScheduleType
 from ognisko.constants.users import UserPrivileges
+from ognisko.resources.level_schedule import LevelScheduleType
 from ognisko.services import level_schedules
 
 router = CommandRouter("schedule_root")
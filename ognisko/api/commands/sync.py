@@ -1,13 +1,10 @@
 from __future__ import annotations
 
-import asyncio
-
+from ognisko import jobs
+from ognisko.adapters.jobs import JobQueue
 from ognisko.api.commands.framework import CommandContext
 from ognisko.api.commands.framework import CommandRouter
 from ognisko.constants.users import UserPrivileges
-from ognisko.services import leaderboards
-from ognisko.services import levels
-from ognisko.services import users
 
 router = CommandRouter("sunc_root")
 
@@ -16,12 +13,25 @@ sync_group = CommandRouter("sync")
 router.register_command(sync_group)
 
 
+async def schedule(ctx: CommandContext, *job_types: str) -> bool:
+    """Enqueues each job unless it is already queued or running. Returns
+    whether any job was enqueued."""
+    queue = JobQueue(ctx.redis)
+
+    enqueued = False
+    for job_type in job_types:
+        enqueued |= await queue.enqueue(job_type, unique=True) is not None
+
+    return enqueued
+
+
 @sync_group.register_function(
     name="levels",
     required_privileges=UserPrivileges.SERVER_RESYNC_SEARCH,
 )
 async def level_search(ctx: CommandContext) -> str:
-    asyncio.create_task(levels.synchronise_search(ctx))
+    if not await schedule(ctx, jobs.LEVELS_SYNC_SEARCH):
+        return "Search synchronisation is already in progress."
 
     return "Search synchronisation scheduled."
 
@@ -31,17 +41,66 @@ async def level_search(ctx: CommandContext) -> str:
     required_privileges=UserPrivileges.SERVER_RESYNC_LEADERBOARDS,
 )
 async def leaderboard_search(ctx: CommandContext) -> str:
-    asyncio.create_task(leaderboards.synchronise_top_stars(ctx))
-    asyncio.create_task(leaderboards.synchronise_top_creators(ctx))
+    if not await schedule(
+        ctx,
+        jobs.LEADERBOARDS_SYNC_STARS,
+        jobs.LEADERBOARDS_SYNC_CREATORS,
+    ):
+        return "Leaderboard synchronisation is already in progress."
 
     return "Leaderboard synchronisation scheduled."
 
 
+@sync_group.register_function(
+    name="creator_points",
+    required_privileges=UserPrivileges.SERVER_RESYNC_LEADERBOARDS,
+)
+async def creator_points_recompute(ctx: CommandContext) -> str:
+    if not await schedule(ctx, jobs.CREATOR_POINTS_RECOMPUTE):
+        return "Creator point recalculation is already in progress."
+
+    return "Creator point recalculation scheduled."
+
+
 @sync_group.register_function(
     name="users",
     required_privileges=UserPrivileges.SERVER_RESYNC_SEARCH,
 )
 async def user_search(ctx: CommandContext) -> str:
-    asyncio.create_task(users.synchronise_search(ctx))
+    if not await schedule(ctx, jobs.USERS_SYNC_SEARCH):
+        return "User search synchronisation is already in progress."
 
     return "User search synchronisation scheduled."
+
+
+@sync_group.register_function(
+    name="level_data",
+    required_privileges=UserPrivileges.SERVER_RESYNC_SEARCH,
+)
+async def level_data_metadata(ctx: CommandContext) -> str:
+    if not await schedule(ctx, jobs.LEVELS_BACKFILL_DATA_METADATA):
+        return "Level data metadata backfill is already in progress."
+
+    return "Level data metadata backfill scheduled."
+
+
+@sync_group.register_function(
+    name="levels_rollback",
+    required_privileges=UserPrivileges.SERVER_RESYNC_SEARCH,
+)
+async def level_search_rollback(ctx: CommandContext) -> str:
+    if not await schedule(ctx, jobs.LEVELS_ROLLBACK_SEARCH):
+        return "Search rollback is already in progress."
+
+    return "Search rollback scheduled."
+
+
+@sync_group.register_function(
+    name="users_rollback",
+    required_privileges=UserPrivileges.SERVER_RESYNC_SEARCH,
+)
+async def user_search_rollback(ctx: CommandContext) -> str:
+    if not await schedule(ctx, jobs.USERS_ROLLBACK_SEARCH):
+        return "User search rollback is already in progress."
+
+    return "User search rollback scheduled."
@@ -1,5 +1,7 @@
 # from __future__ import annotations # This causes a pydantic issue. Yikes.
 
+from collections.abc import Awaitable
+from collections.abc import Callable
 from typing import override
 
 from fastapi import FastAPI
@@ -10,7 +12,12 @@ from ognisko.adapters.meilisearch import MeiliSearchClient
 from ognisko.adapters.mysql import ImplementsMySQL
 from ognisko.adapters.redis import RedisClient
 from ognisko.adapters.storage import AbstractStorage
+from ognisko.resources import CachedLevelSchedule
 from ognisko.resources import Context
+from ognisko.resources import EmbeddedLevelIndex
+from ognisko.resources import LevelData
+from ognisko.resources import LevelNominationSnapshot
+from ognisko.utilities.cache import AbstractCache
 
 
 class HTTPContext(Context):
@@ -42,6 +49,31 @@ class HTTPContext(Context):
     def _gd(self) -> GeometryDashClient:
         return self.request.app.state.gd
 
+    @property
+    @override
+    def _level_data_cache(self) -> AbstractCache[LevelData]:
+        return self.request.app.state.level_data_cache
+
+    @property
+    @override
+    def _level_schedule_cache(self) -> AbstractCache[CachedLevelSchedule]:
+        return self.request.app.state.level_schedule_cache
+
+    @property
+    @override
+    def _embedded_level_search(self) -> EmbeddedLevelIndex | None:
+        return self.request.app.state.embedded_level_search
+
+    @property
+    @override
+    def _level_nomination_snapshot(self) -> LevelNominationSnapshot | None:
+        return self.request.app.state.level_nomination_snapshot
+
+    @override
+    async def after_commit(self, callback: Callable[[], Awaitable[None]]) -> None:
+        # Ran by the `mysql_transaction` middleware.
+        self.request.state.after_commit.append(callback)
+
 
 # FIXME: Proper context for pubsub handlers that does not rely on app.
 class PubsubContext(Context):
@@ -74,3 +106,23 @@ class PubsubContext(Context):
     @override
     def _gd(self) -> GeometryDashClient:
         return self.state.gd
+
+    @property
+    @override
+    def _level_data_cache(self) -> AbstractCache[LevelData]:
+        return self.state.level_data_cache
+
+    @property
+    @override
+    def _level_schedule_cache(self) -> AbstractCache[CachedLevelSchedule]:
+        return self.state.level_schedule_cache
+
+    @property
+    @override
+    def _embedded_level_search(self) -> EmbeddedLevelIndex | None:
+        return self.state.embedded_level_search
+
+    @property
+    @override
+    def _level_nomination_snapshot(self) -> LevelNominationSnapshot | None:
+        return self.state.level_nomination_snapshot
@@ -5,10 +5,12 @@ from collections.abc import Callable
 
 from fastapi import Depends
 from fastapi import Form
+from fastapi import Request
 from fastapi.exceptions import HTTPException
 
 from ognisko import logger
 from ognisko import services
+from ognisko.adapters.ratelimit import RateLimit
 from ognisko.api.context import HTTPContext
 from ognisko.constants.errors import ServiceError
 from ognisko.constants.responses import GenericResponse
@@ -16,6 +18,44 @@ from ognisko.constants.users import UserPrivileges
 from ognisko.models.user import User
 
 
+async def _authenticate_gjp2(
+    ctx: HTTPContext,
+    user_id: int,
+    gjp: str,
+    required_privileges: UserPrivileges | None,
+) -> User | None:
+    user = await services.user_credentials.authenticate_from_gjp2(
+        ctx,
+        user_id,
+        gjp,
+    )
+
+    if isinstance(user, ServiceError):
+        logger.debug(
+            "Authentication failed for user.",
+            extra={
+                "user_id": user_id,
+                "error": user.value,
+            },
+        )
+        return None
+
+    if required_privileges is not None and not (
+        user.privileges & required_privileges == required_privileges
+    ):
+        logger.debug(
+            "Authentication failed for user due to insufficient privileges.",
+            extra={
+                "user_id": user_id,
+                "privileges": user.privileges,
+                "required_privileges": required_privileges,
+            },
+        )
+        return None
+
+    return user
+
+
 # TODO: add option to replicate https://github.com/RealistikDash/GDPyS/blob/9266cc57c3a4c5d1f51363aa3899ee3c09a23ee8/web/http.py#L338-L341
 def authenticate_dependency(
     user_id_alias: str = "accountID",
@@ -28,36 +68,8 @@ def authenticate_dependency(
         # A gjp2 is a hash thats always 40 characters long.
         gjp: str = Form(..., alias=password_alias, min_length=40, max_length=40),
     ) -> User:
-        user = await services.user_credentials.authenticate_from_gjp2(
-            ctx,
-            user_id,
-            gjp,
-        )
-
-        if isinstance(user, ServiceError):
-            logger.debug(
-                "Authentication failed for user.",
-                extra={
-                    "user_id": user_id,
-                    "error": user.value,
-                },
-            )
-            raise HTTPException(
-                status_code=200,
-                detail=str(GenericResponse.FAIL),
-            )
-
-        if required_privileges is not None and not (
-            user.privileges & required_privileges == required_privileges
-        ):
-            logger.debug(
-                "Authentication failed for user due to insufficient privileges.",
-                extra={
-                    "user_id": user_id,
-                    "privileges": user.privileges,
-                    "required_privileges": required_privileges,
-                },
-            )
+        user = await _authenticate_gjp2(ctx, user_id, gjp, required_privileges)
+        if user is None:
             raise HTTPException(
                 status_code=200,
                 detail=str(GenericResponse.FAIL),
@@ -68,6 +80,32 @@ def authenticate_dependency(
     return wrapper
 
 
+def optional_authenticate_dependency(
+    user_id_alias: str = "accountID",
+    password_alias: str = "gjp2",
+) -> Callable[[HTTPContext, int | None, str | None], Awaitable[User | None]]:
+    """Authenticates the user if credentials were sent, for endpoints that
+    are also usable while logged out. Users failing authentication are
+    treated as logged out."""
+
+    async def wrapper(
+        ctx: HTTPContext = Depends(),
+        user_id: int | None = Form(None, alias=user_id_alias),
+        gjp: str | None = Form(
+            None,
+            alias=password_alias,
+            min_length=40,
+            max_length=40,
+        ),
+    ) -> User | None:
+        if not user_id or gjp is None:
+            return None
+
+        return await _authenticate_gjp2(ctx, user_id, gjp, None)
+
+    return wrapper
+
+
 def password_authenticate_dependency(
     username_alias: str = "userName",
     password_alias: str = "password",
@@ -116,3 +154,45 @@ def password_authenticate_dependency(
         return user
 
     return wrapper
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a client exceeds a route's rate limit."""
+
+
+def _client_identifier(request: Request) -> str:
+    forwarded = request.headers.get("X-Forwarded-For")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+
+    return request.client.host if request.client else "unknown"
+
+
+def ratelimit_dependency(
+    name: str,
+    limit: tuple[int, int],
+) -> Callable[[Request], Awaitable[None]]:
+    """Limits the route to `limit` (requests, seconds) per client IP,
+    responding with the client's generic failure code once exceeded."""
+
+    rate_limit = RateLimit(*limit)
+
+    async def wrapper(request: Request) -> None:
+        identifier = _client_identifier(request)
+        allowed = await request.app.state.ratelimiter.acquire(
+            name,
+            identifier,
+            rate_limit,
+        )
+
+        if not allowed:
+            logger.debug(
+                "Client request stopped due to the rate limit.",
+                extra={
+                    "name": name,
+                    "identifier": identifier,
+                },
+            )
+            raise RateLimitExceeded
+
+    return wrapper
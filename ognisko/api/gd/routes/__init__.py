@@ -3,9 +3,9 @@ from __future__ import annotations
 from fastapi import APIRouter
 from fastapi import Depends
 from fastapi.responses import PlainTextResponse
-from fastapi_limiter.depends import RateLimiter
 
 from ognisko import settings
+from ognisko.api.gd.dependencies import ratelimit_dependency
 
 from . import leaderboards
 from . import level_comments
@@ -28,7 +28,12 @@ router.add_api_route(
     users.register_post,
     methods=["POST"],
     dependencies=[
-        Depends(RateLimiter(times=10, minutes=10)),
+        Depends(
+            ratelimit_dependency(
+                "register",
+                settings.OGNISKO_RATELIMIT_REGISTER,
+            ),
+        ),
     ],
 )
 
@@ -66,7 +71,12 @@ router.add_api_route(
     user_relationships.friend_request_post,
     methods=["POST"],
     dependencies=[
-        Depends(RateLimiter(times=1, seconds=30)),
+        Depends(
+            ratelimit_dependency(
+                "friend_request",
+                settings.OGNISKO_RATELIMIT_FRIEND_REQUEST,
+            ),
+        ),
     ],
 )
 
@@ -105,7 +115,12 @@ router.add_api_route(
     user_relationships.block_user_post,
     methods=["POST"],
     dependencies=[
-        Depends(RateLimiter(times=1, seconds=30)),
+        Depends(
+            ratelimit_dependency(
+                "block",
+                settings.OGNISKO_RATELIMIT_BLOCK,
+            ),
+        ),
     ],
 )
 
@@ -120,7 +135,12 @@ router.add_api_route(
     user_comments.user_comments_post,
     methods=["POST"],
     dependencies=[
-        Depends(RateLimiter(times=4, minutes=1)),
+        Depends(
+            ratelimit_dependency(
+                "user_comment",
+                settings.OGNISKO_RATELIMIT_USER_COMMENT,
+            ),
+        ),
     ],
 )
 
@@ -154,7 +174,12 @@ router.add_api_route(
     save_data.save_data_post,
     methods=["POST"],
     dependencies=[
-        Depends(RateLimiter(times=1, minutes=5)),
+        Depends(
+            ratelimit_dependency(
+                "save_data_backup",
+                settings.OGNISKO_RATELIMIT_SAVE_DATA_BACKUP,
+            ),
+        ),
     ],
 )
 
@@ -170,7 +195,12 @@ router.add_api_route(
     methods=["POST"],
     # TODO: Tweak based on average user behaviour. May be way too high.
     dependencies=[
-        Depends(RateLimiter(times=3, minutes=10)),
+        Depends(
+            ratelimit_dependency(
+                "level_upload",
+                settings.OGNISKO_RATELIMIT_LEVEL_UPLOAD,
+            ),
+        ),
     ],
 )
 
@@ -186,7 +216,12 @@ router.add_api_route(
     methods=["POST"],
     # TODO: Tweak based on average user behaviour. May be too low.
     dependencies=[
-        Depends(RateLimiter(times=100, minutes=10)),
+        Depends(
+            ratelimit_dependency(
+                "level_download",
+                settings.OGNISKO_RATELIMIT_LEVEL_DOWNLOAD,
+            ),
+        ),
     ],
 )
 
@@ -201,7 +236,12 @@ router.add_api_route(
     user_comments.like_target_post,
     methods=["POST"],
     dependencies=[
-        Depends(RateLimiter(times=50, minutes=10)),
+        Depends(
+            ratelimit_dependency(
+                "like",
+                settings.OGNISKO_RATELIMIT_LIKE,
+            ),
+        ),
     ],
 )
 
@@ -216,7 +256,12 @@ router.add_api_route(
     level_comments.create_comment_post,
     methods=["POST"],
     dependencies=[
-        Depends(RateLimiter(times=15, minutes=1)),
+        Depends(
+            ratelimit_dependency(
+                "level_comment",
+                settings.OGNISKO_RATELIMIT_LEVEL_COMMENT,
+            ),
+        ),
     ],
 )
 
@@ -243,7 +288,12 @@ router.add_api_route(
     messages.message_post,
     methods=["POST"],
     dependencies=[
-        Depends(RateLimiter(times=5, minutes=5)),
+        Depends(
+            ratelimit_dependency(
+                "message",
+                settings.OGNISKO_RATELIMIT_MESSAGE,
+            ),
+        ),
     ],
 )
 
@@ -6,18 +6,25 @@ from fastapi import Form
 from ognisko import logger
 from ognisko.api import responses
 from ognisko.api.context import HTTPContext
+from ognisko.api.gd.dependencies import optional_authenticate_dependency
 from ognisko.common import gd_obj
 from ognisko.constants.errors import ServiceError
 from ognisko.constants.leaderboards import LeaderboardType
+from ognisko.models.user import User
 from ognisko.services import leaderboards
 
 
 async def leaderboard_get(
     ctx: HTTPContext = Depends(),
+    user: User | None = Depends(optional_authenticate_dependency()),
     leaderboard_type: LeaderboardType = Form(..., alias="type"),
 ):
 
-    leaderboard = await leaderboards.get(ctx, leaderboard_type)
+    leaderboard = await leaderboards.get(
+        ctx,
+        leaderboard_type,
+        user_id=user.id if user is not None else None,
+    )
 
     if isinstance(leaderboard, ServiceError):
         logger.info(
@@ -36,7 +43,22 @@ async def leaderboard_get(
         },
     )
 
+    # The scores on the leaderboard may be more recent than the profiles.
+    if leaderboard_type is LeaderboardType.CREATOR:
+        return "|".join(
+            gd_obj.dumps(
+                gd_obj.create_ranked_profile(
+                    entry.profile,
+                    entry.rank,
+                    creator_points=entry.score,
+                ),
+            )
+            for entry in leaderboard
+        )
+
     return "|".join(
-        gd_obj.dumps(gd_obj.create_profile(user, rank=idx + 1))
-        for idx, user in enumerate(leaderboard)
+        gd_obj.dumps(
+            gd_obj.create_ranked_profile(entry.profile, entry.rank, stars=entry.score),
+        )
+        for entry in leaderboard
     )
@@ -14,19 +14,56 @@ from ognisko.api.validators import CommaSeparatedIntList
 from ognisko.api.validators import TextBoxString
 from ognisko.common import gd_obj
 from ognisko.constants.errors import ServiceError
-from ognisko.constants.level_schedules import LevelScheduleType
 from ognisko.constants.levels import LevelDemonRating
 from ognisko.constants.levels import LevelFeature
 from ognisko.constants.levels import LevelLength
 from ognisko.constants.levels import LevelSearchType
 from ognisko.constants.users import UserPrivileges
 from ognisko.models.user import User
+from ognisko.resources.level_schedule import LevelScheduleType
 from ognisko.services import level_schedules
 from ognisko.services import levels
 from ognisko.services import songs
 
 PAGE_SIZE = 10
 
+# The time (in seconds) for which the responses of browse tabs are cached.
+# Responses are only cached for the first pages, which are identical for all
+# users and make up most of the traffic.
+SEARCH_CACHE_TTLS = {
+    LevelSearchType.MOST_DOWNLOADED: 120,
+    LevelSearchType.MOST_LIKED: 120,
+    LevelSearchType.TRENDING: 60,
+    # Invalidated when levels are uploaded or (un)listed.
+    LevelSearchType.RECENT: 60,
+    LevelSearchType.FEATURED: 300,
+    LevelSearchType.MAGIC: 300,
+    LevelSearchType.AWARDED: 300,
+}
+SEARCH_CACHE_PAGES = 5
+
+
+def search_cache_key(
+    page: int,
+    level_lengths: list[LevelLength] | None,
+    featured: bool,
+    original: bool,
+    two_player: bool,
+    unrated: bool,
+    rated: bool,
+    song_id: int | None,
+    custom_song_id: int | None,
+) -> str:
+    if level_lengths:
+        lengths = ",".join(str(x) for x in sorted({x.value for x in level_lengths}))
+    else:
+        lengths = "-"
+
+    flags = "".join(
+        str(int(flag)) for flag in (featured, original, two_player, unrated, rated)
+    )
+    return f"{page}:{lengths}:{flags}:{song_id or ''}:{custom_song_id or ''}"
+
 
 async def song_info_get(
     ctx: HTTPContext = Depends(),
@@ -161,6 +198,30 @@ async def levels_get(
     else:
         followed_list_list = None
 
+    # Searches depending on the user or query are not shared between users.
+    cache_key = None
+    if (
+        search_type in SEARCH_CACHE_TTLS
+        and page < SEARCH_CACHE_PAGES
+        and not query
+        and completed_levels_list is None
+        and followed_list_list is None
+    ):
+        cache_key = search_cache_key(
+            page,
+            level_length_list,
+            featured,
+            original,
+            two_player,
+            unrated,
+            rated,
+            song_id,
+            custom_song_id,
+        )
+        cached_response = await ctx.level_search_cache.get(search_type, cache_key)
+        if cached_response is not None:
+            return cached_response
+
     level_res = await levels.search(
         ctx,
         page=page,
@@ -219,7 +280,7 @@ async def levels_get(
         },
     )
 
-    return "#".join(
+    response = "#".join(
         (
             "|".join(
                 gd_obj.dumps(gd_obj.create_level_minimal(level))
@@ -235,6 +296,16 @@ async def levels_get(
         ),
     )
 
+    if cache_key is not None:
+        await ctx.level_search_cache.set(
+            search_type,
+            cache_key,
+            response,
+            SEARCH_CACHE_TTLS[search_type],
+        )
+
+    return response
+
 
 async def level_get(
     ctx: HTTPContext = Depends(),
@@ -269,11 +340,11 @@ async def level_get(
             gd_obj.dumps(
                 gd_obj.create_level(
                     level_res.level,
-                    level_res.data,
+                    level_res.data.as_str(),
                     level_res.schedule_id or 0,
                 ),
             ),
-            gd_obj.create_level_data_security_str(level_res.data),
+            level_res.data.security_hash,
             gd_obj.create_level_metadata_security_str_hashed(
                 level_res.level,
                 level_res.schedule_id or 0,
@@ -431,7 +502,7 @@ async def daily_level_info_get(
         },
     )
 
-    time_remaining = (result.schedule.end_time - datetime.now()).seconds
+    time_remaining = (result.schedule.ends_at - datetime.now()).seconds
 
     return f"{result.schedule.id}|{time_remaining}"
 
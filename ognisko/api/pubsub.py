@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+from ognisko import jobs
 from ognisko import logger
 from ognisko.adapters import RedisPubsubRouter
+from ognisko.resources import LEVEL_SCHEDULE_INVALIDATION_CHANNEL
+from ognisko.resources import SEARCH_CHANGE_CHANNEL
 from ognisko.resources import Context
-from ognisko.services import leaderboards
-from ognisko.services import levels
-from ognisko.services import users
+from ognisko.resources import SearchIndex
+from ognisko.resources.level_data import LEVEL_DATA_INVALIDATION_CHANNEL
+from ognisko.resources.level_schedule import LevelScheduleType
 
 router = RedisPubsubRouter()
 
@@ -22,6 +25,11 @@ def context() -> Context:
     return redis_context
 
 
+async def enqueue_unique(ctx: Context, job_type: str) -> None:
+    # Every worker receives the broadcast, while the job must only run once.
+    await ctx.jobs.enqueue(job_type, unique=True)
+
+
 # TODO: Look into creating unique UUIDs for each pubsub message,
 # for easier identification in logging.
 
@@ -40,25 +48,51 @@ async def ping_handler(data: str) -> None:
 async def level_sync_meili_handler(_) -> None:
     ctx = context()
     logger.debug("Redis received a level sync request.")
-    await levels.synchronise_search(ctx)
+    await enqueue_unique(ctx, jobs.LEVELS_SYNC_SEARCH)
 
 
 @router.register("ognisko:users:sync_meili")
 async def user_sync_meili_handler(_) -> None:
     ctx = context()
     logger.debug("Redis received a user sync request.")
-    await users.synchronise_search(ctx)
+    await enqueue_unique(ctx, jobs.USERS_SYNC_SEARCH)
 
 
 @router.register("ognisko:leaderboards:sync_stars")
 async def leaderboard_sync_stars_handler(_) -> None:
     ctx = context()
     logger.debug("Redis received a leaderboard sync request.")
-    await leaderboards.synchronise_top_stars(ctx)
+    await enqueue_unique(ctx, jobs.LEADERBOARDS_SYNC_STARS)
 
 
 @router.register("ognisko:leaderboards:sync_creators")
 async def leaderboard_sync_creators_handler(_) -> None:
     ctx = context()
     logger.debug("Redis received a leaderboard sync request.")
-    await leaderboards.synchronise_top_creators(ctx)
+    await enqueue_unique(ctx, jobs.LEADERBOARDS_SYNC_CREATORS)
+
+
+@router.register(LEVEL_DATA_INVALIDATION_CHANNEL)
+async def level_data_invalidate_handler(data: str) -> None:
+    ctx = context()
+    ctx.level_data.evict(int(data))
+
+
+@router.register(LEVEL_SCHEDULE_INVALIDATION_CHANNEL)
+async def level_schedule_invalidate_handler(data: str) -> None:
+    ctx = context()
+    ctx.level_schedules.evict(LevelScheduleType(data))
+
+
+@router.register(SEARCH_CHANGE_CHANNEL)
+async def search_change_handler(data: str) -> None:
+    ctx = context()
+    index, resource_id = data.split(":")
+    if index != SearchIndex.LEVELS.value:
+        return
+
+    if ctx.embedded_level_search is not None:
+        ctx.embedded_level_search.mark_changed(int(resource_id))
+
+    if ctx.level_nomination_snapshot is not None:
+        ctx.level_nomination_snapshot.mark_changed(int(resource_id))
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 import urllib.parse
 from collections.abc import Callable
 from typing import NamedTuple
@@ -121,6 +122,24 @@ def create_profile(
     }
 
 
+def create_ranked_profile(
+    profile: GDSerialisable,
+    rank: int,
+    *,
+    stars: int | None = None,
+    creator_points: int | None = None,
+) -> GDSerialisable:
+    """Applies a leaderboard placement to a profile created by
+    `create_profile`."""
+    ranked = profile | {6: rank, 30: rank}
+    if stars is not None:
+        ranked[3] = stars
+    if creator_points is not None:
+        ranked[8] = creator_points
+
+    return ranked
+
+
 def create_user_relationship(relationship: UserRelationship) -> GDSerialisable:
     return {
         41: 0 if relationship.seen_ts else 1,
@@ -314,12 +333,9 @@ def create_search_security_str(levels: list[Level]) -> str:
 
 
 def create_level_data_security_str(level_data: str) -> str:
-    res = ""
-    size = len(level_data) // 40
-    for i in range(40):
-        res += level_data[i * size]
-
-    return hashes.hash_sha1(res + "xI25fpAapCQg")
+    # 40 evenly spaced characters, tolerating data shorter than that.
+    step = max(len(level_data) // 40, 1)
+    return hashes.hash_sha1(level_data[::step][:40] + "xI25fpAapCQg")
 
 
 def create_level_metadata_security_str(level: Level, schedule_id) -> str:
@@ -337,9 +353,15 @@ def create_level_metadata_security_str(level: Level, schedule_id) -> str:
     )
 
 
+# The metadata rarely changes between downloads of the same level.
+@functools.lru_cache(maxsize=4096)
+def _hash_level_metadata_security_str(metadata_security_str: str) -> str:
+    return hashes.hash_sha1(metadata_security_str + "xI25fpAapCQg")
+
+
 def create_level_metadata_security_str_hashed(level: Level, schedule_id) -> str:
-    return hashes.hash_sha1(
-        create_level_metadata_security_str(level, schedule_id) + "xI25fpAapCQg",
+    return _hash_level_metadata_security_str(
+        create_level_metadata_security_str(level, schedule_id),
     )
 
 
@@ -0,0 +1,569 @@
+#!/usr/bin/env python3.12
+from __future__ import annotations
+
+# This is a hack to allow the script to be run from the root directory.
+import sys
+
+sys.path.append(".")
+
+# A latency and relevance benchmark for the level search.
+# Please see the README for more information.
+import argparse
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from collections.abc import Awaitable
+from collections.abc import Callable
+from typing import Any
+from typing import NamedTuple
+
+import numpy as np
+import orjson
+
+from ognisko.adapters.meilisearch import MeiliSearchClient
+from ognisko.constants.levels import LevelLength
+from ognisko.constants.levels import LevelPublicity
+from ognisko.constants.levels import LevelSearchType
+from ognisko.resources import EmbeddedLevel
+from ognisko.resources import EmbeddedLevelFlag
+from ognisko.resources import EmbeddedLevelIndex
+from ognisko.resources import SearchIndex
+from ognisko.resources.search_index import INDEX_SETTINGS
+from ognisko.resources.search_index import TASK_TIMEOUT_MS
+from ognisko.services import search_index
+
+PAGE_SIZE = 10
+BENCHMARK_INDEX = "levels_benchmark"
+
+CORPUS_TIME = 1_700_000_000.0
+"""The time the synthetic corpus is generated relative to, keeping reports
+comparable between runs."""
+CORPUS_SPAN_SECONDS = 60 * 60 * 24 * 365 * 2
+
+NAME_WORDS = (
+    "blood",
+    "bath",
+    "sonic",
+    "wave",
+    "cataclysm",
+    "deadlocked",
+    "theory",
+    "of",
+    "everything",
+    "clubstep",
+    "electrodynamix",
+    "hexagon",
+    "force",
+    "blast",
+    "processing",
+    "stereo",
+    "madness",
+    "back",
+    "on",
+    "track",
+    "polargeist",
+    "dry",
+    "out",
+    "base",
+    "after",
+    "cant",
+    "let",
+    "go",
+    "jumper",
+    "time",
+    "machine",
+    "cycles",
+    "xstep",
+    "fingerdash",
+    "dash",
+    "the",
+    "nightmare",
+    "challenge",
+    "dream",
+    "night",
+    "fire",
+    "ice",
+    "neon",
+    "void",
+    "quantum",
+    "retro",
+    "ultra",
+    "mega",
+    "mini",
+    "hard",
+    "easy",
+    "insane",
+    "demon",
+    "layout",
+    "remake",
+    "collab",
+    "megacollab",
+    "circles",
+    "zodiac",
+    "tartarus",
+    "acheron",
+    "abyss",
+    "silent",
+    "limbo",
+)
+
+DEFAULT_WORKLOAD: dict[str, Any] = {
+    # The share of searches of each search type.
+    "search_types": {
+        "SEARCH_QUERY": 0.35,
+        "MOST_LIKED": 0.12,
+        "MOST_DOWNLOADED": 0.10,
+        "TRENDING": 0.10,
+        "RECENT": 0.10,
+        "FEATURED": 0.08,
+        "AWARDED": 0.04,
+        "MAGIC": 0.03,
+        "USER_LEVELS": 0.05,
+        "FOLLOWED": 0.03,
+    },
+    # The share of searches using each filter.
+    "filters": {
+        "lengths": 0.20,
+        "rated": 0.15,
+        "unrated": 0.05,
+        "two_player": 0.02,
+        "original": 0.05,
+        "song": 0.03,
+        "completed": 0.10,
+    },
+    "later_pages": 0.20,
+    "completed_levels": 200,
+    "followed_users": 20,
+}
+"""A mix of searches approximating the game's traffic. A recorded mix of the
+same shape may be passed through `--workload`."""
+
+
+class BenchmarkQuery(NamedTuple):
+    search_type: str
+    page: int
+    query: str | None = None
+    user_ids: list[int] | None = None
+    lengths: list[int] | None = None
+    rated: bool | None = None
+    two_player: bool = False
+    original: bool = False
+    official_song_id: int | None = None
+    completed_levels: list[int] | None = None
+
+
+type SearchFunction = Callable[[BenchmarkQuery], Awaitable[list[int]]]
+
+
+def generate_corpus(count: int, rng: np.random.Generator) -> list[EmbeddedLevel]:
+    """Generates levels with popularity following a power law, as on the
+    live server."""
+    likes = (rng.pareto(1.2, count) * 5).astype(np.int64)
+    downloads = likes * rng.integers(3, 40, count) + rng.integers(0, 50, count)
+    rated = rng.random(count) < 0.3
+    stars = np.where(rated, rng.integers(1, 11, count), 0)
+    featured = rated & (rng.random(count) < 0.3)
+    upload_ts = CORPUS_TIME - rng.random(count) * CORPUS_SPAN_SECONDS
+
+    levels = []
+    for i in range(count):
+        flags = 0
+        if featured[i] and rng.random() < 0.2:
+            flags |= EmbeddedLevelFlag.EPIC
+        if rng.random() < 0.1:
+            flags |= EmbeddedLevelFlag.MAGIC
+        if rated[i] and rng.random() < 0.2:
+            flags |= EmbeddedLevelFlag.AWARDED
+        if rng.random() < 0.03:
+            flags |= EmbeddedLevelFlag.TWO_PLAYER
+        if rng.random() < 0.9:
+            flags |= EmbeddedLevelFlag.ORIGINAL
+
+        levels.append(
+            EmbeddedLevel(
+                id=i + 1,
+                name=" ".join(rng.choice(NAME_WORDS, rng.integers(1, 4))),
+                user_id=int(rng.integers(1, count // 10 + 2)),
+                stars=int(stars[i]),
+                length=int(rng.integers(0, 5)),
+                likes=int(likes[i]),
+                downloads=int(downloads[i]),
+                feature_order=i + 1 if featured[i] else 0,
+                upload_ts=float(upload_ts[i]),
+                official_song_id=int(rng.integers(0, 22)),
+                custom_song_id=0,
+                flags=flags,
+            ),
+        )
+
+    return levels
+
+
+def generate_queries(
+    count: int,
+    workload: dict[str, Any],
+    levels: list[EmbeddedLevel],
+    rng: np.random.Generator,
+) -> list[BenchmarkQuery]:
+    search_types = list(workload["search_types"])
+    weights = np.array(list(workload["search_types"].values()), dtype=np.float64)
+    filters = workload["filters"]
+    user_count = max(level.user_id for level in levels)
+
+    def uses(filter: str) -> bool:
+        return bool(rng.random() < filters.get(filter, 0.0))
+
+    queries = []
+    for search_type in rng.choice(search_types, count, p=weights / weights.sum()):
+        query = None
+        user_ids = None
+        match search_type:
+            case "SEARCH_QUERY":
+                # Players often search before finishing the level's name.
+                name = levels[int(rng.integers(len(levels)))].name
+                query = name[: int(rng.integers(min(3, len(name)), len(name) + 1))]
+            case "USER_LEVELS":
+                user_ids = [int(rng.integers(1, user_count + 1))]
+            case "FOLLOWED":
+                user_ids = rng.integers(
+                    1,
+                    user_count + 1,
+                    workload["followed_users"],
+                ).tolist()
+
+        rated = True if uses("rated") else False if uses("unrated") else None
+        queries.append(
+            BenchmarkQuery(
+                search_type=str(search_type),
+                page=(
+                    int(rng.integers(1, 5))
+                    if rng.random() < workload["later_pages"]
+                    else 0
+                ),
+                query=query,
+                user_ids=user_ids,
+                lengths=(
+                    sorted({int(x) for x in rng.integers(0, 5, 2)})
+                    if uses("lengths")
+                    else None
+                ),
+                rated=rated,
+                two_player=uses("two_player"),
+                original=uses("original"),
+                official_song_id=int(rng.integers(0, 22)) if uses("song") else None,
+                completed_levels=(
+                    rng.integers(
+                        1,
+                        len(levels) + 1,
+                        workload["completed_levels"],
+                    ).tolist()
+                    if uses("completed")
+                    else None
+                ),
+            ),
+        )
+
+    return queries
+
+
+def search_filters(query: BenchmarkQuery) -> dict[str, Any]:
+    """Converts the query into the level search's filters, as taken by both
+    search backends."""
+    search_type = LevelSearchType[query.search_type]
+    text_query = query.query
+    if search_type is LevelSearchType.USER_LEVELS and query.user_ids:
+        text_query = str(query.user_ids[0])
+
+    return {
+        "query": text_query,
+        "search_type": search_type,
+        "level_lengths": (
+            [LevelLength(length) for length in query.lengths] if query.lengths else None
+        ),
+        "completed_levels": query.completed_levels,
+        "original": query.original,
+        "two_player": query.two_player,
+        "unrated": query.rated is False,
+        "rated": query.rated is True,
+        "song_id": query.official_song_id,
+        "followed_list": (
+            query.user_ids if search_type is LevelSearchType.FOLLOWED else None
+        ),
+        # The corpus is generated relative to a fixed time.
+        "now": CORPUS_TIME,
+    }
+
+
+def meili_document(level: EmbeddedLevel) -> dict[str, Any]:
+    return {
+        "id": level.id,
+        "name": level.name,
+        "user_id": level.user_id,
+        "stars": level.stars,
+        "length": level.length,
+        "likes": level.likes,
+        "downloads": level.downloads,
+        "feature_order": level.feature_order,
+        "upload_ts": level.upload_ts,
+        "official_song_id": level.official_song_id,
+        "custom_song_id": level.custom_song_id or None,
+        "epic": bool(level.flags & EmbeddedLevelFlag.EPIC),
+        "magic": bool(level.flags & EmbeddedLevelFlag.MAGIC),
+        "awarded": bool(level.flags & EmbeddedLevelFlag.AWARDED),
+        "two_player": bool(level.flags & EmbeddedLevelFlag.TWO_PLAYER),
+        "original_id": None if level.flags & EmbeddedLevelFlag.ORIGINAL else 1,
+        "publicity": LevelPublicity.PUBLIC.value,
+        "deleted": False,
+    }
+
+
+async def _meili_documents(
+    levels: list[EmbeddedLevel],
+) -> AsyncIterator[dict[str, Any]]:
+    for level in levels:
+        yield meili_document(level)
+
+
+def load_embedded(levels: list[EmbeddedLevel]) -> SearchFunction:
+    index = EmbeddedLevelIndex(primary=True)
+    index.upsert(levels)
+
+    async def search(query: BenchmarkQuery) -> list[int]:
+        arguments = search_index.embedded_search_arguments(**search_filters(query))
+        if arguments is None:
+            return []
+
+        return index.search(page=query.page, page_size=PAGE_SIZE, **arguments).ids
+
+    return search
+
+
+async def load_meili(
+    meili: MeiliSearchClient,
+    levels: list[EmbeddedLevel],
+) -> SearchFunction:
+    """Loads the corpus into a dedicated index, configured with the live level
+    index's settings."""
+    await meili.delete_index_if_exists(BENCHMARK_INDEX)
+    await meili.create_index(
+        BENCHMARK_INDEX,
+        "id",
+        settings=INDEX_SETTINGS[SearchIndex.LEVELS],
+        timeout_in_ms=TASK_TIMEOUT_MS,
+    )
+    await meili.bulk_loader(BENCHMARK_INDEX).load(_meili_documents(levels))
+
+    index = meili.index(BENCHMARK_INDEX)
+
+    async def search(query: BenchmarkQuery) -> list[int]:
+        search = search_index.level_search_query(**search_filters(query))
+        if search is None:
+            return []
+
+        results = await index.search(
+            search.query,
+            page=query.page + 1,
+            hits_per_page=PAGE_SIZE,
+            filter=search.filter,
+            sort=search.sort,
+            attributes_to_retrieve=["id"],
+        )
+        return [hit["id"] for hit in results.hits]
+
+    return search
+
+
+def summarise_latency(latencies: list[float]) -> dict[str, float]:
+    if not latencies:
+        return {}
+
+    milliseconds = np.array(latencies) * 1000
+    return {
+        "mean": float(milliseconds.mean()),
+        "p50": float(np.percentile(milliseconds, 50)),
+        "p95": float(np.percentile(milliseconds, 95)),
+        "p99": float(np.percentile(milliseconds, 99)),
+        "max": float(milliseconds.max()),
+    }
+
+
+def overlap(hits: list[int], baseline_hits: list[int]) -> float:
+    """The share of results in common with the baseline, regardless of
+    order."""
+    if not hits and not baseline_hits:
+        return 1.0
+
+    return len(set(hits) & set(baseline_hits)) / max(len(hits), len(baseline_hits))
+
+
+def compare(
+    queries: list[BenchmarkQuery],
+    hits: list[list[int]],
+    baseline: dict[str, Any],
+) -> dict[str, Any]:
+    baseline_hits = baseline["hits"]
+    overlaps = [overlap(*pair) for pair in zip(hits, baseline_hits)]
+    identical = [a == b for a, b in zip(hits, baseline_hits)]
+
+    by_search_type: dict[str, list[float]] = {}
+    for query, query_overlap in zip(queries, overlaps):
+        by_search_type.setdefault(query.search_type, []).append(query_overlap)
+
+    return {
+        "baseline_backend": baseline["backend"],
+        "mean": float(np.mean(overlaps)) if overlaps else 1.0,
+        "identical": float(np.mean(identical)) if identical else 1.0,
+        "search_types": {
+            search_type: float(np.mean(values))
+            for search_type, values in sorted(by_search_type.items())
+        },
+    }
+
+
+async def run(
+    search: SearchFunction,
+    queries: list[BenchmarkQuery],
+    concurrency: int,
+) -> tuple[list[list[int]], list[float], float]:
+    """Replays the queries, returning each query's hits and latency alongside
+    the total time taken."""
+    hits: list[list[int]] = [[] for _ in queries]
+    latencies = [0.0] * len(queries)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def replay(position: int) -> None:
+        async with slots:
+            start = time.perf_counter()
+            hits[position] = await search(queries[position])
+            latencies[position] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*(replay(position) for position in range(len(queries))))
+    return hits, latencies, time.perf_counter() - start
+
+
+async def benchmark(
+    *,
+    backend: str,
+    levels: int,
+    queries: int,
+    seed: int,
+    workload: dict[str, Any],
+    concurrency: int = 1,
+    meili: MeiliSearchClient | None = None,
+    baseline: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    if baseline is not None and (
+        baseline["levels"],
+        baseline["queries"],
+        baseline["seed"],
+        baseline["workload"],
+    ) != (levels, queries, seed, workload):
+        raise ValueError(
+            "The baseline was run with a different corpus or workload.",
+        )
+
+    rng = np.random.default_rng(seed)
+    corpus = generate_corpus(levels, rng)
+    benchmark_queries = generate_queries(queries, workload, corpus, rng)
+
+    start = time.perf_counter()
+    if backend == "meili":
+        assert meili is not None, "A MeiliSearch client is required."
+        search = await load_meili(meili, corpus)
+    else:
+        search = load_embedded(corpus)
+    load_seconds = time.perf_counter() - start
+
+    hits, latencies, seconds = await run(search, benchmark_queries, concurrency)
+
+    latencies_by_type: dict[str, list[float]] = {}
+    for query, latency in zip(benchmark_queries, latencies):
+        latencies_by_type.setdefault(query.search_type, []).append(latency)
+
+    return {
+        "backend": backend,
+        "levels": levels,
+        "queries": queries,
+        "seed": seed,
+        "workload": workload,
+        "concurrency": concurrency,
+        "load_seconds": load_seconds,
+        "throughput": queries / seconds if seconds else 0.0,
+        "latency_ms": summarise_latency(latencies),
+        "search_types": {
+            search_type: {
+                "queries": len(values),
+                "latency_ms": summarise_latency(values),
+            }
+            for search_type, values in sorted(latencies_by_type.items())
+        },
+        "overlap": (
+            compare(benchmark_queries, hits, baseline) if baseline is not None else None
+        ),
+        "hits": hits,
+    }
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks the level search.")
+    parser.add_argument("--backend", choices=("embedded", "meili"), default="embedded")
+    parser.add_argument("--levels", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--workload", help="A JSON file with a recorded search mix.")
+    parser.add_argument("--baseline", help="A previous report to compare with.")
+    parser.add_argument("--output", help="Where to write the full JSON report.")
+    parser.add_argument("--meili-url", default="http://127.0.0.1:7700")
+    parser.add_argument("--meili-key")
+    parser.add_argument(
+        "--keep-index",
+        action="store_true",
+        help="Keep the benchmark MeiliSearch index afterwards.",
+    )
+    args = parser.parse_args()
+
+    workload = DEFAULT_WORKLOAD
+    if args.workload:
+        with open(args.workload, "rb") as f:
+            workload = orjson.loads(f.read())
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "rb") as f:
+            baseline = orjson.loads(f.read())
+
+    meili = None
+    if args.backend == "meili":
+        meili = MeiliSearchClient(args.meili_url, args.meili_key, timeout=60)
+
+    try:
+        report = await benchmark(
+            backend=args.backend,
+            levels=args.levels,
+            queries=args.queries,
+            seed=args.seed,
+            workload=workload,
+            concurrency=args.concurrency,
+            meili=meili,
+            baseline=baseline,
+        )
+    finally:
+        if meili is not None:
+            if not args.keep_index:
+                await meili.delete_index_if_exists(BENCHMARK_INDEX)
+            await meili.aclose()
+
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(orjson.dumps(report))
+
+    # The hits are only needed for comparisons.
+    summary = {key: value for key, value in report.items() if key != "hits"}
+    print(orjson.dumps(summary, option=orjson.OPT_INDENT_2).decode())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3.12
+from __future__ import annotations
+
+# This is a hack to allow the script to be run from the root directory.
+import sys
+
+sys.path.append(".")
+
+# A throughput benchmark for the S3 storage backend.
+# Please see the README for more information.
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from ognisko.adapters.storage import S3Storage
+from ognisko.utilities import metrics
+
+DEFAULT_SIZES = (16 * 1024, 256 * 1024, 4 * 1024 * 1024, 32 * 1024 * 1024)
+BENCHMARK_BUCKET = "ognisko-benchmark"
+BENCHMARK_REGION = "us-east-1"
+
+
+def start_local_s3(port: int) -> str:
+    """Starts an in-process S3 stand-in, allowing the benchmark to run offline."""
+    import boto3
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+
+    endpoint = f"http://127.0.0.1:{port}"
+    boto3.client(
+        "s3",
+        endpoint_url=endpoint,
+        region_name=BENCHMARK_REGION,
+        aws_access_key_id="benchmark",
+        aws_secret_access_key="benchmark",
+    ).create_bucket(Bucket=BENCHMARK_BUCKET)
+
+    return endpoint
+
+
+async def benchmark_size(
+    storage: S3Storage,
+    size: int,
+    iterations: int,
+) -> dict[str, float]:
+    data = os.urandom(size)
+    keys = [f"benchmark/{size}/{i}" for i in range(iterations)]
+
+    start = time.perf_counter()
+    for key in keys:
+        await storage.save(key, data)
+    await storage.flush()
+    save_seconds = time.perf_counter() - start
+
+    load_latency = metrics.Histogram()
+    start = time.perf_counter()
+    for key in keys:
+        load_start = time.perf_counter()
+        await storage.load(key)
+        load_latency.observe(time.perf_counter() - load_start)
+    load_seconds = time.perf_counter() - start
+
+    return {
+        "size": size,
+        "iterations": iterations,
+        "save_mib_per_second": size * iterations / save_seconds / 1024**2,
+        "load_mib_per_second": size * iterations / load_seconds / 1024**2,
+        "load_p50": load_latency.percentile(50),
+        "load_p95": load_latency.percentile(95),
+        "load_p99": load_latency.percentile(99),
+    }
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks the S3 storage.")
+    parser.add_argument("--endpoint", help="Defaults to a local S3 stand-in.")
+    parser.add_argument("--bucket", default=BENCHMARK_BUCKET)
+    parser.add_argument("--access-key", default="benchmark")
+    parser.add_argument("--secret-key", default="benchmark")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--upload-workers", type=int, default=4)
+    parser.add_argument("--multipart-concurrency", type=int, default=4)
+    parser.add_argument("--max-pool-connections", type=int, default=10)
+    parser.add_argument("--port", type=int, default=5020)
+    args = parser.parse_args()
+
+    endpoint = args.endpoint or start_local_s3(args.port)
+
+    with tempfile.TemporaryDirectory() as spool_directory:
+        storage = S3Storage(
+            region=BENCHMARK_REGION,
+            endpoint=endpoint,
+            access_key=args.access_key,
+            secret_key=args.secret_key,
+            bucket=args.bucket,
+            timeout=30,
+            spool_directory=spool_directory,
+            upload_workers=args.upload_workers,
+            multipart_concurrency=args.multipart_concurrency,
+            max_pool_connections=args.max_pool_connections,
+        )
+        await storage.connect()
+
+        results = [
+            await benchmark_size(storage, size, args.iterations)
+            for size in DEFAULT_SIZES
+        ]
+
+        await storage.disconnect()
+
+    print(json.dumps(results, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
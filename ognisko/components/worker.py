@@ -0,0 +1,266 @@
+#!/usr/bin/env python3.12
+from __future__ import annotations
+
+# This is a hack to allow the script to be run from the root directory.
+import sys
+
+sys.path.append(".")
+
+# The background job worker, consuming the Redis job stream.
+# Please see the README for more information.
+import asyncio
+import logging
+import os
+import socket
+import urllib.parse
+from typing import override
+
+from databases import DatabaseURL
+
+import ognisko.logger
+from ognisko import jobs
+from ognisko import settings
+from ognisko.adapters import MeiliSearchClient
+from ognisko.adapters.boomlings import GeometryDashClient
+from ognisko.adapters.jobs import Job
+from ognisko.adapters.jobs import JobQueue
+from ognisko.adapters.jobs import JobRouter
+from ognisko.adapters.jobs import JobWorker
+from ognisko.adapters.mysql import ImplementsMySQL
+from ognisko.adapters.mysql import MySQLService
+from ognisko.adapters.redis import RedisClient
+from ognisko.adapters.storage import AbstractStorage
+from ognisko.adapters.storage import LocalStorage
+from ognisko.resources import CachedLevelSchedule
+from ognisko.resources import Context
+from ognisko.resources import LevelData
+from ognisko.resources import SearchIndex
+from ognisko.services import search_index
+from ognisko.utilities import loop
+from ognisko.utilities.cache import AbstractCache
+from ognisko.utilities.cache.memory import SimpleMemoryCache
+from ognisko.utilities.cache.memory import SizedLRUMemoryCache
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerContext(Context):
+    """A shared context for background job handlers."""
+
+    def __init__(
+        self,
+        mysql: MySQLService,
+        redis: RedisClient,
+        meili: MeiliSearchClient,
+        storage: AbstractStorage,
+        gd: GeometryDashClient,
+        level_data_cache: AbstractCache[LevelData],
+        level_schedule_cache: AbstractCache[CachedLevelSchedule],
+    ) -> None:
+        self.mysql_service = mysql
+        self.redis_client = redis
+        self.meili_client = meili
+        self.storage_backend = storage
+        self.gd_client = gd
+        self.level_data_cache = level_data_cache
+        self.level_schedule_cache = level_schedule_cache
+
+    @property
+    @override
+    def _mysql(self) -> ImplementsMySQL:
+        return self.mysql_service
+
+    @property
+    @override
+    def _redis(self) -> RedisClient:
+        return self.redis_client
+
+    @property
+    @override
+    def _meili(self) -> MeiliSearchClient:
+        return self.meili_client
+
+    @property
+    @override
+    def _storage(self) -> AbstractStorage:
+        return self.storage_backend
+
+    @property
+    @override
+    def _gd(self) -> GeometryDashClient:
+        return self.gd_client
+
+    @property
+    @override
+    def _level_data_cache(self) -> AbstractCache[LevelData]:
+        return self.level_data_cache
+
+    @property
+    @override
+    def _level_schedule_cache(self) -> AbstractCache[CachedLevelSchedule]:
+        return self.level_schedule_cache
+
+
+router = JobRouter[WorkerContext]()
+router.merge(jobs.router)
+
+
+@router.register(jobs.STORAGE_MIGRATE_LAYOUT)
+async def storage_migrate_layout(ctx: WorkerContext, job: Job) -> None:
+    if not isinstance(ctx.storage_backend, LocalStorage):
+        return
+
+    moved = await ctx.storage_backend.migrate_layout()
+    logger.info(
+        "Finished migrating the local storage layout.",
+        extra={
+            "moved": moved,
+        },
+    )
+    await job.report_progress(moved)
+
+
+PERIODIC_JOBS_POLL_SECONDS = 60
+
+
+async def enqueue_periodic_jobs(queue: JobQueue) -> None:
+    """Enqueues each periodic job once its interval has passed. Every worker
+    does this, but each job is enqueued only once per interval."""
+    periodic_jobs = {
+        jobs.LEVEL_RANKINGS_COMPUTE: settings.OGNISKO_LEVEL_RANKINGS_INTERVAL,
+    }
+
+    while True:
+        for job_type, interval in periodic_jobs.items():
+            try:
+                await queue.enqueue_periodic(job_type, interval)
+            except Exception:
+                logger.exception(
+                    "Failed to enqueue a periodic job.",
+                    extra={
+                        "job_type": job_type,
+                    },
+                )
+
+        await asyncio.sleep(PERIODIC_JOBS_POLL_SECONDS)
+
+
+def create_mysql() -> MySQLService:
+    protocol = "mysql"
+    try:
+        import asyncmy  # noqa
+
+        protocol = "mysql+asyncmy"
+    except ImportError:
+        pass
+
+    return MySQLService(
+        DatabaseURL(
+            "{protocol}://{username}:{password}@{host}:{port}/{db}".format(
+                protocol=protocol,
+                username=settings.MYSQL_USER,
+                password=urllib.parse.quote(settings.MYSQL_PASSWORD),
+                host=settings.MYSQL_HOST,
+                port=settings.MYSQL_TCP_PORT,
+                db=settings.MYSQL_DATABASE,
+            ),
+        ),
+    )
+
+
+async def main() -> int:
+    ognisko.logger.init_basic_logging(settings.OGNISKO_LOG_LEVEL)
+
+    mysql = create_mysql()
+    redis = RedisClient(
+        settings.REDIS_HOST,
+        settings.REDIS_PORT,
+        settings.REDIS_DATABASE,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        pool_timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_keepalive=settings.REDIS_SOCKET_KEEPALIVE,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        bulk_max_connections=settings.REDIS_BULK_MAX_CONNECTIONS,
+    )
+    meili = MeiliSearchClient.from_host(
+        settings.MEILI_HOST,
+        settings.MEILI_PORT,
+        settings.MEILI_MASTER_KEY,
+        timeout=10,
+        bulk_batch_size=settings.MEILI_BULK_BATCH_SIZE,
+        bulk_concurrency=settings.MEILI_BULK_CONCURRENCY,
+        bulk_max_enqueued_tasks=settings.MEILI_BULK_MAX_ENQUEUED_TASKS,
+    )
+
+    await mysql.connect()
+    await redis.initialise()
+    await meili.health()
+
+    ctx = WorkerContext(
+        mysql=mysql,
+        redis=redis,
+        meili=meili,
+        storage=LocalStorage(
+            root=settings.OGNISKO_INTERNAL_DATA_DIRECTORY,
+            shard_depth=settings.OGNISKO_STORAGE_SHARD_DEPTH,
+            shard_width=settings.OGNISKO_STORAGE_SHARD_WIDTH,
+        ),
+        gd=GeometryDashClient(settings.OGNISKO_OFFICIAL_SERVER_MIRROR_URL),
+        level_data_cache=SizedLRUMemoryCache[LevelData](
+            settings.OGNISKO_LEVEL_DATA_CACHE_SIZE,
+            sizeof=lambda level_data: level_data.size,
+            minimum_hits=settings.OGNISKO_LEVEL_DATA_CACHE_MINIMUM_HITS,
+        ),
+        level_schedule_cache=SimpleMemoryCache[CachedLevelSchedule](),
+    )
+
+    # Settings changes apply to existing indexes once they are rebuilt.
+    for index in SearchIndex:
+        await ctx.search_indexes.ensure_exists(index)
+
+    # Files left in the flat layout are moved by a single worker, with reads
+    # falling back to the flat layout in the meantime.
+    if settings.OGNISKO_STORAGE_SHARD_DEPTH:
+        await JobQueue(redis).enqueue(jobs.STORAGE_MIGRATE_LAYOUT, unique=True)
+
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    worker = JobWorker(
+        JobQueue(redis),
+        # Blocking reads would otherwise hold on to request connections.
+        redis.bulk,
+        router,
+        ctx,
+        consumer=consumer,
+        concurrency=settings.OGNISKO_WORKER_CONCURRENCY,
+        max_attempts=settings.OGNISKO_WORKER_MAX_ATTEMPTS,
+    )
+
+    logger.info(
+        "Started consuming background jobs.",
+        extra={
+            "consumer": consumer,
+            "concurrency": settings.OGNISKO_WORKER_CONCURRENCY,
+        },
+    )
+
+    # Search changes are consumed alongside the jobs.
+    indexer = asyncio.create_task(search_index.run_indexer(ctx, consumer))
+    scheduler = asyncio.create_task(enqueue_periodic_jobs(JobQueue(redis)))
+
+    try:
+        await worker.run()
+    finally:
+        indexer.cancel()
+        scheduler.cancel()
+        await worker.shutdown()
+        await redis.aclose()
+        await mysql.disconnect()
+
+    return 0
+
+
+if __name__ == "__main__":
+    loop.install_optimal_loop()
+    raise SystemExit(asyncio.run(main()))
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from ognisko import logger
+from ognisko.adapters.jobs import Job
+from ognisko.adapters.jobs import JobRouter
+from ognisko.resources import Context
+from ognisko.resources import SearchIndex
+from ognisko.services import creator_points
+from ognisko.services import leaderboards
+from ognisko.services import level_rankings
+from ognisko.services import levels
+from ognisko.services import search_index
+from ognisko.services import users
+
+# Job types.
+LEVELS_SYNC_SEARCH = "levels.sync_search"
+LEVELS_BACKFILL_DATA_METADATA = "levels.backfill_data_metadata"
+USERS_SYNC_SEARCH = "users.sync_search"
+LEVELS_ROLLBACK_SEARCH = "levels.rollback_search"
+USERS_ROLLBACK_SEARCH = "users.rollback_search"
+LEADERBOARDS_SYNC_STARS = "leaderboards.sync_stars"
+LEADERBOARDS_SYNC_CREATORS = "leaderboards.sync_creators"
+CREATOR_POINTS_RECOMPUTE = "creator_points.recompute"
+LEVEL_RANKINGS_COMPUTE = "level_rankings.compute"
+STORAGE_MIGRATE_LAYOUT = "storage.migrate_layout"
+
+router = JobRouter[Context]()
+
+
+@router.register(LEVELS_SYNC_SEARCH)
+async def levels_sync_search(ctx: Context, job: Job) -> None:
+    await levels.synchronise_search(ctx)
+
+
+@router.register(LEVELS_BACKFILL_DATA_METADATA)
+async def levels_backfill_data_metadata(ctx: Context, job: Job) -> None:
+    backfilled = await levels.backfill_data_metadata(ctx)
+    await job.report_progress(backfilled)
+
+
+@router.register(USERS_SYNC_SEARCH)
+async def users_sync_search(ctx: Context, job: Job) -> None:
+    await users.synchronise_search(ctx)
+
+
+@router.register(LEVELS_ROLLBACK_SEARCH)
+async def levels_rollback_search(ctx: Context, job: Job) -> None:
+    await search_index.rollback(ctx, SearchIndex.LEVELS)
+
+
+@router.register(USERS_ROLLBACK_SEARCH)
+async def users_rollback_search(ctx: Context, job: Job) -> None:
+    await search_index.rollback(ctx, SearchIndex.USERS)
+
+
+@router.register(LEADERBOARDS_SYNC_STARS)
+async def leaderboards_sync_stars(ctx: Context, job: Job) -> None:
+    await leaderboards.synchronise_top_stars(ctx)
+
+
+@router.register(LEADERBOARDS_SYNC_CREATORS)
+async def leaderboards_sync_creators(ctx: Context, job: Job) -> None:
+    await leaderboards.synchronise_top_creators(ctx)
+
+
+@router.register(CREATOR_POINTS_RECOMPUTE)
+async def creator_points_recompute(ctx: Context, job: Job) -> None:
+    corrected = await creator_points.recompute_all(ctx)
+    logger.info(
+        "Recalculated creator points.",
+        extra={
+            "corrected": corrected,
+        },
+    )
+    await job.report_progress(corrected)
+
+
+@router.register(LEVEL_RANKINGS_COMPUTE)
+async def level_rankings_compute(ctx: Context, job: Job) -> None:
+    await level_rankings.compute(ctx)
@@ -2,12 +2,16 @@ from __future__ import annotations
 
 from abc import ABC
 from abc import abstractmethod
+from collections.abc import Awaitable
+from collections.abc import Callable
 
 from ognisko.adapters.boomlings import GeometryDashClient
+from ognisko.adapters.jobs import JobQueue
 from ognisko.adapters.meilisearch import MeiliSearchClient
 from ognisko.adapters.mysql import MySQLConnection
 from ognisko.adapters.redis import RedisClient
 from ognisko.adapters.storage import AbstractStorage
+from ognisko.utilities.cache import AbstractCache
 
 from .custom_song import CustomSongModel
 from .custom_song import SongRepository
@@ -16,8 +20,13 @@ from .daily_chest import DailyChestRepository
 from .daily_chest import DailyChestRewardType
 from .daily_chest import DailyChestTier
 from .daily_chest import DailyChestView
+from .embedded_level_search import EmbeddedLevel
+from .embedded_level_search import EmbeddedLevelFlag
+from .embedded_level_search import EmbeddedLevelIndex
+from .embedded_level_search import EmbeddedLevelSort
 from .friend_request import FriendRequestModel
 from .friend_request import FriendRequestRepository
+from .leaderboard import LeaderboardEntry
 from .leaderboard import LeaderboardRepository
 from .level import CustomLevelModel
 from .level import LevelRepository
@@ -25,15 +34,32 @@ from .level_comment import LevelCommentModel
 from .level_comment import LevelCommentRepository
 from .level_data import LevelData
 from .level_data import LevelDataRepository
+from .level_nomination import LevelNominationSnapshot
+from .level_nomination import NominationCandidate
+from .level_ranking import LevelActivity
+from .level_ranking import LevelRanking
+from .level_ranking import LevelRankingRepository
+from .level_schedule import LEVEL_SCHEDULE_INVALIDATION_CHANNEL
+from .level_schedule import CachedLevelSchedule
 from .level_schedule import LevelScheduleModel
 from .level_schedule import LevelScheduleRepository
+from .level_search_cache import LevelSearchCacheRepository
+from .level_store import ColumnarLevelStore
 from .like_interaction import LikedResource
 from .like_interaction import LikeInteractionModel
 from .like_interaction import LikeInteractionRepository
 from .message import MessageRepository
 from .message import UserMessageModel
+from .presence import PresenceRepository
+from .profile_snapshot import ProfileSnapshotRepository
 from .save_data import SaveData
 from .save_data import SaveDataRepository
+from .search_change import SEARCH_CHANGE_CHANNEL
+from .search_change import SearchChange
+from .search_change import SearchChangeRepository
+from .search_change import SearchIndex
+from .search_index import SearchHits
+from .search_index import SearchIndexRepository
 from .user import UserModel
 from .user import UserRepository
 from .user_comment import UserCommentRepository
@@ -43,6 +69,9 @@ from .user_credential import UserCredentialRepository
 from .user_replationship import UserRelationshipModel
 from .user_replationship import UserRelationshipRepository
 from .user_replationship import UserRelationshipType
+from .user_session import UserSessionRepository
+from .user_stats import UserStatsModel
+from .user_stats import UserStatsRepository
 
 
 class Context(ABC):
@@ -67,6 +96,28 @@ class Context(ABC):
     @abstractmethod
     def _gd(self) -> GeometryDashClient: ...
 
+    @property
+    @abstractmethod
+    def _level_data_cache(self) -> AbstractCache[LevelData]: ...
+
+    @property
+    @abstractmethod
+    def _level_schedule_cache(self) -> AbstractCache[CachedLevelSchedule]: ...
+
+    @property
+    def _embedded_level_search(self) -> EmbeddedLevelIndex | None:
+        return None
+
+    @property
+    def _level_nomination_snapshot(self) -> LevelNominationSnapshot | None:
+        return None
+
+    async def after_commit(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Runs the callback once the changes made through this context are
+        committed to MySQL. Contexts without a surrounding transaction run it
+        immediately."""
+        await callback()
+
     # Rest
     @property
     def save_data(self) -> SaveDataRepository:
@@ -83,8 +134,14 @@ class Context(ABC):
     def level_data(self) -> LevelDataRepository:
         return LevelDataRepository(
             self._storage,
+            self._level_data_cache,
+            self._redis,
         )
 
+    @property
+    def user_stats(self) -> UserStatsRepository:
+        return UserStatsRepository(self._mysql)
+
     @property
     def relationships(self) -> UserRelationshipRepository:
         return UserRelationshipRepository(self._mysql)
@@ -101,6 +158,30 @@ class Context(ABC):
     def leaderboards(self) -> LeaderboardRepository:
         return LeaderboardRepository(self._redis)
 
+    @property
+    def profile_snapshots(self) -> ProfileSnapshotRepository:
+        return ProfileSnapshotRepository(self._redis)
+
+    @property
+    def presence(self) -> PresenceRepository:
+        return PresenceRepository(self._redis)
+
+    @property
+    def user_sessions(self) -> UserSessionRepository:
+        return UserSessionRepository(self._redis)
+
+    @property
+    def search_changes(self) -> SearchChangeRepository:
+        return SearchChangeRepository(self._redis)
+
+    @property
+    def search_indexes(self) -> SearchIndexRepository:
+        return SearchIndexRepository(self._meili, self._redis)
+
+    @property
+    def jobs(self) -> JobQueue:
+        return JobQueue(self._redis)
+
     @property
     def messages(self) -> MessageRepository:
         return MessageRepository(self._mysql)
@@ -123,7 +204,27 @@ class Context(ABC):
 
     @property
     def level_schedules(self) -> LevelScheduleRepository:
-        return LevelScheduleRepository(self._mysql)
+        return LevelScheduleRepository(
+            self._mysql,
+            self._redis,
+            self._level_schedule_cache,
+        )
+
+    @property
+    def embedded_level_search(self) -> EmbeddedLevelIndex | None:
+        return self._embedded_level_search
+
+    @property
+    def level_nomination_snapshot(self) -> LevelNominationSnapshot | None:
+        return self._level_nomination_snapshot
+
+    @property
+    def level_search_cache(self) -> LevelSearchCacheRepository:
+        return LevelSearchCacheRepository(self._redis)
+
+    @property
+    def level_rankings(self) -> LevelRankingRepository:
+        return LevelRankingRepository(self._redis)
 
     @property
     def levels(self) -> LevelRepository:
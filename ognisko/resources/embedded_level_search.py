@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import bisect
+import re
+from typing import NamedTuple
+from typing import override
+
+import numpy as np
+import numpy.typing as npt
+
+from ognisko.utilities.enum import StrEnum
+
+from .level_store import ColumnarLevelStore
+from .search_index import SearchHits
+
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+class EmbeddedLevelFlag:
+    EPIC = 1 << 0
+    MAGIC = 1 << 1
+    AWARDED = 1 << 2
+    TWO_PLAYER = 1 << 3
+    ORIGINAL = 1 << 4
+
+
+class EmbeddedLevelSort(StrEnum):
+    DOWNLOADS = "downloads"
+    LIKES = "likes"
+    RECENT = "recent"
+    FEATURED = "featured"
+
+
+class EmbeddedLevel(NamedTuple):
+    id: int
+    name: str
+    user_id: int
+    stars: int
+    length: int
+    likes: int
+    downloads: int
+    feature_order: int
+    upload_ts: float
+    official_song_id: int
+    custom_song_id: int
+    flags: int
+
+
+def _tokenise(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(text.casefold())
+
+
+class EmbeddedLevelIndex(ColumnarLevelStore[EmbeddedLevel]):
+    """An in-process search index over the publicly listed levels, used when
+    MeiliSearch is unavailable or not deployed.
+
+    Filters and sorts are evaluated over the columnar level attributes. Names
+    are indexed in an inverted index, with the last word of a query matched
+    as a prefix."""
+
+    COLUMNS = {
+        "user_id": np.int64,
+        "stars": np.int16,
+        "length": np.int8,
+        "likes": np.int64,
+        "downloads": np.int64,
+        "feature_order": np.int64,
+        "upload_ts": np.float64,
+        "official_song_id": np.int32,
+        "custom_song_id": np.int64,
+        "flags": np.uint8,
+    }
+
+    __slots__ = (
+        "primary",
+        "_postings",
+        "_slot_tokens",
+        "_vocabulary",
+    )
+
+    def __init__(self, *, primary: bool = False) -> None:
+        super().__init__()
+
+        self.primary = primary
+        """Whether searches should use this index rather than MeiliSearch."""
+
+        self._postings: dict[str, set[int]] = {}
+        self._slot_tokens: dict[int, list[str]] = {}
+        self._vocabulary: list[str] | None = None
+
+    @override
+    def _store(self, slot: int, level: EmbeddedLevel, *, added: bool) -> None:
+        columns = self._columns
+        columns["user_id"][slot] = level.user_id
+        columns["stars"][slot] = level.stars
+        columns["length"][slot] = level.length
+        columns["likes"][slot] = level.likes
+        columns["downloads"][slot] = level.downloads
+        columns["feature_order"][slot] = level.feature_order
+        columns["upload_ts"][slot] = level.upload_ts
+        columns["official_song_id"][slot] = level.official_song_id
+        columns["custom_song_id"][slot] = level.custom_song_id
+        columns["flags"][slot] = level.flags
+
+        if not added:
+            self.__unindex_name(slot)
+        self.__index_name(slot, level.name)
+
+    @override
+    def _discard(self, slot: int) -> None:
+        self.__unindex_name(slot)
+
+    def search(
+        self,
+        *,
+        page: int,
+        page_size: int,
+        sort: EmbeddedLevelSort,
+        query: str | None = None,
+        user_ids: list[int] | None = None,
+        lengths: list[int] | None = None,
+        exclude_ids: list[int] | None = None,
+        flags: int = 0,
+        featured: bool = False,
+        rated: bool | None = None,
+        official_song_id: int | None = None,
+        custom_song_id: int | None = None,
+        uploaded_after: float | None = None,
+    ) -> SearchHits:
+        mask = self._column("alive").copy()
+
+        if query:
+            candidates = self.__match(query)
+            query_mask = np.zeros(len(mask), dtype=np.bool_)
+            query_mask[
+                np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            ] = True
+            mask &= query_mask
+
+        if user_ids is not None:
+            mask &= np.isin(self._column("user_id"), user_ids)
+
+        if lengths:
+            mask &= np.isin(self._column("length"), lengths)
+
+        if exclude_ids:
+            mask &= ~np.isin(self._column("id"), exclude_ids)
+
+        if flags:
+            mask &= (self._column("flags") & flags) == flags
+
+        if featured:
+            mask &= self._column("feature_order") > 0
+
+        if rated is not None:
+            mask &= (self._column("stars") > 0) == rated
+
+        if official_song_id is not None:
+            mask &= self._column("official_song_id") == official_song_id
+
+        if custom_song_id is not None:
+            mask &= self._column("custom_song_id") == custom_song_id
+
+        if uploaded_after is not None:
+            mask &= self._column("upload_ts") >= uploaded_after
+
+        slots = np.flatnonzero(mask)
+        total = len(slots)
+
+        keys = self.__sort_key(sort)[slots]
+        ids = self._column("id")[slots]
+
+        # Only the levels up to the requested page need to be ordered. Every
+        # level tied with the last of them is kept, so that ties are broken
+        # the same way on every page.
+        limit = (page + 1) * page_size
+        if limit < total:
+            threshold = np.partition(keys, total - limit)[total - limit]
+            top = np.flatnonzero(keys >= threshold)
+        else:
+            top = np.arange(total)
+
+        # Ties are broken by the newest level first.
+        ordered = top[np.lexsort((-ids[top], -keys[top]))]
+        page_slots = ordered[page * page_size : limit]
+
+        return SearchHits(
+            ids=ids[page_slots].tolist(),
+            total=total,
+        )
+
+    def __sort_key(self, sort: EmbeddedLevelSort) -> npt.NDArray[np.float64]:
+        match sort:
+            case EmbeddedLevelSort.DOWNLOADS:
+                key = self._column("downloads")
+            case EmbeddedLevelSort.LIKES:
+                key = self._column("likes")
+            case EmbeddedLevelSort.RECENT:
+                key = self._column("upload_ts")
+            case EmbeddedLevelSort.FEATURED:
+                key = self._column("feature_order")
+
+        return key.astype(np.float64, copy=False)
+
+    def __match(self, query: str) -> set[int]:
+        tokens = _tokenise(query)
+        if not tokens:
+            return set()
+
+        *words, prefix = tokens
+
+        matches: set[int] | None = None
+        for word in words:
+            postings = self._postings.get(word, set())
+            matches = postings.copy() if matches is None else matches & postings
+
+        prefix_matches: set[int] = set()
+        vocabulary = self.__vocabulary()
+        position = bisect.bisect_left(vocabulary, prefix)
+        while position < len(vocabulary) and vocabulary[position].startswith(prefix):
+            prefix_matches |= self._postings[vocabulary[position]]
+            position += 1
+
+        return prefix_matches if matches is None else matches & prefix_matches
+
+    def __vocabulary(self) -> list[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+
+        return self._vocabulary
+
+    def __index_name(self, slot: int, name: str) -> None:
+        tokens = list(set(_tokenise(name)))
+        self._slot_tokens[slot] = tokens
+
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                self._postings[token] = postings = set()
+                self._vocabulary = None
+
+            postings.add(slot)
+
+    def __unindex_name(self, slot: int) -> None:
+        for token in self._slot_tokens.pop(slot, []):
+            postings = self._postings[token]
+            postings.discard(slot)
+
+            if not postings:
+                del self._postings[token]
+                self._vocabulary = None
@@ -1,7 +1,26 @@
 from __future__ import annotations
 
+import uuid
+from collections.abc import AsyncIterable
+from typing import NamedTuple
+
 from ognisko.adapters import RedisClient
 
+REBUILD_CHUNK_SIZE = 1000
+"""The number of members added by a single `ZADD` during a rebuild."""
+
+REBUILD_CHUNKS_PER_PIPELINE = 10
+"""The number of `ZADD` commands sent to Redis in a single round trip."""
+
+REBUILD_TIMEOUT = 60 * 60
+"""The time after which an abandoned rebuild's temporary key expires."""
+
+
+class LeaderboardEntry(NamedTuple):
+    user_id: int
+    score: int
+    rank: int
+
 
 class LeaderboardRepository:
     __slots__ = ("_redis",)
@@ -49,6 +68,15 @@ class LeaderboardRepository:
             {str(user_id): stars},  # is str necessary?
         )
 
+    async def increment_creator_count(self, user_id: int, delta: int) -> None:
+        """Adjusts the user's creator leaderboard score by `delta`, adding
+        them to the leaderboard if absent."""
+        await self._redis.zincrby(
+            "ognisko:leaderboards:creators",
+            delta,
+            str(user_id),
+        )
+
     async def remove_creator_count(self, user_id: int) -> None:
         await self._redis.zrem(
             "ognisko:leaderboards:creators",
@@ -59,22 +87,142 @@ class LeaderboardRepository:
         self,
         page: int,
         page_size: int,
-    ) -> list[int]:
-        top_stars = await self._redis.zrevrange(
-            "ognisko:leaderboards:stars",
-            page * page_size,
-            (page + 1) * page_size,
-        )
-        return [int(top_star) for top_star in top_stars]
+    ) -> list[LeaderboardEntry]:
+        return await self.__get_page("ognisko:leaderboards:stars", page, page_size)
 
     async def get_top_creators_paginated(
         self,
         page: int,
         page_size: int,
-    ) -> list[int]:
-        top_creators = await self._redis.zrevrange(
+    ) -> list[LeaderboardEntry]:
+        return await self.__get_page(
             "ognisko:leaderboards:creators",
-            page * page_size,
-            (page + 1) * page_size,
+            page,
+            page_size,
+        )
+
+    async def __get_page(
+        self,
+        key: str,
+        page: int,
+        page_size: int,
+    ) -> list[LeaderboardEntry]:
+        start = page * page_size
+        # ZREVRANGE's end index is inclusive.
+        page_entries = await self._redis.zrevrange(
+            key,
+            start,
+            start + page_size - 1,
+            withscores=True,
         )
-        return [int(top_creator) for top_creator in top_creators]
+        return [
+            LeaderboardEntry(int(member), int(score), start + offset + 1)
+            for offset, (member, score) in enumerate(page_entries)
+        ]
+
+    async def get_stars_around(
+        self,
+        user_id: int,
+        radius: int,
+    ) -> list[LeaderboardEntry]:
+        """Fetches the star leaderboard entries up to `radius` places above
+        and below the user, including the user."""
+        redis_rank = await self._redis.zrevrank(
+            "ognisko:leaderboards:stars",
+            user_id,
+        )
+
+        if redis_rank is None:
+            return []
+
+        start = max(redis_rank - radius, 0)
+        window = await self._redis.zrevrange(
+            "ognisko:leaderboards:stars",
+            start,
+            redis_rank + radius,
+            withscores=True,
+        )
+        return [
+            LeaderboardEntry(int(member), int(score), start + offset + 1)
+            for offset, (member, score) in enumerate(window)
+        ]
+
+    async def get_stars_among(self, user_ids: list[int]) -> list[LeaderboardEntry]:
+        """Fetches the star leaderboard entries of the given users, ranked
+        amongst each other. Users absent from the leaderboard are omitted."""
+        if not user_ids:
+            return []
+
+        scores = await self._redis.zmscore("ognisko:leaderboards:stars", user_ids)
+        present = sorted(
+            (
+                (user_id, int(score))
+                for user_id, score in zip(user_ids, scores)
+                if score is not None
+            ),
+            key=lambda entry: entry[1],
+            reverse=True,
+        )
+        return [
+            LeaderboardEntry(user_id, score, rank)
+            for rank, (user_id, score) in enumerate(present, start=1)
+        ]
+
+    async def rebuild_stars(self, scores: AsyncIterable[tuple[int, int]]) -> int:
+        """Replaces the star leaderboard with the given `(user_id, stars)`
+        pairs. Returns the number of users on the new leaderboard."""
+        return await self.__rebuild("ognisko:leaderboards:stars", scores)
+
+    async def rebuild_creators(
+        self,
+        scores: AsyncIterable[tuple[int, int]],
+    ) -> int:
+        """Replaces the creator leaderboard with the given
+        `(user_id, creator_points)` pairs. Returns the number of users on the
+        new leaderboard."""
+        return await self.__rebuild("ognisko:leaderboards:creators", scores)
+
+    async def __rebuild(
+        self,
+        key: str,
+        scores: AsyncIterable[tuple[int, int]],
+    ) -> int:
+        # The leaderboard is built under a temporary key and renamed over the
+        # live one, so readers never observe a partially built leaderboard.
+        temporary_key = f"{key}:rebuild:{uuid.uuid4().hex}"
+
+        pipeline = self._redis.pipeline(transaction=False)
+        chunk: dict[str, int] = {}
+        total = 0
+
+        async for user_id, score in scores:
+            chunk[str(user_id)] = score
+            if len(chunk) < REBUILD_CHUNK_SIZE:
+                continue
+
+            pipeline.zadd(temporary_key, chunk)
+            pipeline.expire(temporary_key, REBUILD_TIMEOUT)
+            total += len(chunk)
+            chunk = {}
+
+            if len(pipeline) >= REBUILD_CHUNKS_PER_PIPELINE * 2:
+                await pipeline.execute()
+
+        if chunk:
+            pipeline.zadd(temporary_key, chunk)
+            pipeline.expire(temporary_key, REBUILD_TIMEOUT)
+            total += len(chunk)
+
+        await pipeline.execute()
+
+        # RENAME fails on a missing key, which an empty leaderboard is.
+        if not total:
+            await self._redis.delete(key)
+            return 0
+
+        async with self._redis.pipeline(transaction=True) as swap:
+            swap.rename(temporary_key, key)
+            swap.persist(key)
+            await swap.execute()
+
+        return total
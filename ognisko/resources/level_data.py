@@ -1,36 +1,187 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import logging
+import random
+from typing import NamedTuple
+
+import orjson
+
 from ognisko.adapters import AbstractStorage
+from ognisko.adapters import RedisClient
+from ognisko.common.gd_obj import create_level_data_security_str
+from ognisko.utilities.cache import AbstractCache
+
+logger = logging.getLogger(__name__)
+
+LEVEL_DATA_INVALIDATION_CHANNEL = "ognisko:level_data:invalidate"
+"""The Redis pubsub channel used to evict level data from the caches of all
+workers."""
+
+LEVEL_DATA_CHECKSUM_SAMPLE_RATE = 0.01
+"""The share of level data loads verified against the stored checksum. The
+size is verified on every load."""
+
+_LEVEL_DATA_LOAD_ATTEMPTS = 2
+
+
+class LevelDataMetadata(NamedTuple):
+    """Information about a level data blob, calculated once at upload time
+    and stored alongside it."""
+
+    size: int
+    checksum: str
+    security_hash: str
+
+    @staticmethod
+    def from_data(data: str) -> LevelDataMetadata:
+        encoded = data.encode()
+        return LevelDataMetadata(
+            size=len(encoded),
+            checksum=hashlib.sha256(encoded).hexdigest(),
+            security_hash=create_level_data_security_str(data),
+        )
+
+    @staticmethod
+    def from_bytes(raw: bytes) -> LevelDataMetadata:
+        return LevelDataMetadata(**orjson.loads(raw))
+
+    def as_bytes(self) -> bytes:
+        return orjson.dumps(self._asdict())
 
 
 class LevelData:
     """A wrapper class around pure-string level data for type
     clarity."""
 
-    __slots__ = ("_data",)
+    __slots__ = ("_data", "metadata")
 
-    def __init__(self, data: str) -> None:
+    def __init__(self, data: str, metadata: LevelDataMetadata) -> None:
         self._data = data
+        self.metadata = metadata
 
     def as_str(self) -> str:
         return self._data
 
+    @property
+    def size(self) -> int:
+        return len(self._data)
+
+    @property
+    def security_hash(self) -> str:
+        return self.metadata.security_hash
+
+
+def _data_key(level_id: int) -> str:
+    return f"levels/{level_id}"
+
+
+def _metadata_key(level_id: int) -> str:
+    return f"levels/{level_id}.meta"
+
 
 class LevelDataRepository:
-    def __init__(self, storage: AbstractStorage) -> None:
+    __slots__ = (
+        "_storage",
+        "_cache",
+        "_redis",
+    )
+
+    def __init__(
+        self,
+        storage: AbstractStorage,
+        cache: AbstractCache[LevelData],
+        redis: RedisClient,
+    ) -> None:
         self._storage = storage
+        self._cache = cache
+        self._redis = redis
 
-    async def from_user_id(self, user_id: str) -> LevelData | None:
-        res = await self._storage.load(f"levels/{user_id}")
-        if res is not None:
-            return LevelData(res.decode())
+    async def from_level_id(self, level_id: int) -> LevelData | None:
+        cached = self._cache.get(level_id)
+        if cached is not None:
+            return cached
 
-        return None
+        verify_checksum = random.random() < LEVEL_DATA_CHECKSUM_SAMPLE_RATE
+        for _ in range(_LEVEL_DATA_LOAD_ATTEMPTS):
+            res, raw_metadata = await asyncio.gather(
+                self._storage.load(_data_key(level_id)),
+                self._storage.load(_metadata_key(level_id)),
+            )
+            if res is None:
+                return None
+
+            if raw_metadata is None:
+                # Uploaded before metadata was stored. Awaiting a backfill.
+                metadata = LevelDataMetadata.from_data(res.decode())
+                break
+
+            metadata = LevelDataMetadata.from_bytes(raw_metadata)
+            # A mismatch may also be caused by reading during an update, so
+            # the data is read again before giving up.
+            if _is_intact(res, metadata, verify_checksum):
+                break
+        else:
+            # The data and its metadata are written separately, so a failed or
+            # interrupted upload may leave stale metadata behind. The data is
+            # authoritative, so the metadata is rebuilt from it.
+            logger.warning(
+                "Level data failed its integrity check. Rewriting its metadata.",
+                extra={
+                    "level_id": level_id,
+                    "size": len(res),
+                    "expected_size": metadata.size,
+                },
+            )
+            metadata = LevelDataMetadata.from_data(res.decode())
+            await self._storage.save(_metadata_key(level_id), metadata.as_bytes())
+
+        level_data = LevelData(res.decode(), metadata)
+        self._cache.set(level_id, level_data)
+        return level_data
 
     async def create(
         self,
-        user_id: int,
+        level_id: int,
         data: str,
     ) -> LevelData:
-        await self._storage.save(f"levels/{user_id}", data.encode())
-        return LevelData(data)
+        metadata = LevelDataMetadata.from_data(data)
+        await asyncio.gather(
+            self._storage.save(_data_key(level_id), data.encode()),
+            self._storage.save(_metadata_key(level_id), metadata.as_bytes()),
+        )
+
+        self.evict(level_id)
+        await self._redis.publish(LEVEL_DATA_INVALIDATION_CHANNEL, str(level_id))
+        return LevelData(data, metadata)
+
+    async def backfill_metadata(self, level_id: int) -> bool:
+        """Calculates and stores the metadata for level data uploaded before
+        it was stored. Returns whether any metadata was written."""
+
+        if await self._storage.load(_metadata_key(level_id)) is not None:
+            return False
+
+        res = await self._storage.load(_data_key(level_id))
+        if res is None:
+            return False
+
+        metadata = LevelDataMetadata.from_data(res.decode())
+        await self._storage.save(_metadata_key(level_id), metadata.as_bytes())
+        return True
+
+    def evict(self, level_id: int) -> None:
+        """Removes the level data from this worker's cache."""
+        self._cache.delete(level_id)
+
+
+def _is_intact(
+    data: bytes,
+    metadata: LevelDataMetadata,
+    verify_checksum: bool,
+) -> bool:
+    if len(data) != metadata.size:
+        return False
+
+    return not verify_checksum or hashlib.sha256(data).hexdigest() == metadata.checksum
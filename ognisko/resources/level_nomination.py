@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from typing import NamedTuple
+from typing import override
+
+import numpy as np
+
+from .level_store import ColumnarLevelStore
+
+
+class NominationCandidate(NamedTuple):
+    id: int
+    stars: int
+    length: int
+    likes: int
+    downloads: int
+
+
+class LevelNominationSnapshot(ColumnarLevelStore[NominationCandidate]):
+    """A columnar snapshot of the levels that may be automatically nominated
+    as the daily or weekly level, alongside the time each was last scheduled.
+
+    Nominations are scored and filtered as vectorised operations over the
+    snapshot, so that they take the same time regardless of the number of
+    levels stored in MySQL."""
+
+    COLUMNS = {
+        "stars": np.int16,
+        "length": np.int8,
+        "likes": np.int64,
+        "downloads": np.int64,
+        "last_scheduled": np.float64,
+    }
+
+    __slots__ = (
+        "_scheduled_at",
+        "_last_schedule_id",
+    )
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        # The last time each level was scheduled, kept for levels which only
+        # become candidates later.
+        self._scheduled_at: dict[int, float] = {}
+        self._last_schedule_id = 0
+
+    @property
+    def last_schedule_id(self) -> int:
+        """The ID of the newest schedule applied to the snapshot."""
+        return self._last_schedule_id
+
+    @override
+    def _store(self, slot: int, level: NominationCandidate, *, added: bool) -> None:
+        columns = self._columns
+        columns["stars"][slot] = level.stars
+        columns["length"][slot] = level.length
+        columns["likes"][slot] = level.likes
+        columns["downloads"][slot] = level.downloads
+
+        if added:
+            columns["last_scheduled"][slot] = self._scheduled_at.get(level.id, 0.0)
+
+    def mark_scheduled(
+        self,
+        schedule_id: int,
+        level_id: int,
+        scheduled_at: float,
+    ) -> None:
+        self._last_schedule_id = max(self._last_schedule_id, schedule_id)
+
+        scheduled_at = max(self._scheduled_at.get(level_id, 0.0), scheduled_at)
+        self._scheduled_at[level_id] = scheduled_at
+
+        slot = self._slots.get(level_id)
+        if slot is not None:
+            self._columns["last_scheduled"][slot] = scheduled_at
+
+    def nominate(
+        self,
+        *,
+        minimum_stars: int,
+        maximum_stars: int,
+        minimum_length: int,
+        scheduled_before: float,
+        excluded_level_ids: list[int],
+        limit: int,
+    ) -> list[int]:
+        """Returns the IDs of the best received matching levels not scheduled
+        since `scheduled_before`, best first.
+
+        Levels are scored by their likes over the square root of their
+        downloads: a high like to download ratio, with an emphasis on lower
+        downloads."""
+        stars = self._column("stars")
+        likes = self._column("likes")
+
+        mask = (
+            self._column("alive")
+            & (stars >= minimum_stars)
+            & (stars <= maximum_stars)
+            & (self._column("length") >= minimum_length)
+            & (self._column("last_scheduled") < scheduled_before)
+            & (likes > 0)
+        )
+        if excluded_level_ids:
+            mask &= ~np.isin(self._column("id"), excluded_level_ids)
+
+        slots = np.flatnonzero(mask)
+        scores = likes[slots] / np.sqrt(np.maximum(self._column("downloads")[slots], 1))
+
+        if limit < len(slots):
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(slots))
+
+        ordered = top[np.argsort(-scores[top], kind="stable")]
+        return self._column("id")[slots[ordered]].tolist()
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import time
+from collections.abc import Collection
+from collections.abc import Mapping
+
+from ognisko.adapters import RedisClient
+from ognisko.utilities.enum import StrEnum
+
+from .search_index import SearchHits
+
+ACTIVITY_WINDOW_HOURS = 24 * 7
+"""The number of hours of level activity kept for computing rankings."""
+
+_STORE_CHUNK_SIZE = 10_000
+
+
+class LevelActivity(StrEnum):
+    LIKES = "likes"
+    DOWNLOADS = "downloads"
+
+
+class LevelRanking(StrEnum):
+    TRENDING = "trending"
+    WELL_RECEIVED = "well_received"
+
+
+def _current_hour() -> int:
+    return int(time.time() // 3600)
+
+
+def _activity_key(activity: LevelActivity, hour: int) -> str:
+    return f"ognisko:level_activity:{activity.value}:{hour}"
+
+
+def _ranking_key(ranking: LevelRanking) -> str:
+    return f"ognisko:level_rankings:{ranking.value}"
+
+
+def _staging_key(ranking: LevelRanking) -> str:
+    return f"ognisko:level_rankings:{ranking.value}:staging"
+
+
+class LevelRankingRepository:
+    """Tracks level activity in hourly sorted set buckets, and stores the level
+    rankings computed from them.
+
+    Rankings are computed into a staging key which is then renamed over the
+    live ranking, so that readers never observe a partially written ranking."""
+
+    __slots__ = ("_redis",)
+
+    def __init__(self, redis: RedisClient) -> None:
+        self._redis = redis
+
+    async def record(
+        self,
+        activity: LevelActivity,
+        level_id: int,
+        amount: int = 1,
+    ) -> None:
+        key = _activity_key(activity, _current_hour())
+
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.zincrby(key, amount, level_id)
+        pipeline.expire(key, (ACTIVITY_WINDOW_HOURS + 1) * 3600, nx=True)
+        await pipeline.execute()
+
+    async def totals(
+        self,
+        activity: LevelActivity,
+        hours: int = ACTIVITY_WINDOW_HOURS,
+    ) -> dict[int, float]:
+        """Returns the activity of each level over the past `hours` hours."""
+        current_hour = _current_hour()
+        totals = await self._redis.zunion(
+            [_activity_key(activity, current_hour - age) for age in range(hours)],
+            withscores=True,
+        )
+        return {int(level_id): score for level_id, score in totals}
+
+    async def store_decayed(
+        self,
+        ranking: LevelRanking,
+        *,
+        hours: int,
+        half_life_hours: float,
+        weights: Mapping[LevelActivity, float],
+        excluded_level_ids: Collection[int] = (),
+    ) -> int:
+        """Ranks the levels by their weighted activity over the past `hours`
+        hours, with each hour's activity halving in weight every
+        `half_life_hours` hours. The sums are computed by Redis. Returns the
+        number of ranked levels."""
+        current_hour = _current_hour()
+        bucket_weights = {
+            _activity_key(activity, current_hour - age): weight
+            * 0.5 ** (age / half_life_hours)
+            for activity, weight in weights.items()
+            for age in range(hours)
+        }
+
+        staging = _staging_key(ranking)
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.zunionstore(staging, bucket_weights)
+        # Dislikes may leave a level with no net positive activity.
+        pipeline.zremrangebyscore(staging, "-inf", 0)
+        excluded = list(excluded_level_ids)
+        for offset in range(0, len(excluded), _STORE_CHUNK_SIZE):
+            pipeline.zrem(staging, *excluded[offset : offset + _STORE_CHUNK_SIZE])
+        pipeline.zcard(staging)
+        *_, ranked = await pipeline.execute()
+
+        await self.__publish(ranking, ranked)
+        return ranked
+
+    async def store(
+        self,
+        ranking: LevelRanking,
+        scores: Mapping[int, float],
+    ) -> None:
+        staging = _staging_key(ranking)
+        items = list(scores.items())
+
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.delete(staging)
+        for offset in range(0, len(items), _STORE_CHUNK_SIZE):
+            pipeline.zadd(staging, dict(items[offset : offset + _STORE_CHUNK_SIZE]))
+        await pipeline.execute()
+
+        await self.__publish(ranking, len(items))
+
+    async def top(
+        self,
+        ranking: LevelRanking,
+        offset: int,
+        count: int,
+    ) -> list[int]:
+        """Returns the IDs of the levels at the given ranks, best first."""
+        level_ids = await self._redis.zrange(
+            _ranking_key(ranking),
+            offset,
+            offset + count - 1,
+            desc=True,
+        )
+        return [int(level_id) for level_id in level_ids]
+
+    async def page(
+        self,
+        ranking: LevelRanking,
+        page: int,
+        page_size: int,
+    ) -> SearchHits:
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.zrange(
+            _ranking_key(ranking),
+            page * page_size,
+            (page + 1) * page_size - 1,
+            desc=True,
+        )
+        pipeline.zcard(_ranking_key(ranking))
+        level_ids, total = await pipeline.execute()
+
+        return SearchHits(
+            ids=[int(level_id) for level_id in level_ids],
+            total=total,
+        )
+
+    async def __publish(self, ranking: LevelRanking, ranked: int) -> None:
+        if ranked:
+            await self._redis.rename(_staging_key(ranking), _ranking_key(ranking))
+        else:
+            await self._redis.delete(_staging_key(ranking), _ranking_key(ranking))
@@ -1,17 +1,30 @@
 from __future__ import annotations
 
 from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from typing import NamedTuple
 
+import orjson
 from sqlalchemy import Column
 from sqlalchemy import DateTime
 from sqlalchemy import Enum
 from sqlalchemy import Integer
 
 from ognisko.adapters import ImplementsMySQL
+from ognisko.adapters.redis import RedisClient
 from ognisko.resources._common import BaseRepository
 from ognisko.resources._common import DatabaseModel
+from ognisko.utilities.cache import AbstractCache
 from ognisko.utilities.enum import StrEnum
 
+LEVEL_SCHEDULE_INVALIDATION_CHANNEL = "ognisko:level_schedules:invalidate"
+"""The Redis pubsub channel used to evict a schedule type from the caches of
+all workers."""
+
+UNSCHEDULED_CACHE_DURATION = timedelta(minutes=1)
+"""How long the absence of a current and next schedule is cached for."""
+
 
 class LevelScheduleType(StrEnum):
     DAILY = "daily"
@@ -26,24 +39,190 @@ class LevelScheduleModel(DatabaseModel):
     scheduled_by_user_id = Column(Integer, nullable=True)
 
 
+class CachedLevelSchedule(NamedTuple):
+    """The current and next schedule of a type, valid until `expires_at`."""
+
+    current: LevelScheduleModel | None
+    next: LevelScheduleModel | None
+    expires_at: datetime
+
+    def as_bytes(self) -> bytes:
+        return orjson.dumps(
+            {
+                "current": _serialise(self.current),
+                "next": _serialise(self.next),
+                "expires_at": self.expires_at.timestamp(),
+            },
+        )
+
+    @staticmethod
+    def from_bytes(data: bytes | str) -> CachedLevelSchedule:
+        decoded = orjson.loads(data)
+        return CachedLevelSchedule(
+            current=_deserialise(decoded["current"]),
+            next=_deserialise(decoded["next"]),
+            expires_at=datetime.fromtimestamp(decoded["expires_at"]),
+        )
+
+
+def _serialise(schedule: LevelScheduleModel | None) -> dict[str, Any] | None:
+    if schedule is None:
+        return None
+
+    return {
+        "id": schedule.id,
+        "interval": schedule.interval,
+        "level_id": schedule.level_id,
+        "starts_at": schedule.starts_at.timestamp(),
+        "ends_at": schedule.ends_at.timestamp(),
+        "scheduled_by_user_id": schedule.scheduled_by_user_id,
+    }
+
+
+def _deserialise(data: dict[str, Any] | None) -> LevelScheduleModel | None:
+    if data is None:
+        return None
+
+    return LevelScheduleModel(
+        id=data["id"],
+        interval=LevelScheduleType(data["interval"]),
+        level_id=data["level_id"],
+        starts_at=datetime.fromtimestamp(data["starts_at"]),
+        ends_at=datetime.fromtimestamp(data["ends_at"]),
+        scheduled_by_user_id=data["scheduled_by_user_id"],
+    )
+
+
 class LevelScheduleRepository(BaseRepository[LevelScheduleModel]):
-    def __init__(self, mysql: ImplementsMySQL) -> None:
+    """Stores the daily and weekly level schedules.
+
+    The current schedule is cached in memory and in Redis until the exact
+    moment it ends. The next schedule is cached alongside it, allowing each
+    worker to roll over to it without querying either."""
+
+    __slots__ = (
+        "_redis",
+        "_cache",
+    )
+
+    def __init__(
+        self,
+        mysql: ImplementsMySQL,
+        redis: RedisClient,
+        cache: AbstractCache[CachedLevelSchedule],
+    ) -> None:
         super().__init__(mysql, LevelScheduleModel)
+        self._redis = redis
+        self._cache = cache
 
     async def current(
         self,
         schedule_type: LevelScheduleType,
+    ) -> LevelScheduleModel | None:
+        now = datetime.now()
+
+        cached = self._cache.get(schedule_type)
+        if cached is not None and now < cached.expires_at:
+            return cached.current
+
+        # Promote the preloaded next schedule once it starts.
+        if (
+            cached is not None
+            and cached.next is not None
+            and cached.next.starts_at <= now < cached.next.ends_at
+        ):
+            cached = CachedLevelSchedule(
+                current=cached.next,
+                next=None,
+                expires_at=cached.next.ends_at,
+            )
+            self._cache.set(schedule_type, cached)
+            return cached.current
+
+        cached = await self.__from_redis(schedule_type)
+        if cached is None or now >= cached.expires_at:
+            cached = await self.__from_database(schedule_type, now)
+            await self.__store_redis(schedule_type, cached)
+
+        self._cache.set(schedule_type, cached)
+        return cached.current
+
+    async def invalidate(self, schedule_type: LevelScheduleType) -> None:
+        """Removes the cached schedules of the type from Redis and the
+        caches of all workers."""
+        await self._redis.delete(self.__redis_key(schedule_type))
+        self.evict(schedule_type)
+        await self._redis.publish(
+            LEVEL_SCHEDULE_INVALIDATION_CHANNEL,
+            schedule_type.value,
+        )
+
+    def evict(self, schedule_type: LevelScheduleType) -> None:
+        """Removes the cached schedules of the type from this worker's
+        cache."""
+        self._cache.delete(schedule_type)
+
+    async def __from_redis(
+        self,
+        schedule_type: LevelScheduleType,
+    ) -> CachedLevelSchedule | None:
+        data = await self._redis.get(self.__redis_key(schedule_type))
+        if data is None:
+            return None
+
+        return CachedLevelSchedule.from_bytes(data)
+
+    async def __store_redis(
+        self,
+        schedule_type: LevelScheduleType,
+        cached: CachedLevelSchedule,
+    ) -> None:
+        await self._redis.set(
+            self.__redis_key(schedule_type),
+            cached.as_bytes(),
+            pxat=int(cached.expires_at.timestamp() * 1000),
+        )
+
+    async def __from_database(
+        self,
+        schedule_type: LevelScheduleType,
+        now: datetime,
+    ) -> CachedLevelSchedule:
+        current = await self.__current_from_database(schedule_type, now)
+        next_schedule = await self.next(schedule_type)
+
+        if current is not None:
+            expires_at = current.ends_at
+        elif next_schedule is not None:
+            expires_at = next_schedule.starts_at
+        else:
+            expires_at = now + UNSCHEDULED_CACHE_DURATION
+
+        return CachedLevelSchedule(
+            current=current,
+            next=next_schedule,
+            expires_at=expires_at,
+        )
+
+    async def __current_from_database(
+        self,
+        schedule_type: LevelScheduleType,
+        now: datetime,
     ) -> LevelScheduleModel | None:
         return (
             await self._mysql.select(LevelScheduleModel)
             .where(
                 LevelScheduleModel.interval == schedule_type,
-                LevelScheduleModel.starts_at <= datetime.now(),
-                LevelScheduleModel.ends_at >= datetime.now(),
+                LevelScheduleModel.starts_at <= now,
+                LevelScheduleModel.ends_at >= now,
             )
             .fetch_one()
         )
 
+    @staticmethod
+    def __redis_key(schedule_type: LevelScheduleType) -> str:
+        return f"ognisko:level_schedules:{schedule_type.value}"
+
     async def next(self, schedule_type: LevelScheduleType) -> LevelScheduleModel | None:
         return (
             await self._mysql.select(LevelScheduleModel)
@@ -85,3 +264,13 @@ class LevelScheduleRepository(BaseRepository[LevelScheduleModel]):
             .limit(n)
             .fetch_all()
         )
+
+    async def after_id(self, schedule_id: int) -> list[LevelScheduleModel]:
+        return (
+            await self._mysql.select(LevelScheduleModel)
+            .where(
+                LevelScheduleModel.id > schedule_id,
+            )
+            .order_by(LevelScheduleModel.id)
+            .fetch_all()
+        )
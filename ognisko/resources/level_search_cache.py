@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from ognisko.adapters import RedisClient
+from ognisko.utilities import metrics
+
+_OUTDATED_KEY = "ognisko:level_search:outdated"
+
+
+def _cache_key(search_type: int) -> str:
+    return f"ognisko:level_search:{int(search_type)}"
+
+
+class LevelSearchCacheRepository:
+    """Caches rendered level search responses, grouped by search type.
+
+    Each search type's responses are stored in a single hash, which expires
+    a fixed time after its first response is cached. This keeps lookups to a
+    single round trip and allows all responses of a search type to be
+    invalidated at once."""
+
+    __slots__ = ("_redis",)
+
+    def __init__(self, redis: RedisClient) -> None:
+        self._redis = redis
+
+    async def get(self, search_type: int, key: str) -> str | None:
+        response = await self._redis.hget(_cache_key(search_type), key)
+
+        metrics.registry.counter(
+            "level_search_cache_lookups",
+            search_type=str(int(search_type)),
+            result="miss" if response is None else "hit",
+        ).increment()
+        return response
+
+    async def set(
+        self,
+        search_type: int,
+        key: str,
+        response: str,
+        ttl: int,
+    ) -> None:
+        cache_key = _cache_key(search_type)
+
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.hset(cache_key, key, response)
+        pipeline.expire(cache_key, ttl, nx=True)
+        await pipeline.execute()
+
+    async def invalidate(self, search_type: int) -> None:
+        await self._redis.delete(_cache_key(search_type))
+
+    async def mark_outdated(self, search_type: int) -> None:
+        """Marks the search type's responses to be invalidated once the
+        search index is next updated, as invalidating them earlier could
+        cache the responses again before the changes are searchable."""
+        await self._redis.sadd(_OUTDATED_KEY, int(search_type))
+
+    async def invalidate_outdated(self) -> None:
+        search_types = await self._redis.spop(_OUTDATED_KEY, 64)
+        if search_types:
+            await self._redis.delete(*(_cache_key(int(x)) for x in search_types))
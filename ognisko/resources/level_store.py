@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import time
+from abc import ABC
+from abc import abstractmethod
+from collections.abc import Iterable
+from collections.abc import Mapping
+from typing import Any
+from typing import ClassVar
+from typing import Protocol
+
+import numpy as np
+import numpy.typing as npt
+
+_INITIAL_CAPACITY = 1024
+
+
+class _Identified(Protocol):
+    @property
+    def id(self) -> int: ...
+
+
+class ColumnarLevelStore[L: _Identified](ABC):
+    """An in-process store of level attributes, kept in columnar arrays
+    indexed by slot so that they may be filtered and sorted as vectorised
+    operations. Slots of removed levels are reused.
+
+    Subclasses declare their columns in `COLUMNS` and write each level's
+    attributes to them in `_store`. Levels changed elsewhere are tracked until
+    they are refreshed."""
+
+    COLUMNS: ClassVar[Mapping[str, npt.DTypeLike]]
+
+    __slots__ = (
+        "ready",
+        "_slots",
+        "_free_slots",
+        "_size",
+        "_columns",
+        "_pending",
+    )
+
+    def __init__(self) -> None:
+        self.ready = False
+        """Whether all levels have been loaded into the store."""
+
+        self._slots: dict[int, int] = {}
+        self._free_slots: list[int] = []
+        self._size = 0
+
+        self._columns: dict[str, npt.NDArray[Any]] = {
+            name: np.zeros(_INITIAL_CAPACITY, dtype=dtype)
+            for name, dtype in {
+                "id": np.int64,
+                "alive": np.bool_,
+                **self.COLUMNS,
+            }.items()
+        }
+
+        # Level IDs mapped to the time they were last changed.
+        self._pending: dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def upsert(self, levels: Iterable[L]) -> None:
+        for level in levels:
+            slot = self._slots.get(level.id)
+            added = slot is None
+            if slot is None:
+                slot = self.__allocate()
+                self._slots[level.id] = slot
+
+            self._columns["id"][slot] = level.id
+            self._columns["alive"][slot] = True
+            self._store(slot, level, added=added)
+
+    def remove(self, level_ids: Iterable[int]) -> None:
+        for level_id in level_ids:
+            slot = self._slots.pop(level_id, None)
+            if slot is None:
+                continue
+
+            self._discard(slot)
+            self._columns["alive"][slot] = False
+            self._free_slots.append(slot)
+
+    def mark_changed(self, level_id: int) -> None:
+        self._pending[level_id] = time.time()
+
+    def take_changed(self, settled_before: float) -> list[int]:
+        """Returns the IDs of the levels changed before the given time,
+        no longer tracking them as changed."""
+        level_ids = [
+            level_id
+            for level_id, changed_at in self._pending.items()
+            if changed_at < settled_before
+        ]
+        for level_id in level_ids:
+            del self._pending[level_id]
+
+        return level_ids
+
+    @abstractmethod
+    def _store(self, slot: int, level: L, *, added: bool) -> None:
+        """Writes the level's attributes to its slot. `added` is set if the
+        level was not in the store before."""
+
+    def _discard(self, slot: int) -> None:
+        """Called before the slot of a removed level is freed."""
+
+    def _column(self, name: str) -> npt.NDArray[Any]:
+        """Returns the column's values for every allocated slot, including
+        those of removed levels."""
+        return self._columns[name][: self._size]
+
+    def __allocate(self) -> int:
+        if self._free_slots:
+            return self._free_slots.pop()
+
+        if self._size == len(self._columns["id"]):
+            self.__grow()
+
+        slot = self._size
+        self._size += 1
+        return slot
+
+    def __grow(self) -> None:
+        capacity = len(self._columns["id"]) * 2
+        for name, array in self._columns.items():
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[: len(array)] = array
+            self._columns[name] = grown
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime
+
+from ognisko.adapters import RedisClient
+
+ONLINE_WINDOW = 5 * 60
+"""The time since a user's last request for which they are considered
+online."""
+
+DAILY_PRESENCE_TTL = 60 * 60 * 24 * 35
+MONTHLY_PRESENCE_TTL = 60 * 60 * 24 * 400
+
+
+def _daily_key(date: datetime) -> str:
+    return f"ognisko:presence:daily:{date:%Y%m%d}"
+
+
+def _monthly_key(date: datetime) -> str:
+    return f"ognisko:presence:monthly:{date:%Y%m}"
+
+
+_ONLINE_KEY = "ognisko:presence:online"
+
+
+class PresenceRepository:
+    """Tracks user activity. Daily activity is kept in a bitmap indexed by
+    user id, monthly activity in a HyperLogLog and current activity in a
+    sorted set of last request times."""
+
+    __slots__ = ("_redis",)
+
+    def __init__(self, redis: RedisClient) -> None:
+        self._redis = redis
+
+    async def record(self, user_id: int) -> None:
+        now = datetime.now()
+        daily_key = _daily_key(now)
+        monthly_key = _monthly_key(now)
+
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.setbit(daily_key, user_id, 1)
+        pipeline.expire(daily_key, DAILY_PRESENCE_TTL)
+        pipeline.pfadd(monthly_key, user_id)
+        pipeline.expire(monthly_key, MONTHLY_PRESENCE_TTL)
+        pipeline.zadd(_ONLINE_KEY, {str(user_id): time.time()})
+        await pipeline.execute()
+
+    async def count_online(self) -> int:
+        cutoff = time.time() - ONLINE_WINDOW
+
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.zremrangebyscore(_ONLINE_KEY, "-inf", cutoff)
+        pipeline.zcard(_ONLINE_KEY)
+        _, online = await pipeline.execute()
+        return online
+
+    async def count_daily(self, date: datetime | None = None) -> int:
+        return await self._redis.bitcount(_daily_key(date or datetime.now()))
+
+    async def count_monthly(self, date: datetime | None = None) -> int:
+        """Returns the approximate number of distinct active users in the
+        month."""
+        return await self._redis.pfcount(_monthly_key(date or datetime.now()))
+
+    async def was_active_on(self, user_id: int, date: datetime) -> bool:
+        return bool(await self._redis.getbit(_daily_key(date), user_id))
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import NamedTuple
+
+from ognisko.adapters import RedisClient
+
+PROFILE_SNAPSHOT_TTL = 60 * 60 * 24
+"""The time after which an untouched profile snapshot is discarded."""
+
+# Stores the snapshot `KEYS[1]` only if the user's version `KEYS[2]` still
+# equals `ARGV[1]`, the version read before the profile was read from MySQL.
+_CREATE_SCRIPT = """
+if (redis.call("GET", KEYS[2]) or "0") ~= ARGV[1] then
+    return 0
+end
+redis.call("HSET", KEYS[1], unpack(ARGV, 3))
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+return 1
+"""
+
+
+def _snapshot_key(user_id: int) -> str:
+    return f"ognisko:profiles:{user_id}"
+
+
+def _version_key(user_id: int) -> str:
+    return f"ognisko:profiles:{user_id}:version"
+
+
+class ProfileSnapshots(NamedTuple):
+    snapshots: dict[int, dict[int, str]]
+    versions: dict[int, str]
+    """The versions of the users without a snapshot, which must be passed to
+    `create_many` when creating theirs."""
+
+
+class ProfileSnapshotRepository:
+    """Stores the rendered profile fields of users in Redis hashes, allowing
+    lists of profiles (such as leaderboards) to be served without MySQL.
+
+    Each user has a version, incremented whenever their snapshot is deleted.
+    Snapshots are only created if the version is unchanged since it was read,
+    so that a profile read from MySQL before a change is never stored after
+    it."""
+
+    __slots__ = ("_redis", "_create_script")
+
+    def __init__(self, redis: RedisClient) -> None:
+        self._redis = redis
+        self._create_script = redis.register_script(_CREATE_SCRIPT)
+
+    async def multiple_from_user_ids(self, user_ids: list[int]) -> ProfileSnapshots:
+        """Fetches the snapshots of the given users, alongside the versions of
+        the users without a snapshot."""
+        if not user_ids:
+            return ProfileSnapshots({}, {})
+
+        pipeline = self._redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipeline.hgetall(_snapshot_key(user_id))
+            pipeline.get(_version_key(user_id))
+
+        results = await pipeline.execute()
+        snapshots = {}
+        versions = {}
+        for user_id, snapshot, version in zip(
+            user_ids,
+            results[::2],
+            results[1::2],
+        ):
+            if snapshot:
+                snapshots[user_id] = {
+                    int(key): value for key, value in snapshot.items()
+                }
+            else:
+                versions[user_id] = version or "0"
+
+        return ProfileSnapshots(snapshots, versions)
+
+    async def create_many(
+        self,
+        snapshots: Mapping[int, Mapping[int | str, int | str | float]],
+        versions: Mapping[int, str],
+    ) -> None:
+        """Stores the snapshots of users whose version still matches the one
+        in `versions`."""
+        if not snapshots:
+            return
+
+        pipeline = self._redis.pipeline(transaction=False)
+        for user_id, snapshot in snapshots.items():
+            fields = [item for key, value in snapshot.items() for item in (key, value)]
+            await self._create_script(
+                keys=[_snapshot_key(user_id), _version_key(user_id)],
+                args=[versions.get(user_id, "0"), PROFILE_SNAPSHOT_TTL, *fields],
+                client=pipeline,
+            )
+
+        await pipeline.execute()
+
+    async def delete(self, user_id: int) -> None:
+        """Discards the user's snapshot. This must be called after every change
+        to the user's profile."""
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.delete(_snapshot_key(user_id))
+        pipeline.incr(_version_key(user_id))
+        pipeline.expire(_version_key(user_id), PROFILE_SNAPSHOT_TTL)
+        await pipeline.execute()
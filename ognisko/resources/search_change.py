@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import time
+from typing import NamedTuple
+
+from redis.exceptions import ResponseError
+
+from ognisko.adapters.redis import RedisClient
+from ognisko.utilities.enum import StrEnum
+
+SEARCH_CHANGE_STREAM = "ognisko:search:changes"
+SEARCH_CHANGE_GROUP = "indexers"
+
+SEARCH_CHANGE_CHANNEL = "ognisko:search:changed"
+"""Changes are also broadcast, for in-process indexes which must all see
+every change."""
+
+SEARCH_CHANGE_STREAM_LENGTH = 100_000
+"""The approximate number of changes kept in the stream. Acknowledged
+changes are trimmed, so this only matters while no indexer is running."""
+
+SEARCH_CHANGE_DEAD_STREAM = "ognisko:search:changes:dead"
+"""Changes which repeatedly failed to apply, kept for inspection."""
+
+SEARCH_CHANGE_DEFERRED_KEY = "ognisko:search:changes:deferred"
+"""Changes waiting to be recorded, in a sorted set scored by the time they
+are due."""
+
+# Moves up to `ARGV[2]` deferred changes due by `ARGV[1]` from the sorted set
+# `KEYS[1]` to the stream `KEYS[2]`, trimming it to about `ARGV[3]` entries and
+# broadcasting each to the channel `ARGV[4]`. Returns the number moved.
+_RECORD_DUE_SCRIPT = """
+local due = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, ARGV[2])
+for _, change in ipairs(due) do
+    local index, id = string.match(change, "^(.+):(%d+)$")
+    redis.call("XADD", KEYS[2], "MAXLEN", "~", ARGV[3], "*", "index", index, "id", id)
+    redis.call("PUBLISH", ARGV[4], change)
+    redis.call("ZREM", KEYS[1], change)
+end
+return #due
+"""
+
+
+class SearchIndex(StrEnum):
+    LEVELS = "levels"
+    USERS = "users"
+
+
+class SearchChange(NamedTuple):
+    message_id: str
+    index: SearchIndex
+    resource_id: int
+    recorded_at: float
+    """The UNIX timestamp at which the change was recorded."""
+
+
+class SearchChangeRepository:
+    """A feed of resources whose search documents are outdated.
+
+    Changes only identify the resource. Indexers look up its current state
+    when applying them, so repeated changes to a resource may be coalesced
+    and applied in any order."""
+
+    __slots__ = (
+        "_redis",
+        "_record_due_script",
+    )
+
+    def __init__(self, redis: RedisClient) -> None:
+        self._redis = redis
+        self._record_due_script = redis.register_script(_RECORD_DUE_SCRIPT)
+
+    async def record(self, index: SearchIndex, resource_id: int) -> None:
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.xadd(
+            SEARCH_CHANGE_STREAM,
+            {
+                "index": index.value,
+                "id": resource_id,
+            },
+            maxlen=SEARCH_CHANGE_STREAM_LENGTH,
+            approximate=True,
+        )
+        pipeline.publish(SEARCH_CHANGE_CHANNEL, _change_member(index, resource_id))
+        await pipeline.execute()
+
+    async def defer(
+        self,
+        index: SearchIndex,
+        resource_id: int,
+        *,
+        delay_seconds: int,
+    ) -> None:
+        """Records a change to the resource once `delay_seconds` have passed,
+        through `record_due`. Changes deferred while one is already waiting
+        are recorded along with it."""
+        await self._redis.zadd(
+            SEARCH_CHANGE_DEFERRED_KEY,
+            {_change_member(index, resource_id): time.time() + delay_seconds},
+            nx=True,
+        )
+
+    async def record_due(self, limit: int) -> int:
+        """Records up to `limit` deferred changes which are now due, returning
+        the number recorded."""
+        return await self._record_due_script(
+            keys=[SEARCH_CHANGE_DEFERRED_KEY, SEARCH_CHANGE_STREAM],
+            args=[
+                time.time(),
+                limit,
+                SEARCH_CHANGE_STREAM_LENGTH,
+                SEARCH_CHANGE_CHANNEL,
+            ],
+        )
+
+    async def ensure_group(self) -> None:
+        try:
+            await self._redis.xgroup_create(
+                SEARCH_CHANGE_STREAM,
+                SEARCH_CHANGE_GROUP,
+                id="0",
+                mkstream=True,
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read(
+        self,
+        consumer: str,
+        *,
+        count: int,
+        block_ms: int,
+        pending: bool = False,
+    ) -> list[SearchChange]:
+        """Reads changes not yet delivered to any indexer. If `pending` is
+        set, changes delivered to `consumer` but not acknowledged are read
+        instead."""
+        response = await self._redis.xreadgroup(
+            SEARCH_CHANGE_GROUP,
+            consumer,
+            {SEARCH_CHANGE_STREAM: "0" if pending else ">"},
+            count=count,
+            block=None if pending else block_ms,
+        )
+
+        return [
+            _change_from_message(message_id, fields)
+            for _, messages in response
+            for message_id, fields in messages
+            if fields
+        ]
+
+    async def claim_abandoned(
+        self,
+        consumer: str,
+        *,
+        count: int,
+        min_idle_ms: int,
+    ) -> list[SearchChange]:
+        """Takes over changes delivered to any indexer, including `consumer`
+        itself, which have not been acknowledged for `min_idle_ms`."""
+        _, messages, *_ = await self._redis.xautoclaim(
+            SEARCH_CHANGE_STREAM,
+            SEARCH_CHANGE_GROUP,
+            consumer,
+            min_idle_ms,
+            count=count,
+        )
+
+        return [
+            _change_from_message(message_id, fields)
+            for message_id, fields in messages
+            # Changes trimmed from the stream are still claimed on Redis 6.
+            if fields
+        ]
+
+    async def delivery_counts(self, changes: list[SearchChange]) -> list[int]:
+        """Returns how many times each change has been delivered to an
+        indexer, or 0 if it is no longer pending."""
+        pipeline = self._redis.pipeline(transaction=False)
+        for change in changes:
+            pipeline.xpending_range(
+                SEARCH_CHANGE_STREAM,
+                SEARCH_CHANGE_GROUP,
+                min=change.message_id,
+                max=change.message_id,
+                count=1,
+            )
+
+        return [
+            pending[0]["times_delivered"] if pending else 0
+            for pending in await pipeline.execute()
+        ]
+
+    async def dead_letter(self, changes: list[SearchChange]) -> None:
+        """Moves changes which cannot be applied out of the feed."""
+        if not changes:
+            return
+
+        pipeline = self._redis.pipeline(transaction=False)
+        for change in changes:
+            pipeline.xadd(
+                SEARCH_CHANGE_DEAD_STREAM,
+                {
+                    "index": change.index.value,
+                    "id": change.resource_id,
+                    "message_id": change.message_id,
+                },
+                maxlen=SEARCH_CHANGE_STREAM_LENGTH,
+                approximate=True,
+            )
+        await pipeline.execute()
+
+        await self.acknowledge(changes)
+
+    async def acknowledge(self, changes: list[SearchChange]) -> None:
+        if not changes:
+            return
+
+        message_ids = [change.message_id for change in changes]
+
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.xack(SEARCH_CHANGE_STREAM, SEARCH_CHANGE_GROUP, *message_ids)
+        pipeline.xdel(SEARCH_CHANGE_STREAM, *message_ids)
+        await pipeline.execute()
+
+
+def _change_member(index: SearchIndex, resource_id: int) -> str:
+    return f"{index.value}:{resource_id}"
+
+
+def _change_from_message(message_id: str, fields: dict[str, str]) -> SearchChange:
+    return SearchChange(
+        message_id=message_id,
+        index=SearchIndex(fields["index"]),
+        resource_id=int(fields["id"]),
+        recorded_at=int(message_id.split("-")[0]) / 1000,
+    )
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import time
+from collections.abc import Mapping
+from typing import Any
+from typing import NamedTuple
+
+from meilisearch_python_sdk.errors import MeilisearchApiError
+from meilisearch_python_sdk.models.settings import MeilisearchSettings
+from meilisearch_python_sdk.models.settings import MinWordSizeForTypos
+from meilisearch_python_sdk.models.settings import TypoTolerance
+
+from ognisko.adapters.meilisearch import MeiliBulkLoader
+from ognisko.adapters.meilisearch import MeiliSearchClient
+from ognisko.adapters.redis import RedisClient
+
+from .search_change import SearchIndex
+
+BUILD_TTL = 60 * 60 * 24
+"""The time after which an unfinished index build is considered abandoned."""
+
+TASK_TIMEOUT_MS = 10 * 60 * 1000
+
+INDEX_SETTINGS = {
+    SearchIndex.LEVELS: MeilisearchSettings(
+        searchable_attributes=["name"],
+        # Every attribute `repositories.level.search` filters on must be listed,
+        # or MeiliSearch rejects the search.
+        filterable_attributes=[
+            "id",
+            "user_id",
+            "publicity",
+            "length",
+            "difficulty",
+            "demon_difficulty",
+            "stars",
+            "feature_order",
+            "epic",
+            "magic",
+            "awarded",
+            "legendary",
+            "mythical",
+            "two_player",
+            "original_id",
+            "official_song_id",
+            "custom_song_id",
+            "coins_verified",
+            "deleted",
+            "upload_ts",
+        ],
+        sortable_attributes=[
+            "downloads",
+            "likes",
+            "stars",
+            "feature_order",
+            "upload_ts",
+        ],
+    ),
+    SearchIndex.USERS: MeilisearchSettings(
+        searchable_attributes=["username"],
+        filterable_attributes=[
+            "id",
+            "privileges",
+        ],
+        sortable_attributes=["stars"],
+        # Exact usernames first, then the most accomplished players.
+        ranking_rules=[
+            "words",
+            "typo",
+            "exactness",
+            "stars:desc",
+            "proximity",
+            "attribute",
+            "sort",
+        ],
+        # Usernames are short, so the default typo budget matches too many
+        # unrelated names.
+        typo_tolerance=TypoTolerance(
+            min_word_size_for_typos=MinWordSizeForTypos(
+                one_typo=4,
+                two_typos=8,
+            ),
+        ),
+    ),
+}
+
+
+class SearchHits(NamedTuple):
+    ids: list[int]
+    """The IDs of the matching documents, in order of relevance."""
+    total: int
+
+
+def _building_key(index: SearchIndex) -> str:
+    return f"ognisko:search:{index.value}:building"
+
+
+def _changed_key(index: SearchIndex) -> str:
+    return f"ognisko:search:{index.value}:building:changed"
+
+
+class SearchIndexRepository:
+    """Manages the MeiliSearch indexes backing search.
+
+    Full rebuilds are loaded into a new generation of the index
+    (`{index}_{version}`), which is swapped with the live index once complete.
+    The previous generation is kept under the new generation's name, so that
+    the swap may be rolled back. While a generation is being built, document
+    updates are applied to both indexes."""
+
+    __slots__ = (
+        "_meili",
+        "_redis",
+    )
+
+    def __init__(self, meili: MeiliSearchClient, redis: RedisClient) -> None:
+        self._meili = meili
+        self._redis = redis
+
+    async def upsert(
+        self,
+        index: SearchIndex,
+        documents: list[Mapping[str, Any]],
+    ) -> None:
+        if not documents:
+            return
+
+        for uid in await self.__targets(index, [doc["id"] for doc in documents]):
+            task = await self._meili.index(uid).add_documents(documents)
+
+        # Waiting on the live index lets callers rely on the documents
+        # being searchable.
+        await self.__wait(task.task_uid)
+
+    async def delete(
+        self,
+        index: SearchIndex,
+        ids: list[int],
+        *,
+        wait: bool = True,
+    ) -> None:
+        """Deletes the documents. If `wait` is unset, returns once the
+        deletion is enqueued rather than once it is applied."""
+        if not ids:
+            return
+
+        for uid in await self.__targets(index, ids):
+            task = await self._meili.index(uid).delete_documents(
+                [str(id) for id in ids],
+            )
+
+        if wait:
+            await self.__wait(task.task_uid)
+
+    async def search(
+        self,
+        index: SearchIndex,
+        query: str,
+        *,
+        page: int,
+        page_size: int,
+        filter: str | list[str] | None = None,
+        sort: list[str] | None = None,
+    ) -> SearchHits:
+        """Searches the live index. The last word of the query is matched as a
+        prefix."""
+        results = await self._meili.index(index.value).search(
+            query,
+            page=page + 1,
+            hits_per_page=page_size,
+            filter=filter,
+            sort=sort,
+            attributes_to_retrieve=["id"],
+        )
+
+        return SearchHits(
+            ids=[hit["id"] for hit in results.hits],
+            total=results.total_hits or 0,
+        )
+
+    async def ensure_exists(self, index: SearchIndex) -> None:
+        """Creates the live index with the current settings if it does not
+        exist. Existing indexes are left as they are, with settings changes
+        taking effect once the index is rebuilt."""
+        try:
+            await self._meili.get_index(index.value)
+        except MeilisearchApiError as e:
+            if e.status_code != 404:
+                raise
+
+            await self._meili.create_index(
+                index.value,
+                "id",
+                settings=INDEX_SETTINGS[index],
+                timeout_in_ms=TASK_TIMEOUT_MS,
+            )
+
+    async def create_generation(self, index: SearchIndex) -> str:
+        """Creates an empty, configured generation of the index and starts
+        tracking documents updated while it is built."""
+        generation = f"{index.value}_{time.time_ns() // 1_000_000}"
+        await self._meili.create_index(
+            generation,
+            "id",
+            settings=INDEX_SETTINGS[index],
+            timeout_in_ms=TASK_TIMEOUT_MS,
+        )
+
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.delete(_changed_key(index))
+        pipeline.set(_building_key(index), generation, ex=BUILD_TTL)
+        await pipeline.execute()
+        return generation
+
+    def loader(self, generation: str) -> MeiliBulkLoader:
+        return self._meili.bulk_loader(generation)
+
+    async def changed_during_build(self, index: SearchIndex) -> set[int]:
+        return {int(id) for id in await self._redis.smembers(_changed_key(index))}
+
+    async def promote(self, index: SearchIndex, generation: str) -> None:
+        """Atomically makes the generation the live index. The previous live
+        index is kept for rollbacks, and any older generations are deleted."""
+        # Both indexes must exist to be swapped.
+        await self._meili.get_or_create_index(index.value, "id")
+        await self.__swap(index, generation)
+        await self.__stop_building(index)
+
+        for uid in await self.generations(index):
+            if uid != generation:
+                await self._meili.delete_index_if_exists(uid)
+
+    async def abandon(self, index: SearchIndex, generation: str) -> None:
+        await self.__stop_building(index)
+        await self._meili.delete_index_if_exists(generation)
+
+    async def rollback(self, index: SearchIndex) -> bool:
+        """Swaps the live index with its previous generation. Returns whether
+        a previous generation was available."""
+        generations = await self.generations(index)
+        if not generations:
+            return False
+
+        await self.__swap(index, generations[-1])
+        return True
+
+    async def generations(self, index: SearchIndex) -> list[str]:
+        """Returns the names of the stored generations of the index, oldest
+        first."""
+        indexes = await self._meili.get_indexes(limit=1000) or []
+        prefix = f"{index.value}_"
+
+        return sorted(
+            (
+                candidate.uid
+                for candidate in indexes
+                if candidate.uid.startswith(prefix)
+                and candidate.uid.removeprefix(prefix).isdigit()
+            ),
+            key=lambda uid: int(uid.removeprefix(prefix)),
+        )
+
+    async def __targets(self, index: SearchIndex, ids: list[int]) -> list[str]:
+        generation = await self._redis.get(_building_key(index))
+        if generation is None:
+            return [index.value]
+
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.sadd(_changed_key(index), *ids)
+        pipeline.expire(_changed_key(index), BUILD_TTL)
+        await pipeline.execute()
+        # The live index is last, so that it is the one waited on.
+        return [generation, index.value]
+
+    async def __swap(self, index: SearchIndex, generation: str) -> None:
+        task = await self._meili.swap_indexes([(index.value, generation)])
+        await self.__wait(task.task_uid)
+
+    async def __wait(self, task_uid: int) -> None:
+        await self._meili.wait_for_task(
+            task_uid,
+            timeout_in_ms=TASK_TIMEOUT_MS,
+            raise_for_status=True,
+        )
+
+    async def __stop_building(self, index: SearchIndex) -> None:
+        await self._redis.delete(_building_key(index), _changed_key(index))
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+
+from ognisko.adapters import RedisClient
+
+SESSION_TTL = 5 * 60
+"""The time since the last successful authentication after which the
+credentials are verified against the database again. Presence is recorded as
+sessions are created, so this must not exceed the presence online window."""
+
+
+def _session_key(user_id: int) -> str:
+    return f"ognisko:sessions:{user_id}"
+
+
+def _hash_token(token: str) -> str:
+    # The tokens are password equivalents, so are not stored as-is.
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class UserSessionRepository:
+    """A short lived cache of recently verified user credentials, allowing
+    active users to skip full credential verification."""
+
+    __slots__ = ("_redis",)
+
+    def __init__(self, redis: RedisClient) -> None:
+        self._redis = redis
+
+    async def create(self, user_id: int, token: str) -> None:
+        await self._redis.set(
+            _session_key(user_id),
+            _hash_token(token),
+            ex=SESSION_TTL,
+        )
+
+    async def validate(self, user_id: int, token: str) -> bool:
+        stored = await self._redis.get(_session_key(user_id))
+        if stored is None:
+            return False
+
+        return hmac.compare_digest(stored, _hash_token(token))
+
+    async def delete(self, user_id: int) -> None:
+        await self._redis.delete(_session_key(user_id))
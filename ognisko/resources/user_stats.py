@@ -39,3 +39,18 @@ class UserStatsModel(DatabaseModel):
 class UserStatsRepository(BaseRepository[UserStatsModel]):
     def __init__(self, mysql: ImplementsMySQL) -> None:
         super().__init__(mysql, UserStatsModel)
+
+    async def increment_creator_points(self, user_id: int, delta: int) -> None:
+        """Atomically adjusts the user's creator points by `delta`."""
+        await self._mysql.update(UserStatsModel).where(
+            UserStatsModel.id == user_id,
+        ).values(
+            creator_points=UserStatsModel.creator_points + delta,
+        ).execute()
+
+    async def set_creator_points(self, user_id: int, creator_points: int) -> None:
+        await self._mysql.update(UserStatsModel).where(
+            UserStatsModel.id == user_id,
+        ).values(
+            creator_points=creator_points,
+        ).execute()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from . import creator_points
 from . import daily_chests
 from . import friend_requests
 from . import leaderboards
@@ -8,6 +9,7 @@ from . import levels
 from . import likes
 from . import messages
 from . import save_data
+from . import search_index
 from . import songs
 from . import user_comments
 from . import user_credentials
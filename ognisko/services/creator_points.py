@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import AsyncIterator
+
+from ognisko import repositories
+from ognisko.common.context import Context
+from ognisko.constants.users import CREATOR_PRIVILEGES
+from ognisko.constants.users import UserPrivileges
+from ognisko.helpers.level import calculate_creator_points
+from ognisko.models.level import Level
+from ognisko.services import search_index
+
+
+def _level_creator_points(level: Level | None) -> int:
+    if level is None or level.deleted:
+        return 0
+
+    return calculate_creator_points(
+        level.stars,
+        level.feature_order,
+        level.search_flags,
+    )
+
+
+async def apply_delta(ctx: Context, user_id: int, delta: int) -> None:
+    """Adjusts a user's creator points, mirroring the change onto the creator
+    leaderboard if the user is publicly listed on it."""
+    if not delta:
+        return
+
+    await ctx.user_stats.increment_creator_points(user_id, delta)
+
+    user = await repositories.user.from_id(ctx, user_id)
+    if (
+        user is not None
+        and user.privileges & UserPrivileges.USER_CREATOR_LEADERBOARD_PUBLIC
+    ):
+        await ctx.leaderboards.increment_creator_count(user_id, delta)
+
+    await ctx.profile_snapshots.delete(user_id)
+    await search_index.record_user_change(ctx, user_id)
+
+
+async def apply_level_change(
+    ctx: Context,
+    before: Level | None,
+    after: Level | None,
+) -> None:
+    """Applies the creator point changes caused by a level being created,
+    modified, moved between users or deleted."""
+    old_points = _level_creator_points(before)
+    new_points = _level_creator_points(after)
+
+    if before is not None and after is not None and before.user_id != after.user_id:
+        await apply_delta(ctx, before.user_id, -old_points)
+        await apply_delta(ctx, after.user_id, new_points)
+    elif before is not None:
+        await apply_delta(ctx, before.user_id, new_points - old_points)
+    elif after is not None:
+        await apply_delta(ctx, after.user_id, new_points)
+
+
+async def recompute_all(ctx: Context) -> int:
+    """Recalculates the creator points of every user from their levels in a
+    single pass, rebuilding the creator leaderboard. Returns the number of
+    users whose creator points were corrected."""
+    creator_points: defaultdict[int, int] = defaultdict(int)
+    async for level in repositories.level.all(ctx):
+        creator_points[level.user_id] += _level_creator_points(level)
+
+    corrected = 0
+
+    async def creator_scores() -> AsyncIterator[tuple[int, int]]:
+        nonlocal corrected
+
+        async for user in repositories.user.all(ctx):
+            points = creator_points.get(user.id, 0)
+            if user.creator_points != points:
+                await ctx.user_stats.set_creator_points(user.id, points)
+                await ctx.profile_snapshots.delete(user.id)
+                await search_index.record_user_change(ctx, user.id)
+                corrected += 1
+
+            if user.privileges & CREATOR_PRIVILEGES == CREATOR_PRIVILEGES:
+                yield user.id, points
+
+    await ctx.leaderboards.rebuild_creators(creator_scores())
+    return corrected
@@ -1,56 +1,110 @@
 from __future__ import annotations
 
+from typing import NamedTuple
+
 from ognisko import repositories
+from ognisko.common import gd_obj
 from ognisko.common.context import Context
+from ognisko.common.gd_obj import GDSerialisable
 from ognisko.constants.errors import ServiceError
 from ognisko.constants.leaderboards import LeaderboardType
 from ognisko.constants.users import CREATOR_PRIVILEGES
 from ognisko.constants.users import STAR_PRIVILEGES
-from ognisko.models.user import User
+from ognisko.constants.users import UserRelationshipType
+from ognisko.resources import LeaderboardEntry
 
 LEADERBOARD_SIZE = 100
+LEADERBOARD_RELATIVE_RADIUS = 25
+"""The number of places shown above and below the user on the relative
+leaderboard."""
+
+
+class LeaderboardProfile(NamedTuple):
+    profile: GDSerialisable
+    score: int
+    rank: int
 
 
-async def get(ctx: Context, lb_type: LeaderboardType) -> list[User] | ServiceError:
+async def get(
+    ctx: Context,
+    lb_type: LeaderboardType,
+    user_id: int | None = None,
+) -> list[LeaderboardProfile] | ServiceError:
     match lb_type:
         case LeaderboardType.STAR:
-            top_user_ids = await repositories.leaderboard.get_top_stars_paginated(
-                ctx,
+            entries = await ctx.leaderboards.get_top_stars_paginated(
                 page=0,
                 page_size=LEADERBOARD_SIZE,
             )
         case LeaderboardType.CREATOR:
-            top_user_ids = await repositories.leaderboard.get_top_creators_paginated(
-                ctx,
+            entries = await ctx.leaderboards.get_top_creators_paginated(
                 page=0,
                 page_size=LEADERBOARD_SIZE,
             )
-        case _:
-            raise NotImplementedError
+        case LeaderboardType.STAR_RELATIVE:
+            if user_id is None:
+                return ServiceError.AUTH_NOT_FOUND
 
-    users = await repositories.user.multiple_from_id(ctx, top_user_ids)
-    return users
+            entries = await ctx.leaderboards.get_stars_around(
+                user_id,
+                LEADERBOARD_RELATIVE_RADIUS,
+            )
+        case LeaderboardType.STAR_FRIENDS:
+            if user_id is None:
+                return ServiceError.AUTH_NOT_FOUND
 
+            friends = await repositories.user_relationship.from_user_id(
+                ctx,
+                user_id,
+                UserRelationshipType.FRIEND,
+                include_deleted=False,
+            )
+            entries = await ctx.leaderboards.get_stars_among(
+                [user_id] + [friend.target_user_id for friend in friends],
+            )
 
-async def synchronise_top_stars(ctx: Context) -> bool | ServiceError:
-    async for user in repositories.user.all(ctx):
-        if not (user.privileges & STAR_PRIVILEGES == STAR_PRIVILEGES):
-            continue
+    return await _hydrate_entries(ctx, entries)
+
+
+async def _hydrate_entries(
+    ctx: Context,
+    entries: list[LeaderboardEntry],
+) -> list[LeaderboardProfile]:
+    user_ids = [entry.user_id for entry in entries]
+    profiles, versions = await ctx.profile_snapshots.multiple_from_user_ids(
+        user_ids,
+    )
+
+    # Only users without a snapshot are read from MySQL.
+    if versions:
+        users = await repositories.user.multiple_from_id(ctx, list(versions))
+        missing_profiles = {user.id: gd_obj.create_profile(user) for user in users}
 
-        await repositories.leaderboard.set_star_count(ctx, user.id, user.stars)
+        await ctx.profile_snapshots.create_many(missing_profiles, versions)
+        profiles |= missing_profiles
+
+    return [
+        LeaderboardProfile(profiles[entry.user_id], entry.score, entry.rank)
+        for entry in entries
+        if entry.user_id in profiles
+    ]
+
+
+async def synchronise_top_stars(ctx: Context) -> bool | ServiceError:
+    await ctx.leaderboards.rebuild_stars(
+        (user.id, user.stars)
+        async for user in repositories.user.all(ctx)
+        if user.privileges & STAR_PRIVILEGES == STAR_PRIVILEGES
+    )
 
     return True
 
 
 async def synchronise_top_creators(ctx: Context) -> bool | ServiceError:
-    async for user in repositories.user.all(ctx):
-        if not (user.privileges & CREATOR_PRIVILEGES == CREATOR_PRIVILEGES):
-            continue
-
-        await repositories.leaderboard.set_creator_count(
-            ctx,
-            user.id,
-            user.creator_points,
-        )
+    await ctx.leaderboards.rebuild_creators(
+        (user.id, user.creator_points)
+        async for user in repositories.user.all(ctx)
+        if user.privileges & CREATOR_PRIVILEGES == CREATOR_PRIVILEGES
+    )
 
     return True
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+import math
+
+from ognisko import repositories
+from ognisko.constants.levels import LevelLength
+from ognisko.constants.levels import LevelPublicity
+from ognisko.resources import Context
+from ognisko.resources import LevelActivity
+from ognisko.resources import LevelRanking
+from ognisko.resources.level_ranking import ACTIVITY_WINDOW_HOURS
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_WEIGHT = 0.2
+"""The weight of a download relative to a like in the activity based
+rankings."""
+
+TRENDING_HOURS = ACTIVITY_WINDOW_HOURS
+TRENDING_HALF_LIFE_HOURS = 24.0
+
+WELL_RECEIVED_MINIMUM_DOWNLOADS = 10
+"""The downloads a level needs within the activity window to be ranked as
+well received, keeping a handful of early likes from dominating."""
+
+WELL_RECEIVED_CANDIDATES = 200
+"""The number of best received levels considered when recommending levels
+matching some criteria."""
+
+LISTED_LOOKUP_BATCH_SIZE = 1000
+
+
+async def record_like(ctx: Context, level_id: int, value: int) -> None:
+    await ctx.level_rankings.record(LevelActivity.LIKES, level_id, value)
+
+
+async def record_download(ctx: Context, level_id: int) -> None:
+    await ctx.level_rankings.record(LevelActivity.DOWNLOADS, level_id)
+
+
+async def compute(ctx: Context) -> None:
+    """Recomputes all level rankings from the recorded level activity. Only
+    publicly listed levels are ranked, so that pages of the rankings are
+    never left short."""
+    likes = await ctx.level_rankings.totals(LevelActivity.LIKES)
+    downloads = await ctx.level_rankings.totals(LevelActivity.DOWNLOADS)
+
+    active_ids = likes.keys() | downloads.keys()
+    listed_ids = await _listed_level_ids(ctx, list(active_ids))
+
+    trending = await ctx.level_rankings.store_decayed(
+        LevelRanking.TRENDING,
+        hours=TRENDING_HOURS,
+        half_life_hours=TRENDING_HALF_LIFE_HOURS,
+        weights={
+            LevelActivity.LIKES: 1.0,
+            LevelActivity.DOWNLOADS: DOWNLOAD_WEIGHT,
+        },
+        excluded_level_ids=active_ids - listed_ids,
+    )
+
+    # A high like to download ratio, with an emphasis on lower downloads.
+    well_received = {
+        level_id: likes[level_id] / math.sqrt(download_count)
+        for level_id, download_count in downloads.items()
+        if download_count >= WELL_RECEIVED_MINIMUM_DOWNLOADS
+        and likes.get(level_id, 0) > 0
+        and level_id in listed_ids
+    }
+    await ctx.level_rankings.store(LevelRanking.WELL_RECEIVED, well_received)
+
+    logger.info(
+        "Computed the level rankings.",
+        extra={
+            "trending": trending,
+            "well_received": len(well_received),
+        },
+    )
+
+
+async def _listed_level_ids(ctx: Context, level_ids: list[int]) -> set[int]:
+    listed_ids = set()
+    for offset in range(0, len(level_ids), LISTED_LOOKUP_BATCH_SIZE):
+        levels = await repositories.level.multiple_from_id(
+            ctx,
+            level_ids[offset : offset + LISTED_LOOKUP_BATCH_SIZE],
+        )
+        listed_ids.update(
+            level.id
+            for level in levels
+            if not level.deleted and level.publicity == LevelPublicity.PUBLIC
+        )
+
+    return listed_ids
+
+
+async def get_well_received(
+    ctx: Context,
+    minimum_stars: int,
+    maximum_stars: int,
+    minimum_length: LevelLength,
+    excluded_level_ids: list[int],
+    limit: int,
+) -> list[int]:
+    """Returns the IDs of the best received levels matching the criteria,
+    best first. When no ranked level matches, such as before the rankings are
+    first computed, the levels' lifetime likes and downloads are used instead."""
+    excluded = set(excluded_level_ids)
+    candidate_ids = [
+        level_id
+        for level_id in await ctx.level_rankings.top(
+            LevelRanking.WELL_RECEIVED,
+            0,
+            WELL_RECEIVED_CANDIDATES,
+        )
+        if level_id not in excluded
+    ]
+
+    candidates = {
+        level.id: level
+        for level in await repositories.level.multiple_from_id(ctx, candidate_ids)
+    }
+    recommendations = [
+        level_id
+        for level_id in candidate_ids
+        if (level := candidates.get(level_id)) is not None
+        and not level.deleted
+        and minimum_stars <= level.stars <= maximum_stars
+        and level.length >= minimum_length
+    ]
+    if recommendations:
+        return recommendations[:limit]
+
+    return await repositories.level.get_well_received(
+        ctx,
+        minimum_stars=minimum_stars,
+        maximum_stars=maximum_stars,
+        minimum_length=minimum_length,
+        excluded_level_ids=excluded_level_ids,
+        limit=limit,
+    )
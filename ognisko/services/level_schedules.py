@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import time
 from datetime import datetime
 from datetime import timedelta
 from typing import NamedTuple
@@ -8,10 +9,18 @@ from ognisko import repositories
 from ognisko.common.context import Context
 from ognisko.common.data_utils import linear_biased_random
 from ognisko.constants.errors import ServiceError
-from ognisko.constants.level_schedules import LevelScheduleType
 from ognisko.constants.levels import LevelLength
+from ognisko.constants.levels import LevelPublicity
 from ognisko.models.level import Level
 from ognisko.models.level_schedule import LevelSchedule
+from ognisko.resources import LevelNominationSnapshot
+from ognisko.resources import NominationCandidate
+from ognisko.resources.level_schedule import LevelScheduleModel
+from ognisko.resources.level_schedule import LevelScheduleType
+from ognisko.services import level_rankings
+from ognisko.services import search_index
+
+NOMINATION_REFRESH_SECONDS = 10.0
 
 
 async def schedule_next(
@@ -50,6 +59,9 @@ async def schedule_next(
         scheduled_by_id,
     )
 
+    # The new schedule may be the next one, which is cached.
+    await ctx.level_schedules.invalidate(schedule_type)
+
     return schedule
 
 
@@ -68,6 +80,51 @@ DAILY_LEVELS_TO_EXCLUDE = (
 )
 
 
+def _nomination_candidate(level: Level) -> NominationCandidate | None:
+    if level.deleted or level.publicity != LevelPublicity.PUBLIC or not level.stars:
+        return None
+
+    return NominationCandidate(
+        id=level.id,
+        stars=level.stars,
+        length=level.length.value,
+        likes=level.likes,
+        downloads=level.downloads,
+    )
+
+
+async def _get_recommendations(
+    ctx: Context,
+    minimum_stars: int,
+    maximum_stars: int,
+    minimum_length: LevelLength,
+    excluded_level_ids: list[int],
+    excluded_days: int,
+    limit: int,
+) -> list[int]:
+    # The snapshot is loaded in the background, so the rankings are used
+    # until it is ready.
+    snapshot = ctx.level_nomination_snapshot
+    if snapshot is None or not snapshot.ready:
+        return await level_rankings.get_well_received(
+            ctx,
+            minimum_stars=minimum_stars,
+            maximum_stars=maximum_stars,
+            minimum_length=minimum_length,
+            excluded_level_ids=excluded_level_ids,
+            limit=limit,
+        )
+
+    return snapshot.nominate(
+        minimum_stars=minimum_stars,
+        maximum_stars=maximum_stars,
+        minimum_length=minimum_length.value,
+        scheduled_before=time.time() - excluded_days * 60 * 60 * 24,
+        excluded_level_ids=excluded_level_ids,
+        limit=limit,
+    )
+
+
 # Helper function to separate the algorithm.
 async def _auto_nominate_daily(ctx: Context) -> LevelSchedule | None:
     last_n = await repositories.level_schedule.get_last_n(
@@ -78,12 +135,13 @@ async def _auto_nominate_daily(ctx: Context) -> LevelSchedule | None:
 
     excluded_level_ids = [schedule.level_id for schedule in last_n]
 
-    recommendations = await repositories.level.get_well_received(
+    recommendations = await _get_recommendations(
         ctx,
         minimum_stars=2,
         maximum_stars=7,
         minimum_length=LevelLength.MEDIUM,
         excluded_level_ids=excluded_level_ids,
+        excluded_days=DAILY_LEVELS_TO_EXCLUDE,
         limit=20,
     )
 
@@ -117,6 +175,7 @@ async def _auto_nominate_daily(ctx: Context) -> LevelSchedule | None:
 # - Hasn't been daily in the last 52 days.
 
 WEEKLY_LEVELS_TO_EXCLUDE = 52 // 7
+WEEKLY_EXCLUDED_DAYS = 52
 
 
 # For now, this is rather similar to the daily algorithm, but may change in the future.
@@ -129,12 +188,13 @@ async def _auto_nominate_weekly(ctx: Context) -> LevelSchedule | None:
 
     excluded_level_ids = [schedule.level_id for schedule in last_n]
 
-    recommendations = await repositories.level.get_well_received(
+    recommendations = await _get_recommendations(
         ctx,
         minimum_stars=10,
         maximum_stars=10,
         minimum_length=LevelLength.MEDIUM,
         excluded_level_ids=excluded_level_ids,
+        excluded_days=WEEKLY_EXCLUDED_DAYS,
         limit=20,
     )
 
@@ -161,7 +221,7 @@ async def _auto_nominate_weekly(ctx: Context) -> LevelSchedule | None:
 
 
 class ScheduledLevel(NamedTuple):
-    schedule: LevelSchedule
+    schedule: LevelScheduleModel
     level: Level
 
 
@@ -169,16 +229,17 @@ async def get_current(
     ctx: Context,
     schedule_type: LevelScheduleType,
 ) -> ScheduledLevel | ServiceError:
-    schedule = await repositories.level_schedule.get_current(
-        ctx,
-        schedule_type,
-    )
+    schedule = await ctx.level_schedules.current(schedule_type)
 
     if schedule is None:
         if schedule_type == LevelScheduleType.DAILY:
-            schedule = await _auto_nominate_daily(ctx)
-        elif schedule_type == LevelScheduleType.WEEKLY:
-            schedule = await _auto_nominate_weekly(ctx)
+            nominated = await _auto_nominate_daily(ctx)
+        else:
+            nominated = await _auto_nominate_weekly(ctx)
+
+        if nominated is not None:
+            await ctx.level_schedules.invalidate(schedule_type)
+            schedule = await ctx.level_schedules.current(schedule_type)
 
     if schedule is None:
         return ServiceError.LEVEL_SCHEDULE_UNSET
@@ -195,3 +256,44 @@ async def get_current(
         schedule=schedule,
         level=level,
     )
+
+
+async def _refresh_schedules(
+    ctx: Context,
+    snapshot: LevelNominationSnapshot,
+) -> None:
+    for schedule in await ctx.level_schedules.after_id(snapshot.last_schedule_id):
+        snapshot.mark_scheduled(
+            schedule.id,
+            schedule.level_id,
+            schedule.starts_at.timestamp(),
+        )
+
+
+async def load_nomination_snapshot(ctx: Context) -> None:
+    """Loads all rated, publicly listed levels and their schedules into the
+    in-process nomination snapshot."""
+    snapshot = ctx.level_nomination_snapshot
+    assert snapshot is not None, "The nomination snapshot is not enabled."
+
+    await search_index.load_level_store(
+        ctx,
+        snapshot,
+        _nomination_candidate,
+        on_refresh=lambda: _refresh_schedules(ctx, snapshot),
+    )
+
+
+async def run_nomination_refresher(ctx: Context) -> None:
+    """Keeps the nomination snapshot up to date with the levels changed in
+    the search change feed and with new schedules."""
+    snapshot = ctx.level_nomination_snapshot
+    assert snapshot is not None, "The nomination snapshot is not enabled."
+
+    await search_index.run_level_store_refresher(
+        ctx,
+        snapshot,
+        _nomination_candidate,
+        interval=NOMINATION_REFRESH_SECONDS,
+        on_refresh=lambda: _refresh_schedules(ctx, snapshot),
+    )
@@ -1,14 +1,15 @@
 from __future__ import annotations
 
+import logging
 import time
 from datetime import datetime
 from typing import NamedTuple
 
+from meilisearch_python_sdk.errors import MeilisearchError
+
 from ognisko import repositories
-from ognisko.common import gd_logic
 from ognisko.common.context import Context
 from ognisko.constants.errors import ServiceError
-from ognisko.constants.level_schedules import LevelScheduleType
 from ognisko.constants.levels import LevelDemonDifficulty
 from ognisko.constants.levels import LevelDifficulty
 from ognisko.constants.levels import LevelFeature
@@ -16,10 +17,19 @@ from ognisko.constants.levels import LevelLength
 from ognisko.constants.levels import LevelPublicity
 from ognisko.constants.levels import LevelSearchFlag
 from ognisko.constants.levels import LevelSearchType
-from ognisko.constants.users import CREATOR_PRIVILEGES
 from ognisko.models.level import Level
 from ognisko.models.song import Song
 from ognisko.models.user import User
+from ognisko.resources import LevelRanking
+from ognisko.resources import SearchHits
+from ognisko.resources.level_data import LevelData
+from ognisko.resources.level_schedule import LevelScheduleType
+from ognisko.resources.search_change import SearchIndex
+from ognisko.services import creator_points
+from ognisko.services import level_rankings
+from ognisko.services import search_index
+
+logger = logging.getLogger(__name__)
 
 
 async def create_or_update(
@@ -115,7 +125,7 @@ async def create_or_update(
         if level is None:
             return ServiceError.LEVELS_NOT_FOUND
 
-        await repositories.level_data.create(ctx, level.id, level_data)
+        await ctx.level_data.create(level.id, level_data)
     else:
         level = await repositories.level.create(
             ctx,
@@ -141,11 +151,189 @@ async def create_or_update(
             sfx_ids=sfx_ids,
         )
 
-        await repositories.level_data.create(ctx, level.id, level_data)
+        await ctx.level_data.create(level.id, level_data)
 
+    await search_index.record_level_change(ctx, level.id)
+    await ctx.level_search_cache.mark_outdated(LevelSearchType.RECENT)
     return level
 
 
+SEARCH_EXCLUSION_FILTER_LIMIT = 100
+"""The most completed levels excluded through the search index's filter.
+Larger filters are slow for MeiliSearch to parse and evaluate, so longer lists
+are excluded from over-fetched results instead."""
+
+SEARCH_EXCLUSION_OVERFETCH = 2
+SEARCH_EXCLUSION_MAX_FETCH = 1000
+"""The most results fetched when leaving out excluded levels. MeiliSearch only
+pages through its first 1000 hits by default."""
+
+SEARCH_FOLLOWED_LIMIT = 500
+"""The most followed creators whose levels are searched."""
+
+
+class LevelSearchResults(NamedTuple):
+    results: list[Level]
+    total: int
+
+
+async def _levels_from_hits(ctx: Context, hits: SearchHits) -> LevelSearchResults:
+    levels = {
+        level.id: level
+        for level in await repositories.level.multiple_from_id(ctx, hits.ids)
+    }
+    return LevelSearchResults(
+        results=[
+            level
+            for level_id in hits.ids
+            if (level := levels.get(level_id)) is not None
+            and not level.deleted
+            and level.publicity == LevelPublicity.PUBLIC
+        ],
+        total=hits.total,
+    )
+
+
+def _embedded_search_primary(ctx: Context) -> bool:
+    # MeiliSearch serves searches until the embedded level search has loaded.
+    embedded_search = ctx.embedded_level_search
+    return (
+        embedded_search is not None
+        and embedded_search.primary
+        and embedded_search.ready
+    )
+
+
+async def _search_embedded(ctx: Context, **kwargs) -> LevelSearchResults:
+    hits = search_index.search_levels_embedded(ctx, **kwargs)
+    if hits is None:
+        return LevelSearchResults([], 0)
+
+    return await _levels_from_hits(ctx, hits)
+
+
+async def _search_ranked(
+    ctx: Context,
+    ranking: LevelRanking,
+    page: int,
+    page_size: int,
+) -> LevelSearchResults | None:
+    """Pages through a precomputed level ranking. Returns `None` if the
+    ranking has not been computed."""
+    hits = await ctx.level_rankings.page(ranking, page, page_size)
+    if not hits.total:
+        return None
+
+    return await _levels_from_hits(ctx, hits)
+
+
+async def _search_indexed(ctx: Context, **kwargs) -> LevelSearchResults:
+    if _embedded_search_primary(ctx):
+        return await _search_embedded(ctx, **kwargs)
+
+    try:
+        return await repositories.level.search(ctx, **kwargs)
+    except MeilisearchError:
+        embedded_search = ctx.embedded_level_search
+        if embedded_search is None or not embedded_search.ready:
+            raise
+
+        logger.warning(
+            "MeiliSearch is unavailable, falling back to the embedded level search.",
+            exc_info=True,
+        )
+        return await _search_embedded(ctx, **kwargs)
+
+
+async def _search_indexed_ids(ctx: Context, **kwargs) -> SearchHits:
+    """Searches for the IDs of the matching levels only, without fetching the
+    levels themselves."""
+    hits = None
+    if _embedded_search_primary(ctx):
+        hits = search_index.search_levels_embedded(ctx, **kwargs)
+    else:
+        try:
+            hits = await search_index.search_levels(ctx, **kwargs)
+        except MeilisearchError:
+            embedded_search = ctx.embedded_level_search
+            if embedded_search is None or not embedded_search.ready:
+                raise
+
+            logger.warning(
+                "MeiliSearch is unavailable, falling back to the embedded level search.",
+                exc_info=True,
+            )
+            hits = search_index.search_levels_embedded(ctx, **kwargs)
+
+    return hits or SearchHits([], 0)
+
+
+async def _search_excluding(
+    ctx: Context,
+    excluded_level_ids: frozenset[int],
+    page: int,
+    page_size: int,
+    **kwargs,
+) -> LevelSearchResults:
+    """Searches the levels, leaving out the excluded levels as the results are
+    received rather than through the search index's filter.
+
+    Only the IDs of the results are fetched, over-fetching to make up for the
+    levels left out and doubling the fetch until the page is filled. The
+    levels themselves are only fetched for the final page."""
+    # Levels excluded from earlier pages shift the page, so every result up
+    # to it is fetched.
+    needed = (page + 1) * page_size
+    limit = min(needed * SEARCH_EXCLUSION_OVERFETCH, SEARCH_EXCLUSION_MAX_FETCH)
+
+    while True:
+        hits = await _search_indexed_ids(ctx, page=0, page_size=limit, **kwargs)
+        kept_ids = [
+            level_id for level_id in hits.ids if level_id not in excluded_level_ids
+        ]
+
+        exhausted = len(hits.ids) >= hits.total
+        if len(kept_ids) >= needed or exhausted or limit >= SEARCH_EXCLUSION_MAX_FETCH:
+            break
+
+        limit = min(limit * 2, SEARCH_EXCLUSION_MAX_FETCH)
+
+    # The remaining levels are assumed to be excluded at the same rate as
+    # the fetched ones.
+    total = len(kept_ids)
+    if not exhausted and hits.ids:
+        total = round(hits.total * len(kept_ids) / len(hits.ids))
+
+    return await _levels_from_hits(
+        ctx,
+        SearchHits(
+            ids=kept_ids[page * page_size : needed],
+            total=total,
+        ),
+    )
+
+
+async def _search_filtered(
+    ctx: Context,
+    completed_levels: list[int] | None,
+    **kwargs,
+) -> LevelSearchResults:
+    # The embedded level search excludes levels as cheaply either way.
+    if (
+        completed_levels
+        and len(completed_levels) > SEARCH_EXCLUSION_FILTER_LIMIT
+        and not _embedded_search_primary(ctx)
+    ):
+        return await _search_excluding(
+            ctx,
+            frozenset(completed_levels),
+            completed_levels=None,
+            **kwargs,
+        )
+
+    return await _search_indexed(ctx, completed_levels=completed_levels, **kwargs)
+
+
 class SearchResponse(NamedTuple):
     levels: list[Level]
     total: int
@@ -184,23 +372,52 @@ async def search(
         if lookup_level:
             page_size -= 1
 
-    levels_db = await repositories.level.search(
-        ctx,
-        page=page,
-        page_size=page_size,
-        query=query,
-        search_type=search_type,
-        level_lengths=level_lengths,
-        completed_levels=completed_levels,
-        featured=featured,
-        original=original,
-        two_player=two_player,
-        unrated=unrated,
-        rated=rated,
-        song_id=song_id,
-        custom_song_id=custom_song_id,
-        followed_list=followed_list,
-    )
+    # Clients send their lists as-is, often with duplicates.
+    if completed_levels is not None:
+        completed_levels = list(dict.fromkeys(completed_levels))
+    if followed_list is not None:
+        followed_list = list(dict.fromkeys(followed_list))[:SEARCH_FOLLOWED_LIMIT]
+
+    search_kwargs = {
+        "page": page,
+        "page_size": page_size,
+        "query": query,
+        "search_type": search_type,
+        "level_lengths": level_lengths,
+        "completed_levels": completed_levels,
+        "featured": featured,
+        "original": original,
+        "two_player": two_player,
+        "unrated": unrated,
+        "rated": rated,
+        "song_id": song_id,
+        "custom_song_id": custom_song_id,
+        "followed_list": followed_list,
+    }
+
+    # The trending tab is served from the precomputed ranking, unless it is
+    # filtered.
+    levels_db = None
+    if search_type is LevelSearchType.TRENDING and not (
+        level_lengths
+        or completed_levels
+        or featured
+        or original
+        or two_player
+        or unrated
+        or rated
+        or song_id is not None
+        or custom_song_id is not None
+    ):
+        levels_db = await _search_ranked(
+            ctx,
+            LevelRanking.TRENDING,
+            page,
+            page_size,
+        )
+
+    if levels_db is None:
+        levels_db = await _search_filtered(ctx, **search_kwargs)
 
     songs = set(
         await repositories.song.multiple_from_id(
@@ -240,7 +457,7 @@ async def search(
 # Fun fact, gd relies on the search endpoint for song and user data.
 class LevelResponse(NamedTuple):
     level: Level
-    data: str
+    data: LevelData
     schedule_id: int | None = None
 
 
@@ -258,14 +475,14 @@ async def get(
         schedule_type = (
             LevelScheduleType.DAILY if is_daily else LevelScheduleType.WEEKLY
         )
-        schedule = await repositories.level_schedule.get_current(ctx, schedule_type)
+        schedule = await ctx.level_schedules.current(schedule_type)
         if schedule is None:
             return ServiceError.LEVELS_NOT_FOUND
         level_id = schedule.level_id
         schedule_id = schedule.id
 
     level = await repositories.level.from_id(ctx, level_id)
-    level_data = await repositories.level_data.from_level_id(ctx, level_id)
+    level_data = await ctx.level_data.from_level_id(level_id)
     if not (level and level_data):
         return ServiceError.LEVELS_NOT_FOUND
 
@@ -275,6 +492,8 @@ async def get(
         level.id,
         downloads=level.downloads + 1,
     )
+    await level_rankings.record_download(ctx, level.id)
+    await search_index.record_level_download(ctx, level.id)
 
     return LevelResponse(
         level=level,
@@ -302,8 +521,22 @@ async def delete(
         deleted=True,
     )
 
-    # TODO: Creator point recalculation.
-    await repositories.level.delete_meili(ctx, level_id)
+    await creator_points.apply_level_change(ctx, level, None)
+    # Removed straight away rather than through the change feed, including
+    # from any index generation being built. The change feed removes the
+    # level regardless, so a failure here is not fatal.
+    try:
+        await ctx.search_indexes.delete(SearchIndex.LEVELS, [level_id], wait=False)
+    except MeilisearchError:
+        logger.warning(
+            "Failed to remove a deleted level from the search index.",
+            exc_info=True,
+            extra={
+                "level_id": level_id,
+            },
+        )
+    await search_index.record_level_change(ctx, level_id)
+    await ctx.level_search_cache.invalidate(LevelSearchType.RECENT)
     return True
 
 
@@ -311,12 +544,23 @@ async def synchronise_search(ctx: Context) -> bool | ServiceError:
     """Synchronise the search index with the backing database.
     Should be rarely used as its demanding on resources.
     """
-    levels = [level async for level in repositories.level.all(ctx)]
-    await repositories.level.multiple_create_meili(ctx, levels)
+    await search_index.rebuild(ctx, SearchIndex.LEVELS)
 
     return True
 
 
+async def backfill_data_metadata(ctx: Context) -> int:
+    """Stores the size, checksum and security hash of all level data uploaded
+    before they were stored at upload time. Returns the number backfilled."""
+
+    backfilled = 0
+    async for level in repositories.level.all(ctx):
+        if await ctx.level_data.backfill_metadata(level.id):
+            backfilled += 1
+
+    return backfilled
+
+
 async def suggest_stars(
     ctx: Context,
     level_id: int,
@@ -328,13 +572,6 @@ async def suggest_stars(
     if existing_level is None:
         return ServiceError.LEVELS_NOT_FOUND
 
-    user = await repositories.user.from_id(ctx, user_id=existing_level.user_id)
-    if user is None:
-        return ServiceError.USER_NOT_FOUND
-
-    creator_points = user.creator_points
-    current_creator_points = gd_logic.calculate_creator_points(existing_level)
-
     feature_order = int(time.time()) if feature else 0
 
     difficulty = LevelDifficulty.from_stars(stars)
@@ -358,13 +595,8 @@ async def suggest_stars(
     if level is None:
         return ServiceError.LEVELS_NOT_FOUND
 
-    new_creator_points = gd_logic.calculate_creator_points(level)
-    creator_points += new_creator_points - current_creator_points
-
-    await repositories.user.update_partial(ctx, user.id, creator_points=creator_points)
-
-    if user.privileges & CREATOR_PRIVILEGES == CREATOR_PRIVILEGES:
-        await repositories.leaderboard.set_creator_count(ctx, user.id, creator_points)
+    await creator_points.apply_level_change(ctx, existing_level, level)
+    await search_index.record_level_change(ctx, level.id)
 
     return level
 
@@ -393,6 +625,8 @@ async def set_description(
     if result is None:
         return ServiceError.LEVELS_NOT_FOUND
 
+    await search_index.record_level_change(ctx, result.id)
+
     return result
 
 
@@ -415,6 +649,8 @@ async def nominate_awarded(
     if result is None:
         return ServiceError.LEVELS_NOT_FOUND
 
+    await search_index.record_level_change(ctx, result.id)
+
     return result
 
 
@@ -437,6 +673,8 @@ async def revoke_awarded(
     if result is None:
         return ServiceError.LEVELS_NOT_FOUND
 
+    await search_index.record_level_change(ctx, result.id)
+
     return result
 
 
@@ -468,6 +706,9 @@ async def set_unlisted(
     if result is None:
         return ServiceError.LEVELS_NOT_FOUND
 
+    await search_index.record_level_change(ctx, result.id)
+    await ctx.level_search_cache.mark_outdated(LevelSearchType.RECENT)
+
     return result
 
 
@@ -493,6 +734,9 @@ async def set_listed(
     if result is None:
         return ServiceError.LEVELS_NOT_FOUND
 
+    await search_index.record_level_change(ctx, result.id)
+    await ctx.level_search_cache.mark_outdated(LevelSearchType.RECENT)
+
     return result
 
 
@@ -508,18 +752,12 @@ async def rate_level(
     if level is None:
         return ServiceError.LEVELS_NOT_FOUND
 
-    creator = await repositories.user.from_id(ctx, level.user_id)
-    if creator is None:
-        return ServiceError.USER_NOT_FOUND  # NOTE: Should never happen
-
-    old_creator_points = gd_logic.calculate_creator_points(level)
-
     if stars == 10:
         demon_diff = LevelDemonDifficulty.HARD
     else:
         demon_diff = None
 
-    level = await repositories.level.update_partial(
+    result = await repositories.level.update_partial(
         ctx,
         level_id,
         stars=stars,
@@ -528,18 +766,14 @@ async def rate_level(
         demon_difficulty=demon_diff,
     )
 
-    if level is None:
+    if result is None:
         return ServiceError.LEVELS_NOT_FOUND
 
-    creator_delta = gd_logic.calculate_creator_points(level) - old_creator_points
+    await search_index.record_level_change(ctx, result.id)
 
-    await repositories.user.update_partial(
-        ctx,
-        creator.id,
-        creator_points=creator.creator_points + creator_delta,
-    )
+    await creator_points.apply_level_change(ctx, level, result)
 
-    return level
+    return result
 
 
 async def nominate_magic(
@@ -561,6 +795,8 @@ async def nominate_magic(
     if result is None:
         return ServiceError.LEVELS_NOT_FOUND
 
+    await search_index.record_level_change(ctx, result.id)
+
     return result
 
 
@@ -583,6 +819,8 @@ async def revoke_magic(
     if result is None:
         return ServiceError.LEVELS_NOT_FOUND
 
+    await search_index.record_level_change(ctx, result.id)
+
     return result
 
 
@@ -594,12 +832,6 @@ async def nominate_epic(
     if not level:
         return ServiceError.LEVELS_NOT_FOUND
 
-    creator = await repositories.user.from_id(ctx, level.user_id)
-    if creator is None:
-        return ServiceError.USER_NOT_FOUND  # NOTE: Should never happen
-
-    old_creator_points = gd_logic.calculate_creator_points(level)
-
     search_flags = level.search_flags | LevelSearchFlag.EPIC
 
     result = await repositories.level.update_partial(
@@ -612,13 +844,9 @@ async def nominate_epic(
     if result is None:
         return ServiceError.LEVELS_NOT_FOUND
 
-    creator_delta = gd_logic.calculate_creator_points(result) - old_creator_points
+    await search_index.record_level_change(ctx, result.id)
 
-    await repositories.user.update_partial(
-        ctx,
-        creator.id,
-        creator_points=creator.creator_points + creator_delta,
-    )
+    await creator_points.apply_level_change(ctx, level, result)
 
     return result
 
@@ -631,12 +859,6 @@ async def revoke_epic(
     if not level:
         return ServiceError.LEVELS_NOT_FOUND
 
-    creator = await repositories.user.from_id(ctx, level.user_id)
-    if creator is None:
-        return ServiceError.USER_NOT_FOUND  # NOTE: Should never happen
-
-    old_creator_points = gd_logic.calculate_creator_points(level)
-
     search_flags = level.search_flags & ~LevelSearchFlag.EPIC
 
     result = await repositories.level.update_partial(
@@ -648,13 +870,9 @@ async def revoke_epic(
     if result is None:
         return ServiceError.LEVELS_NOT_FOUND
 
-    creator_delta = gd_logic.calculate_creator_points(result) - old_creator_points
+    await search_index.record_level_change(ctx, result.id)
 
-    await repositories.user.update_partial(
-        ctx,
-        creator.id,
-        creator_points=creator.creator_points + creator_delta,
-    )
+    await creator_points.apply_level_change(ctx, level, result)
 
     return result
 
@@ -681,6 +899,8 @@ async def set_demon_difficulty(
     if result is None:
         return ServiceError.LEVELS_NOT_FOUND
 
+    await search_index.record_level_change(ctx, result.id)
+
     return result
 
 
@@ -702,28 +922,17 @@ async def move_user(
     if new_user is None:
         return ServiceError.USER_NOT_FOUND
 
-    creator_points = gd_logic.calculate_creator_points(level)
-
-    # The old user might have not have been deleted correctly.
-    old_creator = await repositories.user.from_id(ctx, level.user_id)
-    if old_creator is not None:
-        await repositories.user.update_partial(
-            ctx,
-            level.user_id,
-            creator_points=old_creator.creator_points - creator_points,
-        )
-
-    await repositories.user.update_partial(
+    result = await repositories.level.update_partial(
         ctx,
-        new_user_id,
-        creator_points=new_user.creator_points + creator_points,
+        level_id,
+        user_id=new_user_id,
     )
 
-    return (
-        await repositories.level.update_partial(
-            ctx,
-            level_id,
-            user_id=new_user_id,
-        )
-        or ServiceError.LEVELS_NOT_FOUND
-    )
+    if result is None:
+        return ServiceError.LEVELS_NOT_FOUND
+
+    await search_index.record_level_change(ctx, result.id)
+
+    await creator_points.apply_level_change(ctx, level, result)
+
+    return result
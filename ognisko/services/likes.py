@@ -6,6 +6,8 @@ from ognisko.constants.errors import ServiceError
 from ognisko.constants.likes import LikeType
 from ognisko.models.level import Level
 from ognisko.models.user_comment import UserComment
+from ognisko.services import level_rankings
+from ognisko.services import search_index
 
 
 async def like_user_comment(
@@ -93,4 +95,6 @@ async def like_level(
     if level is None:
         return ServiceError.LIKES_INVALID_TARGET
 
+    await level_rankings.record_like(ctx, level.id, value)
+    await search_index.record_level_change(ctx, level.id)
     return level
@@ -0,0 +1,736 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+from collections.abc import AsyncIterator
+from collections.abc import Awaitable
+from collections.abc import Callable
+from typing import Any
+from typing import NamedTuple
+
+from ognisko import repositories
+from ognisko.adapters.meilisearch import BulkLoadResult
+from ognisko.constants.levels import LevelLength
+from ognisko.constants.levels import LevelPublicity
+from ognisko.constants.levels import LevelSearchFlag
+from ognisko.constants.levels import LevelSearchType
+from ognisko.models.level import Level
+from ognisko.models.user import User
+from ognisko.resources import ColumnarLevelStore
+from ognisko.resources import Context
+from ognisko.resources import EmbeddedLevel
+from ognisko.resources import EmbeddedLevelFlag
+from ognisko.resources import EmbeddedLevelSort
+from ognisko.resources import SearchHits
+from ognisko.resources.search_change import SearchChange
+from ognisko.resources.search_change import SearchIndex
+from ognisko.utilities import metrics
+
+logger = logging.getLogger(__name__)
+
+INDEXER_BATCH_SIZE = 500
+INDEXER_BLOCK_MS = 1000
+
+INDEXER_RETRY_SECONDS = 30.0
+"""How long a change may remain unacknowledged before it is retried. This
+is also how long changes held by a stopped indexer are left before another
+indexer takes them over."""
+
+INDEXER_CLAIM_INTERVAL_SECONDS = 5.0
+"""How often indexers check for changes due to be retried, and record the
+deferred changes which are now due."""
+
+INDEXER_MAX_ATTEMPTS = 5
+"""How many times a change is attempted before it is dead-lettered."""
+
+DOWNLOAD_INDEX_DELAY_SECONDS = 60 * 5
+"""How long after the first of them downloads of a level are indexed, all at
+once. The indexed download counts lag by up to this long."""
+
+LEVEL_STORE_LOAD_BATCH_SIZE = 1000
+LEVEL_STORE_LOAD_RETRY_SECONDS = 30.0
+
+EMBEDDED_REFRESH_SECONDS = 1.0
+
+TRENDING_SECONDS = 60 * 60 * 24 * 7
+"""How recently levels on the trending tab must have been uploaded."""
+
+
+async def record_level_change(ctx: Context, level_id: int) -> None:
+    # Recorded once committed, so indexers never look up the previous state.
+    await ctx.after_commit(
+        functools.partial(ctx.search_changes.record, SearchIndex.LEVELS, level_id),
+    )
+
+
+async def record_level_download(ctx: Context, level_id: int) -> None:
+    await ctx.search_changes.defer(
+        SearchIndex.LEVELS,
+        level_id,
+        delay_seconds=DOWNLOAD_INDEX_DELAY_SECONDS,
+    )
+
+
+async def record_user_change(ctx: Context, user_id: int) -> None:
+    await ctx.after_commit(
+        functools.partial(ctx.search_changes.record, SearchIndex.USERS, user_id),
+    )
+
+
+async def apply_changes(
+    ctx: Context,
+    changes: list[SearchChange],
+) -> list[SearchChange]:
+    """Brings the search documents of the changed resources up to date.
+    Multiple changes to the same resource are applied once.
+
+    Returns the changes to resources which could not be found. These are not
+    removed from the index, as the resources may not have been committed
+    yet."""
+    level_ids = {
+        change.resource_id for change in changes if change.index == SearchIndex.LEVELS
+    }
+    user_ids = {
+        change.resource_id for change in changes if change.index == SearchIndex.USERS
+    }
+
+    missing_level_ids: set[int] = set()
+    if level_ids:
+        missing_level_ids = await _apply_level_changes(ctx, level_ids)
+        await ctx.level_search_cache.invalidate_outdated()
+
+    missing_user_ids: set[int] = set()
+    if user_ids:
+        missing_user_ids = await _apply_user_changes(ctx, user_ids)
+
+    metrics.registry.counter("search_index_changes").increment(len(changes))
+    metrics.registry.counter("search_index_documents").increment(
+        len(level_ids - missing_level_ids) + len(user_ids - missing_user_ids),
+    )
+
+    missing_ids = {
+        SearchIndex.LEVELS: missing_level_ids,
+        SearchIndex.USERS: missing_user_ids,
+    }
+    return [
+        change for change in changes if change.resource_id in missing_ids[change.index]
+    ]
+
+
+async def _apply_level_changes(ctx: Context, level_ids: set[int]) -> set[int]:
+    """Returns the IDs of the levels which could not be found."""
+    levels = [
+        level
+        for level in await repositories.level.multiple_from_id(
+            ctx,
+            list(level_ids),
+            include_deleted=True,
+        )
+        if level is not None
+    ]
+
+    updated = [level for level in levels if not level.deleted]
+    removed = [level.id for level in levels if level.deleted]
+
+    await ctx.search_indexes.upsert(
+        SearchIndex.LEVELS,
+        [_level_document(level) for level in updated],
+    )
+    await ctx.search_indexes.delete(SearchIndex.LEVELS, removed)
+    return level_ids - {level.id for level in levels}
+
+
+async def _apply_user_changes(ctx: Context, user_ids: set[int]) -> set[int]:
+    """Returns the IDs of the users which could not be found."""
+    users = await repositories.user.multiple_from_id(ctx, list(user_ids))
+
+    await ctx.search_indexes.upsert(
+        SearchIndex.USERS,
+        [_user_document(user) for user in users],
+    )
+    return user_ids - {user.id for user in users}
+
+
+async def run_indexer(ctx: Context, consumer: str) -> None:
+    """Applies changes from the search change feed as they are recorded,
+    resuming with the changes left unacknowledged by a previous run.
+
+    Changes which fail to apply remain pending and are retried, by any
+    indexer, after `INDEXER_RETRY_SECONDS`, so they never hold up newer
+    changes. Changes held by indexers which have stopped are taken over the
+    same way. Deferred changes are recorded to the feed as they become due."""
+    await ctx.search_changes.ensure_group()
+
+    changes = await ctx.search_changes.read(
+        consumer,
+        count=INDEXER_BATCH_SIZE,
+        block_ms=INDEXER_BLOCK_MS,
+        pending=True,
+    )
+    next_claim = 0.0
+
+    while True:
+        if changes:
+            await _apply_pending_changes(ctx, changes)
+
+        if time.monotonic() >= next_claim:
+            next_claim = time.monotonic() + INDEXER_CLAIM_INTERVAL_SECONDS
+            recorded = INDEXER_BATCH_SIZE
+            while recorded == INDEXER_BATCH_SIZE:
+                recorded = await ctx.search_changes.record_due(INDEXER_BATCH_SIZE)
+
+            changes = await ctx.search_changes.claim_abandoned(
+                consumer,
+                count=INDEXER_BATCH_SIZE,
+                min_idle_ms=int(INDEXER_RETRY_SECONDS * 1000),
+            )
+            if changes:
+                continue
+
+        changes = await ctx.search_changes.read(
+            consumer,
+            count=INDEXER_BATCH_SIZE,
+            block_ms=INDEXER_BLOCK_MS,
+        )
+
+
+async def _apply_pending_changes(ctx: Context, changes: list[SearchChange]) -> None:
+    """Applies and acknowledges the changes. If the batch fails, each
+    resource is applied on its own so one failing resource does not hold
+    back the rest. Failed changes, and those to resources which could not be
+    found, are left pending to be retried, or dead-lettered once attempted
+    `INDEXER_MAX_ATTEMPTS` times."""
+    try:
+        failed = await apply_changes(ctx, changes)
+    except Exception:
+        logger.exception(
+            "Failed to apply search index changes.",
+            extra={
+                "changes": len(changes),
+            },
+        )
+        failed = await _apply_changes_individually(ctx, changes)
+    else:
+        await ctx.search_changes.acknowledge(
+            [change for change in changes if change not in failed],
+        )
+
+    if not failed:
+        return
+
+    metrics.registry.counter("search_index_failures").increment(len(failed))
+
+    delivery_counts = await ctx.search_changes.delivery_counts(failed)
+    exhausted = [
+        change
+        for change, delivery_count in zip(failed, delivery_counts)
+        if delivery_count >= INDEXER_MAX_ATTEMPTS
+    ]
+    if exhausted:
+        await ctx.search_changes.dead_letter(exhausted)
+        metrics.registry.counter("search_index_dead_lettered").increment(
+            len(exhausted),
+        )
+        logger.error(
+            "Dead-lettered search index changes which repeatedly failed.",
+            extra={
+                "resources": sorted(
+                    {
+                        f"{change.index.value}:{change.resource_id}"
+                        for change in exhausted
+                    },
+                ),
+            },
+        )
+
+
+async def _apply_changes_individually(
+    ctx: Context,
+    changes: list[SearchChange],
+) -> list[SearchChange]:
+    """Applies and acknowledges the changes of each resource separately,
+    returning the changes which were not applied."""
+    changes_by_resource: dict[tuple[SearchIndex, int], list[SearchChange]] = {}
+    for change in changes:
+        changes_by_resource.setdefault((change.index, change.resource_id), []).append(
+            change,
+        )
+
+    failed = []
+    for resource_changes in changes_by_resource.values():
+        try:
+            missing = await apply_changes(ctx, resource_changes)
+        except Exception:
+            failed.extend(resource_changes)
+            continue
+
+        if missing:
+            failed.extend(missing)
+        else:
+            await ctx.search_changes.acknowledge(resource_changes)
+
+    return failed
+
+
+async def rebuild(ctx: Context, index: SearchIndex) -> BulkLoadResult:
+    """Rebuilds the search index from the database without affecting the
+    live index, swapping the two once the new one is complete."""
+    generation = await ctx.search_indexes.create_generation(index)
+    logger.info(
+        "Started rebuilding a search index.",
+        extra={
+            "index": index.value,
+            "generation": generation,
+        },
+    )
+
+    try:
+        result = await ctx.search_indexes.loader(generation).load(
+            _INDEX_DOCUMENTS[index](ctx),
+        )
+
+        # Documents streamed before being updated may be outdated.
+        changed_ids = await ctx.search_indexes.changed_during_build(index)
+        if changed_ids:
+            await _INDEX_APPLIERS[index](ctx, changed_ids)
+    except BaseException:
+        await ctx.search_indexes.abandon(index, generation)
+        raise
+
+    await ctx.search_indexes.promote(index, generation)
+    logger.info(
+        "Swapped in a rebuilt search index.",
+        extra={
+            "index": index.value,
+            "generation": generation,
+            "documents": result.documents,
+        },
+    )
+    return result
+
+
+async def rollback(ctx: Context, index: SearchIndex) -> bool:
+    """Restores the search index as it was before the last rebuild. Returns
+    whether there was a previous index to restore."""
+    return await ctx.search_indexes.rollback(index)
+
+
+def _level_document(level: Level) -> dict[str, Any]:
+    return repositories.level.make_meili_dict(level.as_dict(include_id=True))
+
+
+def _user_document(user: User) -> dict[str, Any]:
+    return repositories.user.make_meili_dict(user.as_dict(include_id=True))
+
+
+async def _level_documents(ctx: Context) -> AsyncIterator[dict[str, Any]]:
+    async for level in repositories.level.all(ctx):
+        yield _level_document(level)
+
+
+async def _user_documents(ctx: Context) -> AsyncIterator[dict[str, Any]]:
+    async for user in repositories.user.all(ctx):
+        yield _user_document(user)
+
+
+_INDEX_DOCUMENTS = {
+    SearchIndex.LEVELS: _level_documents,
+    SearchIndex.USERS: _user_documents,
+}
+
+_INDEX_APPLIERS = {
+    SearchIndex.LEVELS: _apply_level_changes,
+    SearchIndex.USERS: _apply_user_changes,
+}
+
+
+async def load_embedded_levels(ctx: Context) -> None:
+    """Loads all publicly listed levels into the in-process level index."""
+    index = ctx.embedded_level_search
+    assert index is not None, "The embedded level search is not enabled."
+
+    await load_level_store(ctx, index, _embedded_level)
+
+
+async def run_embedded_refresher(ctx: Context) -> None:
+    """Keeps the in-process level index up to date with the levels changed
+    in the search change feed."""
+    index = ctx.embedded_level_search
+    assert index is not None, "The embedded level search is not enabled."
+
+    await run_level_store_refresher(
+        ctx,
+        index,
+        _embedded_level,
+        interval=EMBEDDED_REFRESH_SECONDS,
+    )
+
+
+async def load_level_store(
+    ctx: Context,
+    store: ColumnarLevelStore[Any],
+    convert: Callable[[Level], Any],
+    *,
+    on_refresh: Callable[[], Awaitable[None]] | None = None,
+) -> None:
+    """Loads every level `convert` returns a value for into the store,
+    retrying until they have all been loaded. `on_refresh` is awaited first,
+    for any state kept alongside the levels."""
+    while True:
+        try:
+            await _load_level_store(ctx, store, convert, on_refresh)
+            return
+        except Exception:
+            logger.exception(
+                "Failed to load levels into an in-process store.",
+                extra={
+                    "store": type(store).__name__,
+                },
+            )
+            await asyncio.sleep(LEVEL_STORE_LOAD_RETRY_SECONDS)
+
+
+async def _load_level_store(
+    ctx: Context,
+    store: ColumnarLevelStore[Any],
+    convert: Callable[[Level], Any],
+    on_refresh: Callable[[], Awaitable[None]] | None,
+) -> None:
+    start = time.perf_counter()
+    if on_refresh is not None:
+        await on_refresh()
+
+    batch = []
+    async for level in repositories.level.all(ctx):
+        item = convert(level)
+        if item is not None:
+            batch.append(item)
+
+        if len(batch) >= LEVEL_STORE_LOAD_BATCH_SIZE:
+            store.upsert(batch)
+            batch = []
+
+    store.upsert(batch)
+    store.ready = True
+
+    logger.info(
+        "Loaded levels into an in-process store.",
+        extra={
+            "store": type(store).__name__,
+            "levels": len(store),
+            "seconds": time.perf_counter() - start,
+        },
+    )
+
+
+async def run_level_store_refresher(
+    ctx: Context,
+    store: ColumnarLevelStore[Any],
+    convert: Callable[[Level], Any],
+    *,
+    interval: float,
+    on_refresh: Callable[[], Awaitable[None]] | None = None,
+) -> None:
+    """Keeps the store up to date with the levels changed in the search
+    change feed, refreshing them every `interval` seconds. `on_refresh` is
+    awaited on every refresh, for any state kept alongside the levels."""
+    while True:
+        await asyncio.sleep(interval)
+
+        level_ids = store.take_changed(time.time())
+        try:
+            if on_refresh is not None:
+                await on_refresh()
+            if level_ids:
+                await _refresh_level_store(ctx, store, convert, level_ids)
+        except Exception:
+            logger.exception(
+                "Failed to refresh an in-process level store.",
+                extra={
+                    "store": type(store).__name__,
+                    "levels": len(level_ids),
+                },
+            )
+            for level_id in level_ids:
+                store.mark_changed(level_id)
+
+
+async def _refresh_level_store(
+    ctx: Context,
+    store: ColumnarLevelStore[Any],
+    convert: Callable[[Level], Any],
+    level_ids: list[int],
+) -> None:
+    levels = await repositories.level.multiple_from_id(
+        ctx,
+        level_ids,
+        include_deleted=True,
+    )
+
+    kept_ids = set()
+    items = []
+    for level in levels:
+        item = convert(level)
+        if item is not None:
+            kept_ids.add(level.id)
+            items.append(item)
+
+    store.upsert(items)
+    store.remove(set(level_ids) - kept_ids)
+
+
+class LevelSearchQuery(NamedTuple):
+    """A level search, as sent to MeiliSearch."""
+
+    query: str
+    filter: str
+    sort: list[str] | None
+
+
+async def search_levels(
+    ctx: Context,
+    page: int,
+    page_size: int,
+    **filters: Any,
+) -> SearchHits | None:
+    """Searches the live MeiliSearch level index for the IDs of the matching
+    levels, taking the same filters as the embedded level search. Returns
+    `None` for unsupported search types."""
+    search = level_search_query(**filters)
+    if search is None:
+        return None
+
+    return await ctx.search_indexes.search(
+        SearchIndex.LEVELS,
+        search.query,
+        page=page,
+        page_size=page_size,
+        filter=search.filter,
+        sort=search.sort,
+    )
+
+
+def level_search_query(
+    query: str | None = None,
+    search_type: LevelSearchType | None = None,
+    level_lengths: list[LevelLength] | None = None,
+    completed_levels: list[int] | None = None,
+    featured: bool = False,
+    original: bool = False,
+    two_player: bool = False,
+    unrated: bool = False,
+    rated: bool = False,
+    song_id: int | None = None,
+    custom_song_id: int | None = None,
+    followed_list: list[int] | None = None,
+    now: float | None = None,
+) -> LevelSearchQuery | None:
+    """Builds the MeiliSearch search for the level search's filters. Returns
+    `None` for unsupported search types, or searches matching no levels.
+    Every attribute filtered on must be filterable in `INDEX_SETTINGS`."""
+    if now is None:
+        now = time.time()
+
+    filters = [
+        f"publicity = {LevelPublicity.PUBLIC.value}",
+        "deleted = false",
+    ]
+    sort = None
+    text_query = ""
+
+    match search_type:
+        case LevelSearchType.SEARCH_QUERY | None:
+            text_query = query or ""
+            if not text_query:
+                sort = ["likes:desc"]
+        case LevelSearchType.MOST_DOWNLOADED:
+            sort = ["downloads:desc"]
+        case LevelSearchType.MOST_LIKED:
+            sort = ["likes:desc"]
+        case LevelSearchType.TRENDING:
+            sort = ["likes:desc"]
+            filters.append(f"upload_ts >= {now - TRENDING_SECONDS}")
+        case LevelSearchType.RECENT:
+            sort = ["upload_ts:desc"]
+        case LevelSearchType.USER_LEVELS:
+            if not query or not query.isnumeric():
+                return None
+
+            sort = ["upload_ts:desc"]
+            filters.append(f"user_id = {int(query)}")
+        case LevelSearchType.FEATURED:
+            sort = ["feature_order:desc"]
+            featured = True
+        case LevelSearchType.MAGIC:
+            sort = ["upload_ts:desc"]
+            filters.append("magic = true")
+        case LevelSearchType.AWARDED:
+            sort = ["upload_ts:desc"]
+            filters.append("awarded = true")
+        case LevelSearchType.FOLLOWED:
+            if not followed_list:
+                return None
+
+            sort = ["upload_ts:desc"]
+            filters.append(f"user_id IN {followed_list}")
+        case _:
+            return None
+
+    if level_lengths:
+        filters.append(f"length IN {[length.value for length in level_lengths]}")
+    if completed_levels:
+        filters.append(f"id NOT IN {completed_levels}")
+    if featured:
+        filters.append("feature_order > 0")
+    if original:
+        filters.append("original_id IS NULL")
+    if two_player:
+        filters.append("two_player = true")
+    if unrated:
+        filters.append("stars = 0")
+    if rated:
+        filters.append("stars > 0")
+    if song_id is not None:
+        filters.append(f"official_song_id = {song_id}")
+    if custom_song_id is not None:
+        filters.append(f"custom_song_id = {custom_song_id}")
+
+    return LevelSearchQuery(
+        query=text_query,
+        filter=" AND ".join(filters),
+        sort=sort,
+    )
+
+
+def search_levels_embedded(
+    ctx: Context,
+    page: int,
+    page_size: int,
+    **filters: Any,
+) -> SearchHits | None:
+    """Searches the in-process level index, taking the same filters as the
+    MeiliSearch backed level search. Returns `None` for unsupported search
+    types."""
+    index = ctx.embedded_level_search
+    assert index is not None, "The embedded level search is not enabled."
+
+    arguments = embedded_search_arguments(**filters)
+    if arguments is None:
+        return None
+
+    return index.search(page=page, page_size=page_size, **arguments)
+
+
+def embedded_search_arguments(
+    query: str | None = None,
+    search_type: LevelSearchType | None = None,
+    level_lengths: list[LevelLength] | None = None,
+    completed_levels: list[int] | None = None,
+    featured: bool = False,
+    original: bool = False,
+    two_player: bool = False,
+    unrated: bool = False,
+    rated: bool = False,
+    song_id: int | None = None,
+    custom_song_id: int | None = None,
+    followed_list: list[int] | None = None,
+    now: float | None = None,
+) -> dict[str, Any] | None:
+    """Builds the arguments of `EmbeddedLevelIndex.search` for the level
+    search's filters. Returns `None` for unsupported search types."""
+    if now is None:
+        now = time.time()
+
+    flags = 0
+    if original:
+        flags |= EmbeddedLevelFlag.ORIGINAL
+    if two_player:
+        flags |= EmbeddedLevelFlag.TWO_PLAYER
+
+    user_ids = None
+    uploaded_after = None
+    text_query = None
+
+    match search_type:
+        case LevelSearchType.SEARCH_QUERY | None:
+            sort = EmbeddedLevelSort.LIKES
+            text_query = query
+        case LevelSearchType.MOST_DOWNLOADED:
+            sort = EmbeddedLevelSort.DOWNLOADS
+        case LevelSearchType.MOST_LIKED:
+            sort = EmbeddedLevelSort.LIKES
+        case LevelSearchType.TRENDING:
+            sort = EmbeddedLevelSort.LIKES
+            uploaded_after = now - TRENDING_SECONDS
+        case LevelSearchType.RECENT:
+            sort = EmbeddedLevelSort.RECENT
+        case LevelSearchType.USER_LEVELS:
+            if not query or not query.isnumeric():
+                return None
+
+            sort = EmbeddedLevelSort.RECENT
+            user_ids = [int(query)]
+        case LevelSearchType.FEATURED:
+            sort = EmbeddedLevelSort.FEATURED
+            featured = True
+        case LevelSearchType.MAGIC:
+            sort = EmbeddedLevelSort.RECENT
+            flags |= EmbeddedLevelFlag.MAGIC
+        case LevelSearchType.AWARDED:
+            sort = EmbeddedLevelSort.RECENT
+            flags |= EmbeddedLevelFlag.AWARDED
+        case LevelSearchType.FOLLOWED:
+            sort = EmbeddedLevelSort.RECENT
+            user_ids = followed_list or []
+        case _:
+            return None
+
+    return {
+        "sort": sort,
+        "query": text_query,
+        "user_ids": user_ids,
+        "lengths": (
+            [length.value for length in level_lengths] if level_lengths else None
+        ),
+        "exclude_ids": completed_levels,
+        "flags": flags,
+        "featured": featured,
+        "rated": True if rated else False if unrated else None,
+        "official_song_id": song_id,
+        "custom_song_id": custom_song_id,
+        "uploaded_after": uploaded_after,
+    }
+
+
+def _embedded_level(level: Level) -> EmbeddedLevel | None:
+    if level.deleted or level.publicity != LevelPublicity.PUBLIC:
+        return None
+
+    flags = 0
+    if level.search_flags & LevelSearchFlag.EPIC:
+        flags |= EmbeddedLevelFlag.EPIC
+    if level.search_flags & LevelSearchFlag.MAGIC:
+        flags |= EmbeddedLevelFlag.MAGIC
+    if level.search_flags & LevelSearchFlag.AWARDED:
+        flags |= EmbeddedLevelFlag.AWARDED
+    if level.two_player:
+        flags |= EmbeddedLevelFlag.TWO_PLAYER
+    if level.original_id is None:
+        flags |= EmbeddedLevelFlag.ORIGINAL
+
+    return EmbeddedLevel(
+        id=level.id,
+        name=level.name,
+        user_id=level.user_id,
+        stars=level.stars,
+        length=level.length.value,
+        likes=level.likes,
+        downloads=level.downloads,
+        feature_order=level.feature_order,
+        upload_ts=level.upload_ts.timestamp(),
+        official_song_id=level.official_song_id,
+        custom_song_id=level.custom_song_id or 0,
+        flags=flags,
+    )
@@ -118,6 +118,10 @@ async def authenticate_from_gjp2(
     if not user.privileges & UserPrivileges.USER_AUTHENTICATE:
         return ServiceError.AUTH_NO_PRIVILEGE
 
+    # Active users skip the credential lookup and comparison.
+    if await ctx.user_sessions.validate(user_id, gjp2):
+        return user
+
     creds = await repositories.user_credential.from_user_id(ctx, user_id)
 
     if creds is None:
@@ -132,6 +136,7 @@ async def authenticate_from_gjp2(
         if pw_cache != gjp2:
             return ServiceError.AUTH_PASSWORD_MISMATCH
 
+        await _start_session(ctx, user_id, gjp2)
         return user
 
     if not await hashes.compare_bcrypt(
@@ -141,10 +146,18 @@ async def authenticate_from_gjp2(
         return ServiceError.AUTH_PASSWORD_MISMATCH
 
     await ctx.password_cache.set(creds.value, gjp2)
+    await _start_session(ctx, user_id, gjp2)
 
     return user
 
 
+async def _start_session(ctx: Context, user_id: int, gjp2: str) -> None:
+    # Presence is recorded once per session rather than on every request, as
+    # sessions last no longer than the online window.
+    await ctx.user_sessions.create(user_id, gjp2)
+    await ctx.presence.record(user_id)
+
+
 async def authenticate_from_gjp2_name(
     ctx: Context,
     username: str,
@@ -173,6 +186,7 @@ async def update_password(
         return ServiceError.USER_NOT_FOUND
 
     await repositories.user_credential.delete_from_user_id(ctx, user_id)
+    await ctx.user_sessions.delete(user_id)
 
     gjp2_pw = hashes.hash_gjp2(password)
     bcrypt_hashed = await hashes.hash_bcrypt_async(gjp2_pw)
@@ -15,6 +15,8 @@ from ognisko.models.friend_request import FriendRequest
 from ognisko.models.rgb import RGB
 from ognisko.models.user import User
 from ognisko.models.user_credential import CredentialVersion
+from ognisko.resources.search_change import SearchIndex
+from ognisko.services import search_index
 
 
 async def register(
@@ -45,6 +47,7 @@ async def register(
         hashed_password,
     )
 
+    await search_index.record_user_change(ctx, user.id)
     return user
 
 
@@ -203,9 +206,13 @@ async def update_stats(
     if updated_user is None:
         return ServiceError.USER_NOT_FOUND
 
+    await search_index.record_user_change(ctx, updated_user.id)
+
     if update_rank:
         await repositories.leaderboard.set_star_count(ctx, user.id, updated_user.stars)
 
+    await ctx.profile_snapshots.delete(user.id)
+
     return updated_user
 
 
@@ -238,6 +245,10 @@ async def update_user_settings(
     if updated_user is None:
         return ServiceError.USER_NOT_FOUND
 
+    await search_index.record_user_change(ctx, updated_user.id)
+
+    await ctx.profile_snapshots.delete(user_id)
+
     return updated_user
 
 
@@ -281,6 +292,10 @@ async def update_privileges(
     if updated_user is None:
         return ServiceError.USER_NOT_FOUND
 
+    await search_index.record_user_change(ctx, updated_user.id)
+
+    await ctx.profile_snapshots.delete(user_id)
+
     return updated_user
 
 
@@ -305,6 +320,8 @@ async def update_comment_colour(
     if updated_user is None:
         return ServiceError.USER_NOT_FOUND
 
+    await search_index.record_user_change(ctx, updated_user.id)
+
     return updated_user
 
 
@@ -326,24 +343,36 @@ async def request_status(
 
 
 async def synchronise_search(ctx: Context) -> bool | ServiceError:
-    async for user in repositories.user.all(ctx):
-        await repositories.user.create_meili(ctx, user)
+    await search_index.rebuild(ctx, SearchIndex.USERS)
 
     return True
 
 
-# Is the return type right?
+class UserSearchResponse(NamedTuple):
+    results: list[User]
+    total: int
+
+
 async def search(
     ctx: Context,
     page: int,
     page_size: int,
     query: str,
-) -> repositories.user.UserSearchResults | ServiceError:
-    return await repositories.user.search(
-        ctx,
-        page,
-        page_size,
+) -> UserSearchResponse | ServiceError:
+    hits = await ctx.search_indexes.search(
+        SearchIndex.USERS,
         query,
+        page=page,
+        page_size=page_size,
+    )
+
+    users = await repositories.user.multiple_from_id(ctx, hits.ids)
+    ranking = {user_id: position for position, user_id in enumerate(hits.ids)}
+    users.sort(key=lambda user: ranking[user.id])
+
+    return UserSearchResponse(
+        results=users,
+        total=hits.total,
     )
 
 
@@ -375,10 +404,14 @@ async def restrict(
     if updated_user is None:
         return ServiceError.USER_NOT_FOUND
 
+    await search_index.record_user_change(ctx, updated_user.id)
+
     # Delete their ranks
     await repositories.leaderboard.remove_star_count(ctx, user_id)
     await repositories.leaderboard.remove_creator_count(ctx, user_id)
 
+    await ctx.profile_snapshots.delete(user_id)
+
     return updated_user
 
 
@@ -401,8 +434,12 @@ async def unrestrict(
     if updated_user is None:
         return ServiceError.USER_NOT_FOUND
 
+    await search_index.record_user_change(ctx, updated_user.id)
+
     # Re-add their ranks
     await repositories.leaderboard.set_star_count(ctx, user_id, user.stars)
     await repositories.leaderboard.set_creator_count(ctx, user_id, user.creator_points)
 
+    await ctx.profile_snapshots.delete(user_id)
+
     return updated_user
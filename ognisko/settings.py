@@ -15,6 +15,12 @@ def read_boolean(value: str) -> bool:
     return value.lower() in ("true", "1", "yes")
 
 
+def read_rate_limit(value: str) -> tuple[int, int]:
+    """Reads a rate limit in the `{requests}/{seconds}` format."""
+    times, seconds = value.split("/")
+    return int(times), int(seconds)
+
+
 OGNISKO_HTTP_PORT = int(os.environ["OGNISKO_HTTP_PORT"])
 OGNISKO_HTTP_HOST = os.environ["OGNISKO_HTTP_HOST"]
 OGNISKO_HTTP_URL_PREFIX = os.environ["OGNISKO_HTTP_URL_PREFIX"]
@@ -24,6 +30,64 @@ OGNISKO_OFFICIAL_SERVER_MIRROR_URL = os.environ["OGNISKO_OFFICIAL_SERVER_MIRROR_
 OGNISKO_LOG_LEVEL = os.environ["OGNISKO_LOG_LEVEL"]
 OGNISKO_INTERNAL_DATA_DIRECTORY = os.environ["OGNISKO_INTERNAL_DATA_DIRECTORY"]
 OGNISKO_USE_USER_AGENT_GUARD = read_boolean(os.environ["OGNISKO_USE_USER_AGENT_GUARD"])
+OGNISKO_METRICS_ENABLED = read_boolean(
+    os.environ.get("OGNISKO_METRICS_ENABLED", "false"),
+)
+
+# The number of hashed directory levels local storage keys are fanned out into.
+# Setting this to 0 keeps the flat (`levels/{id}`) layout.
+OGNISKO_STORAGE_SHARD_DEPTH = int(os.environ.get("OGNISKO_STORAGE_SHARD_DEPTH", "0"))
+OGNISKO_STORAGE_SHARD_WIDTH = int(os.environ.get("OGNISKO_STORAGE_SHARD_WIDTH", "2"))
+
+# The in-memory level data cache is bounded by bytes, per worker.
+OGNISKO_LEVEL_DATA_CACHE_SIZE = int(
+    os.environ.get("OGNISKO_LEVEL_DATA_CACHE_SIZE", str(128 * 1024 * 1024)),
+)
+OGNISKO_LEVEL_DATA_CACHE_MINIMUM_HITS = int(
+    os.environ.get("OGNISKO_LEVEL_DATA_CACHE_MINIMUM_HITS", "2"),
+)
+
+# Each worker leases this fraction of a rate limit from Redis at a time.
+OGNISKO_RATELIMIT_LEASE_FRACTION = float(
+    os.environ.get("OGNISKO_RATELIMIT_LEASE_FRACTION", "0.1"),
+)
+OGNISKO_RATELIMIT_REGISTER = read_rate_limit(
+    os.environ.get("OGNISKO_RATELIMIT_REGISTER", "10/600"),
+)
+OGNISKO_RATELIMIT_FRIEND_REQUEST = read_rate_limit(
+    os.environ.get("OGNISKO_RATELIMIT_FRIEND_REQUEST", "1/30"),
+)
+OGNISKO_RATELIMIT_BLOCK = read_rate_limit(
+    os.environ.get("OGNISKO_RATELIMIT_BLOCK", "1/30"),
+)
+OGNISKO_RATELIMIT_USER_COMMENT = read_rate_limit(
+    os.environ.get("OGNISKO_RATELIMIT_USER_COMMENT", "4/60"),
+)
+OGNISKO_RATELIMIT_SAVE_DATA_BACKUP = read_rate_limit(
+    os.environ.get("OGNISKO_RATELIMIT_SAVE_DATA_BACKUP", "1/300"),
+)
+OGNISKO_RATELIMIT_LEVEL_UPLOAD = read_rate_limit(
+    os.environ.get("OGNISKO_RATELIMIT_LEVEL_UPLOAD", "3/600"),
+)
+OGNISKO_RATELIMIT_LEVEL_DOWNLOAD = read_rate_limit(
+    os.environ.get("OGNISKO_RATELIMIT_LEVEL_DOWNLOAD", "100/600"),
+)
+OGNISKO_RATELIMIT_LIKE = read_rate_limit(
+    os.environ.get("OGNISKO_RATELIMIT_LIKE", "50/600"),
+)
+OGNISKO_RATELIMIT_LEVEL_COMMENT = read_rate_limit(
+    os.environ.get("OGNISKO_RATELIMIT_LEVEL_COMMENT", "15/60"),
+)
+OGNISKO_RATELIMIT_MESSAGE = read_rate_limit(
+    os.environ.get("OGNISKO_RATELIMIT_MESSAGE", "5/300"),
+)
+
+# The background job worker component (`APP_COMPONENT=worker`).
+OGNISKO_WORKER_CONCURRENCY = int(os.environ.get("OGNISKO_WORKER_CONCURRENCY", "4"))
+OGNISKO_WORKER_MAX_ATTEMPTS = int(os.environ.get("OGNISKO_WORKER_MAX_ATTEMPTS", "3"))
+OGNISKO_LEVEL_RANKINGS_INTERVAL = int(
+    os.environ.get("OGNISKO_LEVEL_RANKINGS_INTERVAL", "600"),
+)
 
 MYSQL_HOST = os.environ["MYSQL_HOST"]  # Non-standard
 MYSQL_USER = os.environ["MYSQL_USER"]
@@ -34,10 +98,46 @@ MYSQL_TCP_PORT = int(os.environ["MYSQL_TCP_PORT"])
 REDIS_HOST = os.environ["REDIS_HOST"]  # Non-standard
 REDIS_PORT = int(os.environ["REDIS_PORT"])  # Non-standard
 REDIS_DATABASE = int(os.environ["REDIS_DB"])  # Non-standard
+# A maximum of 0 connections leaves the pool unbounded. Otherwise, callers
+# wait up to `REDIS_POOL_TIMEOUT` seconds for a free connection.
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", "64")) or None
+REDIS_BULK_MAX_CONNECTIONS = (
+    int(os.environ.get("REDIS_BULK_MAX_CONNECTIONS", "16")) or None
+)
+REDIS_POOL_TIMEOUT = float(os.environ.get("REDIS_POOL_TIMEOUT", "5"))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", "5")) or None
+REDIS_SOCKET_CONNECT_TIMEOUT = (
+    float(os.environ.get("REDIS_SOCKET_CONNECT_TIMEOUT", "5")) or None
+)
+REDIS_SOCKET_KEEPALIVE = read_boolean(
+    os.environ.get("REDIS_SOCKET_KEEPALIVE", "true"),
+)
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+REDIS_PUBSUB_WORKERS = int(os.environ.get("REDIS_PUBSUB_WORKERS", "8"))
+REDIS_PUBSUB_QUEUE_SIZE = int(os.environ.get("REDIS_PUBSUB_QUEUE_SIZE", "256"))
 
 MEILI_HOST = os.environ["MEILI_HOST"]  # Non-standard
 MEILI_PORT = int(os.environ["MEILI_PORT"])  # Non-standard
 MEILI_MASTER_KEY = os.environ["MEILI_MASTER_KEY"]
+MEILI_BULK_BATCH_SIZE = int(os.environ.get("MEILI_BULK_BATCH_SIZE", "8388608"))
+MEILI_BULK_CONCURRENCY = int(os.environ.get("MEILI_BULK_CONCURRENCY", "4"))
+MEILI_BULK_MAX_ENQUEUED_TASKS = int(
+    os.environ.get("MEILI_BULK_MAX_ENQUEUED_TASKS", "8"),
+)
+
+# Whether levels are also searched in-process: `disabled`, `fallback` (when
+# MeiliSearch is unavailable) or `primary` (MeiliSearch is not searched).
+OGNISKO_EMBEDDED_LEVEL_SEARCH = os.environ.get(
+    "OGNISKO_EMBEDDED_LEVEL_SEARCH",
+    "disabled",
+).lower()
+
+# Whether daily and weekly levels are nominated from an in-process snapshot of
+# the rated levels, rather than from the well received level ranking. Every API
+# process keeps its own snapshot, so this is best left to larger deployments.
+OGNISKO_LEVEL_NOMINATION_SNAPSHOT = read_boolean(
+    os.environ.get("OGNISKO_LEVEL_NOMINATION_SNAPSHOT", "false"),
+)
 
 # These will be temp disabled.
 S3_ENABLED = False
@@ -47,3 +147,8 @@ S3_ENABLED = False
 # S3_ENDPOINT = os.environ["S3_ENDPOINT"]
 # S3_ACCESS_KEY = os.environ["S3_ACCESS_KEY"]
 # S3_SECRET_KEY = os.environ["S3_SECRET_KEY"]
+# S3_SPOOL_DIRECTORY = os.environ["S3_SPOOL_DIRECTORY"]
+# S3_UPLOAD_WORKERS = int(os.environ["S3_UPLOAD_WORKERS"])
+# S3_MAX_POOL_CONNECTIONS = int(os.environ["S3_MAX_POOL_CONNECTIONS"])
+# S3_MULTIPART_THRESHOLD = int(os.environ["S3_MULTIPART_THRESHOLD"])
+# S3_MULTIPART_CONCURRENCY = int(os.environ["S3_MULTIPART_CONCURRENCY"])
@@ -5,6 +5,7 @@ from . import colour
 from . import cryptography
 from . import enum
 from . import loop
+from . import metrics
 from . import statistics
 from . import time
 from . import typing
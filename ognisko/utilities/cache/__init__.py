@@ -5,4 +5,5 @@ from .base import AbstractCache
 from .memory import LRUAsyncMemoryCache
 from .memory import LRUMemoryCache
 from .memory import SimpleMemoryCache
+from .memory import SizedLRUMemoryCache
 from .redis import SimpleRedisCache
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from array import array
+from collections.abc import Callable
 from copy import copy
 
 from .base import AbstractAsyncCache
@@ -11,6 +13,7 @@ __all__ = (
     "LRUMemoryCache",
     "SimpleAsyncMemoryCache",
     "LRUAsyncMemoryCache",
+    "SizedLRUMemoryCache",
 )
 
 
@@ -126,3 +129,144 @@ class LRUAsyncMemoryCache[T](AbstractAsyncCache[T]):
             del self._cache[_ensure_key_type(key)]
         except KeyError:
             pass
+
+
+class _FrequencySketch:
+    """A count-min sketch estimating how often keys are accessed, used for
+    TinyLFU style cache admission. All counters are halved once enough
+    accesses have been recorded, so past popularity decays over time."""
+
+    __slots__ = ("_rows", "_width", "_additions", "_reset_threshold")
+
+    _DEPTH = 4
+
+    def __init__(self, width: int) -> None:
+        self._width = max(width, 16)
+        self._rows = [array("L", bytes(self._width * 8)) for _ in range(self._DEPTH)]
+        self._additions = 0
+        self._reset_threshold = self._width * 10
+
+    def __indexes(self, key: str) -> list[int]:
+        return [hash((seed, key)) % self._width for seed in range(self._DEPTH)]
+
+    def increment(self, key: str) -> None:
+        for row, index in zip(self._rows, self.__indexes(key)):
+            row[index] += 1
+
+        self._additions += 1
+        if self._additions >= self._reset_threshold:
+            self.__age()
+
+    def estimate(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self._rows, self.__indexes(key)))
+
+    def __age(self) -> None:
+        for row in self._rows:
+            for index, value in enumerate(row):
+                row[index] = value >> 1
+
+        self._additions //= 2
+
+
+class SizedLRUMemoryCache[T](AbstractCache[T]):
+    """An LRU cache bounded by the total size of its values (as measured by
+    `sizeof`) rather than by the number of entries.
+
+    Values are only admitted once their key has been requested at least
+    `minimum_hits` times, and may not evict entries that are accessed more
+    frequently than themselves. This prevents large one-off values from
+    pushing out popular ones.
+
+    Note:
+        Unlike the other memory caches, values are not copied, so they should
+        be immutable.
+    """
+
+    __slots__ = (
+        "_cache",
+        "_sizes",
+        "_budget",
+        "_used",
+        "_sizeof",
+        "_minimum_hits",
+        "_maximum_entry_size",
+        "_sketch",
+    )
+
+    def __init__(
+        self,
+        budget: int,
+        sizeof: Callable[[T], int],
+        *,
+        minimum_hits: int = 1,
+        maximum_entry_size: int | None = None,
+        expected_entries: int = 10_000,
+    ) -> None:
+        self._cache: dict[str, T] = {}
+        self._sizes: dict[str, int] = {}
+        self._budget = budget
+        self._used = 0
+        self._sizeof = sizeof
+        self._minimum_hits = minimum_hits
+        self._maximum_entry_size = maximum_entry_size or budget // 8
+        self._sketch = _FrequencySketch(expected_entries)
+
+    @property
+    def used(self) -> int:
+        """The total size of all values currently cached."""
+        return self._used
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get(self, key: KeyType) -> T | None:
+        key_str = _ensure_key_type(key)
+        self._sketch.increment(key_str)
+
+        value = self._cache.get(key_str)
+        if value is not None:
+            del self._cache[key_str]
+            self._cache[key_str] = value
+
+        return value
+
+    def set(self, key: KeyType, value: T) -> None:
+        key_str = _ensure_key_type(key)
+        self.delete(key_str)
+
+        size = self._sizeof(value)
+        if size > self._maximum_entry_size:
+            return
+
+        frequency = self._sketch.estimate(key_str)
+        if frequency < self._minimum_hits:
+            return
+
+        # Find the least recently used entries that would have to make room,
+        # refusing admission if any of them is more popular than the newcomer.
+        victims = []
+        freed = 0
+        victim_iter = iter(self._cache)
+        while self._used - freed + size > self._budget:
+            victim = next(victim_iter)
+            if self._sketch.estimate(victim) > frequency:
+                return
+
+            victims.append(victim)
+            freed += self._sizes[victim]
+
+        for victim in victims:
+            self.delete(victim)
+
+        self._cache[key_str] = value
+        self._sizes[key_str] = size
+        self._used += size
+
+    def delete(self, key: KeyType) -> None:
+        key_str = _ensure_key_type(key)
+        try:
+            del self._cache[key_str]
+        except KeyError:
+            return
+
+        self._used -= self._sizes.pop(key_str)
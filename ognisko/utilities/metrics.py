@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Any
+
+__all__ = (
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsRegistry",
+    "registry",
+)
+
+_HISTOGRAM_SAMPLE_SIZE = 1024
+"""How many of the most recent observations are kept for percentiles."""
+
+
+class Counter:
+    """A monotonically increasing value."""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def increment(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def snapshot(self) -> int:
+        return self.value
+
+
+class Gauge:
+    """A value that may arbitrarily go up and down."""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value: float = 0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def increment(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def decrement(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def snapshot(self) -> float:
+        return self.value
+
+
+class Histogram:
+    """A distribution of observed values. Percentiles are calculated over
+    the most recent observations only."""
+
+    __slots__ = ("count", "total", "maximum", "_samples")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self._samples: deque[float] = deque(maxlen=_HISTOGRAM_SAMPLE_SIZE)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+        self._samples.append(value)
+
+    def percentile(self, percentile: float) -> float:
+        if not self._samples:
+            return 0.0
+
+        ordered = sorted(self._samples)
+        index = min(int(len(ordered) * percentile / 100), len(ordered) - 1)
+        return ordered[index]
+
+    def snapshot(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "max": self.maximum,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+type Metric = Counter | Gauge | Histogram
+
+
+def _metric_key(name: str, labels: dict[str, Any]) -> str:
+    if not labels:
+        return name
+
+    label_str = ",".join(f"{key}={value}" for key, value in labels.items())
+    return f"{name}{{{label_str}}}"
+
+
+class MetricsRegistry:
+    """A collection of in-process metrics, identified by their name and
+    labels."""
+
+    __slots__ = ("_metrics",)
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def __get_or_create[M: Metric](self, metric_type: type[M], key: str) -> M:
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = self._metrics[key] = metric_type()
+
+        assert isinstance(metric, metric_type), f"Metric {key!r} type mismatch."
+        return metric
+
+    def counter(self, name: str, /, **labels: Any) -> Counter:
+        return self.__get_or_create(Counter, _metric_key(name, labels))
+
+    def gauge(self, name: str, /, **labels: Any) -> Gauge:
+        return self.__get_or_create(Gauge, _metric_key(name, labels))
+
+    def histogram(self, name: str, /, **labels: Any) -> Histogram:
+        return self.__get_or_create(Histogram, _metric_key(name, labels))
+
+    def snapshot(self) -> dict[str, Any]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+
+registry = MetricsRegistry()
+"""The process-wide metrics registry."""
@@ -10,6 +10,8 @@ if [ $APP_COMPONENT = "api" ]; then
   exec /app/scripts/run_api.sh
 elif [ $APP_COMPONENT = "converter" ]; then
   exec /app/scripts/run_converter.sh
+elif [ $APP_COMPONENT = "worker" ]; then
+  exec /app/scripts/run_worker.sh
 else
   echo "Unknown APP_COMPONENT: $APP_COMPONENT"
   exit 1
@@ -0,0 +1,5 @@
+#!/bin/bash
+set -euo pipefail
+
+echo "Starting worker..."
+exec ognisko/components/worker.py
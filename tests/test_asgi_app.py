@@ -18,6 +18,10 @@ def test_redis_exists(app: FastAPI) -> None:
     assert app.state.redis is not None
 
 
+def test_ratelimiter_exists(app: FastAPI) -> None:
+    assert app.state.ratelimiter is not None
+
+
 def test_meili_exists(app: FastAPI) -> None:
     assert app.state.meili is not None
 
@@ -32,3 +36,21 @@ def test_user_cache_exists(app: FastAPI) -> None:
 
 def test_password_cache_exists(app: FastAPI) -> None:
     assert app.state.password_cache is not None
+
+
+def test_level_data_cache_exists(app: FastAPI) -> None:
+    assert app.state.level_data_cache is not None
+
+
+def test_level_schedule_cache_exists(app: FastAPI) -> None:
+    assert app.state.level_schedule_cache is not None
+
+
+def test_redis_bulk_pool_separate(app: FastAPI) -> None:
+    assert app.state.redis.bulk.connection_pool is not app.state.redis.connection_pool
+
+
+def test_meili_bulk_loader_configured(app: FastAPI) -> None:
+    loader = app.state.meili.bulk_loader("levels")
+    assert loader is not None
+    assert app.state.meili.bulk_concurrency > 0
@@ -0,0 +1,123 @@
+import pytest
+
+from ognisko.resources import EmbeddedLevel
+from ognisko.resources import EmbeddedLevelFlag
+from ognisko.resources import EmbeddedLevelIndex
+from ognisko.resources import EmbeddedLevelSort
+
+
+def create_level(
+    level_id: int,
+    name: str,
+    *,
+    likes: int = 0,
+    downloads: int = 0,
+    stars: int = 0,
+    upload_ts: float = 0.0,
+    flags: int = 0,
+) -> EmbeddedLevel:
+    return EmbeddedLevel(
+        id=level_id,
+        name=name,
+        user_id=1,
+        stars=stars,
+        length=0,
+        likes=likes,
+        downloads=downloads,
+        feature_order=0,
+        upload_ts=upload_ts,
+        official_song_id=0,
+        custom_song_id=0,
+        flags=flags,
+    )
+
+
+@pytest.fixture
+def index() -> EmbeddedLevelIndex:
+    index = EmbeddedLevelIndex()
+    index.upsert(
+        [
+            create_level(1, "Bloodbath", likes=30, downloads=5, stars=10),
+            create_level(2, "Blood Lust", likes=20, downloads=15, upload_ts=2.0),
+            create_level(3, "Sonic Wave", likes=10, downloads=25, upload_ts=3.0),
+            create_level(
+                4,
+                "Sonic Wave Infinity",
+                likes=40,
+                upload_ts=4.0,
+                flags=EmbeddedLevelFlag.EPIC,
+            ),
+        ],
+    )
+    return index
+
+
+def test_sort(index: EmbeddedLevelIndex) -> None:
+    hits = index.search(page=0, page_size=10, sort=EmbeddedLevelSort.DOWNLOADS)
+
+    assert hits.ids == [3, 2, 1, 4]
+    assert hits.total == 4
+
+
+def test_pagination(index: EmbeddedLevelIndex) -> None:
+    hits = index.search(page=1, page_size=3, sort=EmbeddedLevelSort.LIKES)
+
+    assert hits.ids == [3]
+    assert hits.total == 4
+
+
+def test_pagination_ties() -> None:
+    index = EmbeddedLevelIndex()
+    index.upsert(create_level(level_id, "Tied", likes=5) for level_id in range(1, 21))
+
+    ids = [
+        level_id
+        for page in range(4)
+        for level_id in index.search(
+            page=page,
+            page_size=5,
+            sort=EmbeddedLevelSort.LIKES,
+        ).ids
+    ]
+
+    assert ids == list(range(20, 0, -1))
+
+
+def test_query_prefix(index: EmbeddedLevelIndex) -> None:
+    hits = index.search(
+        page=0,
+        page_size=10,
+        sort=EmbeddedLevelSort.LIKES,
+        query="sonic wa",
+    )
+
+    assert hits.ids == [4, 3]
+
+
+def test_filters(index: EmbeddedLevelIndex) -> None:
+    assert index.search(
+        page=0,
+        page_size=10,
+        sort=EmbeddedLevelSort.RECENT,
+        flags=EmbeddedLevelFlag.EPIC,
+    ).ids == [4]
+    assert index.search(
+        page=0,
+        page_size=10,
+        sort=EmbeddedLevelSort.RECENT,
+        rated=True,
+    ).ids == [1]
+
+
+def test_update_and_remove(index: EmbeddedLevelIndex) -> None:
+    index.upsert([create_level(3, "Renamed")])
+    index.remove([4])
+
+    hits = index.search(
+        page=0,
+        page_size=10,
+        sort=EmbeddedLevelSort.LIKES,
+        query="sonic",
+    )
+    assert hits.ids == []
+    assert len(index) == 3
@@ -0,0 +1,75 @@
+import pytest
+
+from ognisko.resources import LevelNominationSnapshot
+from ognisko.resources import NominationCandidate
+
+
+def create_candidate(
+    level_id: int,
+    *,
+    likes: int,
+    downloads: int,
+    stars: int = 5,
+    length: int = 3,
+) -> NominationCandidate:
+    return NominationCandidate(
+        id=level_id,
+        stars=stars,
+        length=length,
+        likes=likes,
+        downloads=downloads,
+    )
+
+
+@pytest.fixture
+def snapshot() -> LevelNominationSnapshot:
+    snapshot = LevelNominationSnapshot()
+    snapshot.upsert(
+        [
+            create_candidate(1, likes=100, downloads=10_000),
+            create_candidate(2, likes=50, downloads=100),
+            create_candidate(3, likes=20, downloads=25),
+            create_candidate(4, likes=1000, downloads=1000, stars=9),
+            create_candidate(5, likes=1000, downloads=1000, length=1),
+        ],
+    )
+    return snapshot
+
+
+def nominate(snapshot: LevelNominationSnapshot, **kwargs) -> list[int]:
+    return snapshot.nominate(
+        **{
+            "minimum_stars": 2,
+            "maximum_stars": 7,
+            "minimum_length": 2,
+            "scheduled_before": 1000.0,
+            "excluded_level_ids": [],
+            "limit": 20,
+        }
+        | kwargs,
+    )
+
+
+def test_nominate(snapshot: LevelNominationSnapshot) -> None:
+    assert nominate(snapshot) == [2, 3, 1]
+    assert nominate(snapshot, limit=2) == [2, 3]
+
+
+def test_excludes_scheduled(snapshot: LevelNominationSnapshot) -> None:
+    snapshot.mark_scheduled(1, 2, scheduled_at=2000.0)
+    snapshot.mark_scheduled(2, 6, scheduled_at=2000.0)
+
+    assert nominate(snapshot, excluded_level_ids=[3]) == [1]
+    assert snapshot.last_schedule_id == 2
+
+    # Schedules apply to levels which only later become candidates.
+    snapshot.upsert([create_candidate(6, likes=100, downloads=1)])
+    assert nominate(snapshot, excluded_level_ids=[3]) == [1]
+
+
+def test_update_and_remove(snapshot: LevelNominationSnapshot) -> None:
+    snapshot.upsert([create_candidate(3, likes=500, downloads=25)])
+    snapshot.remove([2])
+
+    assert nominate(snapshot) == [3, 1]
+    assert len(snapshot) == 4
@@ -0,0 +1,54 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from ognisko.resources import ColumnarLevelStore
+
+
+class StoredLevel(NamedTuple):
+    id: int
+    likes: int
+
+
+class LevelStore(ColumnarLevelStore[StoredLevel]):
+    COLUMNS = {"likes": np.int64}
+
+    def _store(self, slot: int, level: StoredLevel, *, added: bool) -> None:
+        self._columns["likes"][slot] = level.likes
+
+    def likes(self) -> dict[int, int]:
+        alive = self._column("alive")
+        return dict(
+            zip(
+                self._column("id")[alive].tolist(),
+                self._column("likes")[alive].tolist(),
+            ),
+        )
+
+
+def test_upsert_grows() -> None:
+    store = LevelStore()
+    store.upsert(StoredLevel(level_id, level_id * 2) for level_id in range(3000))
+
+    assert len(store) == 3000
+    assert store.likes()[2999] == 5998
+
+
+def test_remove_reuses_slots() -> None:
+    store = LevelStore()
+    store.upsert([StoredLevel(1, 10), StoredLevel(2, 20)])
+    store.remove([1, 3])
+    store.upsert([StoredLevel(4, 40), StoredLevel(2, 25)])
+
+    assert store.likes() == {2: 25, 4: 40}
+    assert len(store._column("id")) == 2
+
+
+def test_take_changed() -> None:
+    store = LevelStore()
+    store.mark_changed(1)
+    store.mark_changed(2)
+
+    assert store.take_changed(0.0) == []
+    assert sorted(store.take_changed(float("inf"))) == [1, 2]
+    assert store.take_changed(float("inf")) == []
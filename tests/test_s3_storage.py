@@ -0,0 +1,143 @@
+import socket
+from collections.abc import AsyncIterator
+from collections.abc import Iterator
+
+import boto3
+import pytest
+from moto.server import ThreadedMotoServer
+
+from ognisko.adapters.storage import S3Storage
+
+S3_HOST = "127.0.0.1"
+S3_REGION = "us-east-1"
+S3_BUCKET = "ognisko-test"
+
+MULTIPART_PART_SIZE = 5 * 1024 * 1024
+
+
+@pytest.fixture(scope="module")
+def s3_server() -> Iterator[str]:
+    with socket.socket() as free_socket:
+        free_socket.bind((S3_HOST, 0))
+        port = free_socket.getsockname()[1]
+
+    server = ThreadedMotoServer(ip_address=S3_HOST, port=port)
+    server.start()
+
+    endpoint = f"http://{S3_HOST}:{port}"
+    boto3.client(
+        "s3",
+        endpoint_url=endpoint,
+        region_name=S3_REGION,
+        aws_access_key_id="test",
+        aws_secret_access_key="test",
+    ).create_bucket(Bucket=S3_BUCKET)
+
+    yield endpoint
+    server.stop()
+
+
+@pytest.fixture
+async def storage(s3_server: str, tmp_path) -> AsyncIterator[S3Storage]:
+    storage = S3Storage(
+        region=S3_REGION,
+        endpoint=s3_server,
+        access_key="test",
+        secret_key="test",
+        bucket=S3_BUCKET,
+        timeout=5,
+        spool_directory=str(tmp_path),
+        multipart_threshold=MULTIPART_PART_SIZE,
+        multipart_part_size=MULTIPART_PART_SIZE,
+        read_chunk_size=64 * 1024,
+    )
+    await storage.connect()
+    yield storage
+    await storage.disconnect()
+
+
+async def test_save_and_load(storage: S3Storage) -> None:
+    await storage.save("levels/1", b"level data")
+
+    assert await storage.load("levels/1") == b"level data"
+
+
+async def test_pending_upload_served_from_spool(storage: S3Storage) -> None:
+    await storage.save("levels/2", b"pending")
+
+    # Workers have not had a chance to run yet.
+    assert storage.pending_uploads == 1
+    assert await storage.load("levels/2") == b"pending"
+
+
+async def test_multipart_upload(storage: S3Storage) -> None:
+    data = bytes(range(256)) * (MULTIPART_PART_SIZE * 2 // 256 + 1)
+    await storage.save("saves/1", data)
+    await storage.flush()
+
+    assert storage.pending_uploads == 0
+    assert await storage.load("saves/1") == data
+    assert await storage.load_range("saves/1", 100, 200) == data[100:200]
+
+
+async def test_load_range_past_end(storage: S3Storage) -> None:
+    await storage.save("levels/5", b"level data")
+    await storage.flush()
+
+    assert await storage.load_range("levels/5", 6, 100) == b"data"
+    assert await storage.load_range("levels/5", 100, 200) == b""
+    assert await storage.load_range("levels/missing", 100, 200) is None
+
+
+async def test_load_missing(storage: S3Storage) -> None:
+    assert await storage.load("levels/missing") is None
+
+
+async def test_failed_upload_dead_lettered(s3_server: str, tmp_path) -> None:
+    storage = S3Storage(
+        region=S3_REGION,
+        endpoint=s3_server,
+        access_key="test",
+        secret_key="test",
+        bucket="ognisko-missing",
+        timeout=5,
+        spool_directory=str(tmp_path),
+        retry_delay=0.01,
+        max_upload_attempts=2,
+    )
+    await storage.connect()
+    try:
+        await storage.save("levels/3", b"undeliverable")
+        await storage.flush()
+    finally:
+        await storage.disconnect()
+
+    assert storage.pending_uploads == 0
+    assert (tmp_path / "dead" / "levels%2F3").read_bytes() == b"undeliverable"
+    assert not (tmp_path / "levels%2F3").exists()
+
+
+async def test_spool_replayed_by_single_process(s3_server: str, tmp_path) -> None:
+    (tmp_path / "levels%2F4").write_bytes(b"left behind")
+
+    storages = [
+        S3Storage(
+            region=S3_REGION,
+            endpoint=s3_server,
+            access_key="test",
+            secret_key="test",
+            bucket=S3_BUCKET,
+            timeout=5,
+            spool_directory=str(tmp_path),
+            upload_workers=0,
+        )
+        for _ in range(2)
+    ]
+    for storage in storages:
+        await storage.connect()
+
+    try:
+        assert [storage.pending_uploads for storage in storages] == [1, 0]
+    finally:
+        for storage in storages:
+            await storage.disconnect()